@@ -0,0 +1,54 @@
+"""Main file for benchmarking the pipeline on synthetic data, and failing on a
+performance regression against an earlier git revision.
+
+Each stage's time and peak memory, at each size, are added to the results file
+against the current revision. They are then compared with the results of the
+baseline revision: by default, the one benchmarked most recently before this.
+
+Usage: python benchmark_main.py <results.csv> [--responses N [N ...]]
+    [--baseline REVISION] [--threshold SHARE] [--no-memory]
+"""
+import argparse
+import logging
+import sys
+
+from src.utils.benchmark import (
+    DEFAULT_SCALES,
+    DEFAULT_THRESHOLD,
+    append_results,
+    baseline_results,
+    find_regressions,
+    run_benchmark,
+)
+from src.utils.synthetic_data import DEFAULT_SEED
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("results", help="The csv file of benchmark results.")
+    parser.add_argument("--responses", type=int, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--baseline", help="The git revision to compare with.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument(
+        "--no-memory", action="store_true", help="Skip the peak memory run."
+    )
+    args = parser.parse_args()
+
+    results = run_benchmark(args.responses, args.seed, not args.no_memory)
+    revision = results["revision"].iloc[0]
+    baseline = baseline_results(args.results, revision, args.baseline)
+    append_results(args.results, results)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    print(results.drop(columns=["revision", "run_time"]).to_string(index=False))
+    if baseline.empty:
+        print(f"No baseline results to compare {revision} with.")
+        sys.exit(0)
+
+    print(f"Compared {revision} with {baseline['revision'].iloc[0]}.")
+    regressions = find_regressions(results, baseline, args.threshold)
+    if not regressions.empty:
+        print("Performance regressions:")
+        print(regressions.to_string(index=False))
+        sys.exit(1)
+    print("No performance regressions.")
@@ -0,0 +1,20 @@
+"""Main file for rolling the per-run runlog files up into the runlogs"""
+import os
+
+from importlib import reload
+
+# Change to the project repository location
+my_wd = os.getcwd()
+my_repo = "research-and-development"
+if not my_wd.endswith(my_repo):
+    os.chdir(my_repo)
+
+from src.utils import runlog_store
+
+reload(runlog_store)
+
+user_path = os.path.join("src", "user_config.yaml")
+dev_path = os.path.join("src", "dev_config.yaml")
+
+if __name__ == "__main__":
+    runlog_store.run_compaction(user_path, dev_path)
@@ -34,12 +34,19 @@ def pytest_addoption(parser):
         default=False,
         help="Run WIP tests."
     )
+    parser.addoption(
+        "--runbenchmark",
+        action="store_true",
+        default=False,
+        help="Run the pipeline benchmark tests.",
+    )
 
 
 def pytest_configure(config):
     """Add ini value line."""
     config.addinivalue_line("markers", "runhdfs: Run HDFS related tests.")
     config.addinivalue_line("markers", "runwip: Run work in progress tests.")
+    config.addinivalue_line("markers", "runbenchmark: Run pipeline benchmark tests.")
 
 
 
@@ -49,7 +56,8 @@ def pytest_collection_modifyitems(config, items):  # noqa:C901
     # do full test suite when all flags are given
     if (
         config.getoption("--runhdfs") &
-        config.getoption("--runwip")
+        config.getoption("--runwip") &
+        config.getoption("--runbenchmark")
     ):
         return
 
@@ -65,3 +73,9 @@ def pytest_collection_modifyitems(config, items):  # noqa:C901
         for item in items:
             if "runwip" in item.keywords:
                 item.add_marker(skip_hdfs)
+
+    if not config.getoption("--runbenchmark"):
+        skip_benchmark = pytest.mark.skip(reason="Need --runbenchmark option to run.")
+        for item in items:
+            if "runbenchmark" in item.keywords:
+                item.add_marker(skip_benchmark)
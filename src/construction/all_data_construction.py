@@ -1,5 +1,5 @@
 import logging
-from typing import Callable
+from typing import Tuple
 
 import pandas as pd
 import numpy as np
@@ -13,6 +13,7 @@ from src.construction.construction_helpers import (
     remove_short_to_long_0,
     finalise_forms_gb,
     replace_values_in_construction,
+    build_construction_position_index,
 )
 from src.construction.construction_validation import (
     validate_short_to_long,
@@ -26,7 +27,7 @@ def all_data_construction(
     construction_logger: logging.Logger,
     config: dict,
     is_northern_ireland: bool = False,
-) -> pd.DataFrame:
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """Run all data construction on the GB or NI data.
     This process is different from the postcode only construction that happens
     after imputation.
@@ -39,7 +40,8 @@ def all_data_construction(
             Defaults to False.
 
     Returns:
-        pd.DataFrame: The snapshot data with the constructed values
+        Tuple[pd.DataFrame, pd.DataFrame]: The snapshot data with the constructed
+            values, and the change log of every cell that construction changed.
     """
     # to ensure compatibility, change short_to_long to construction_type
     # short_to_long used for 2022
@@ -111,13 +113,14 @@ def all_data_construction(
                 updated_snapshot_df, construction_df
             )
 
-    updated_snapshot_df, construction_df = replace_values_in_construction(
-        updated_snapshot_df, construction_df
+    # The rows are now final, so the key index is built once for the update
+    position_index = build_construction_position_index(updated_snapshot_df)
+    updated_snapshot_df, construction_df, change_log = replace_values_in_construction(
+        updated_snapshot_df, construction_df, position_index
     )
 
     if "construction_type" in construction_df.columns:
         if "short_to_long" in construction_df["construction_type"].values:
-            construction_df.reset_index(inplace=True)
             updated_snapshot_df = remove_short_to_long_0(
                 updated_snapshot_df, construction_df
             )
@@ -137,5 +140,8 @@ def all_data_construction(
         )
 
     construction_logger.info(f"Construction edited {construction_df.shape[0]} rows.")
+    construction_logger.info(
+        f"Construction changed {change_log.shape[0]} values in the snapshot."
+    )
 
-    return updated_snapshot_df
+    return updated_snapshot_df, change_log
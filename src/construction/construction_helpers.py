@@ -309,41 +309,126 @@ def prep_new_rows(
     return rows_to_add
 
 
+CONSTRUCTION_KEYS = ["reference", "instance", "period_year"]
+
+
+def build_construction_position_index(
+    df: pd.DataFrame, keys: list = CONSTRUCTION_KEYS
+) -> pd.MultiIndex:
+    """Build a position index over the construction key columns of a dataframe.
+
+    The index is built from the key columns alone, so the dataframe itself is
+    not reindexed. Position i of the returned index corresponds to row i of the
+    dataframe, so it stays valid for as long as the rows are not reordered.
+
+    Args:
+        df (pd.DataFrame): The dataframe to index.
+        keys (list, optional): The key columns. Defaults to CONSTRUCTION_KEYS.
+
+    Returns:
+        pd.MultiIndex: The (reference, instance, period_year) position index.
+    """
+    return pd.MultiIndex.from_arrays(
+        [df[key].astype("Int64") for key in keys], names=keys
+    )
+
+
+def apply_construction_values(
+    snapshot_df: pd.DataFrame,
+    construction_df: pd.DataFrame,
+    position_index: pd.MultiIndex = None,
+    keys: list = CONSTRUCTION_KEYS,
+) -> pd.DataFrame:
+    """Write the non-null constructed values into the snapshot, in place.
+
+    Rows are matched on the key columns and only the matched, non-null cells of
+    each constructed column are written, one column at a time. Constructed
+    columns that are not in the snapshot are ignored, as with DataFrame.update.
+
+    Args:
+        snapshot_df (pd.DataFrame): The snapshot dataframe, updated in place.
+        construction_df (pd.DataFrame): The construction dataframe.
+        position_index (pd.MultiIndex, optional): A position index over the
+            snapshot, see build_construction_position_index. Built if not given.
+        keys (list, optional): The key columns. Defaults to CONSTRUCTION_KEYS.
+
+    Raises:
+        ValueError: Raised if the construction keys are not unique.
+
+    Returns:
+        pd.DataFrame: A change log with one row per cell whose value changed,
+            holding the keys, the column name and the old and new values.
+    """
+    if position_index is None:
+        position_index = build_construction_position_index(snapshot_df, keys)
+    construction_index = build_construction_position_index(construction_df, keys)
+    if not construction_index.is_unique:
+        raise ValueError(
+            "Construction keys must be unique: "
+            f"{construction_index[construction_index.duplicated()].tolist()}"
+        )
+
+    # For each snapshot row, the position of its construction row (-1 if none)
+    matches = construction_index.get_indexer(position_index)
+    snapshot_rows = np.flatnonzero(matches >= 0)
+    construction_rows = matches[snapshot_rows]
+
+    value_cols = [
+        col
+        for col in construction_df.columns
+        if col not in keys and col in snapshot_df.columns
+    ]
+    changes = []
+    for col in value_cols:
+        new_values = construction_df[col].iloc[construction_rows]
+        not_null = new_values.notnull().to_numpy()
+        if not not_null.any():
+            continue
+        rows = snapshot_rows[not_null]
+        new_values = new_values[not_null].reset_index(drop=True)
+        col_position = snapshot_df.columns.get_loc(col)
+        old_values = snapshot_df.iloc[rows, col_position].reset_index(drop=True)
+
+        changed = ~old_values.astype(object).eq(new_values.astype(object)).to_numpy()
+        if changed.any():
+            change = position_index[rows[changed]].to_frame(index=False)
+            change["column"] = col
+            change["old_value"] = old_values[changed].to_numpy()
+            change["new_value"] = new_values[changed].to_numpy()
+            changes.append(change)
+
+        snapshot_df.iloc[rows, col_position] = new_values.to_numpy()
+
+    if not changes:
+        return pd.DataFrame(columns=keys + ["column", "old_value", "new_value"])
+    return pd.concat(changes, ignore_index=True)
+
+
 def replace_values_in_construction(
-    updated_snapshot_df: pd.DataFrame, construction_df: pd.DataFrame
-) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    updated_snapshot_df: pd.DataFrame,
+    construction_df: pd.DataFrame,
+    position_index: pd.MultiIndex = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """Replace values in the snapshot with those from construction dataframe.
 
     Args:
         updated_snapshot_df (pd.DataFrame): The updated snapshot dataframe.
         construction_df (pd.DataFrame): The construction dataframe.
+        position_index (pd.MultiIndex, optional): A position index over the
+            snapshot, see build_construction_position_index. Built if not given.
 
     Returns:
-        Tuple[pd.DataFrame, pd.DataFrame]: The updated snapshot dataframe and the
-            modified construction dataframe.
+        Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: The updated snapshot
+            dataframe, the construction dataframe and the change log of every
+            cell that construction changed.
     """
-    # Update the values with the constructed ones
-    construction_df.set_index(
-        [
-            "reference",
-            "instance",
-            "period_year",
-        ],
-        inplace=True,
-    )
-    updated_snapshot_df.set_index(
-        [
-            "reference",
-            "instance",
-            "period_year",
-        ],
-        inplace=True,
-    )
-    updated_snapshot_df.update(construction_df)
-    updated_snapshot_df.reset_index(inplace=True)
+    # Only the key columns need casting; the rest of the frame is left as is
+    for key in CONSTRUCTION_KEYS:
+        if updated_snapshot_df[key].dtype != "Int64":
+            updated_snapshot_df[key] = updated_snapshot_df[key].astype("Int64")
 
-    updated_snapshot_df = updated_snapshot_df.astype(
-        {"reference": "Int64", "instance": "Int64", "period_year": "Int64"}
+    change_log = apply_construction_values(
+        updated_snapshot_df, construction_df, position_index
     )
 
-    return updated_snapshot_df, construction_df
+    return updated_snapshot_df, construction_df, change_log
@@ -1,5 +1,7 @@
 """The main file for the construction module."""
 import logging
+import os
+from datetime import datetime
 from typing import Callable
 
 import pandas as pd
@@ -15,11 +17,37 @@ from src.construction.postcode_construction import postcode_data_construction
 construction_logger = logging.getLogger(__name__)
 
 
+def write_change_log(
+    change_log: pd.DataFrame,
+    config: dict,
+    write_csv: Callable,
+    run_id: int,
+    construction_name: str,
+) -> None:
+    """Output the change log of a construction as a construction QA file.
+
+    Args:
+        change_log (pd.DataFrame): The cells changed by the construction.
+        config (dict): The pipeline configuration.
+        write_csv (callable): Function to write a csv file.
+        run_id (int): Unique identifier for the run.
+        construction_name (str): The construction run, used in the filename.
+    """
+    qa_path = config["construction_paths"]["qa_path"]
+    tdate = datetime.now().strftime("%y-%m-%d")
+    survey_year = config["years"]["survey_year"]
+    filename = f"{survey_year}_{construction_name}_changes_{tdate}_v{run_id}.csv"
+    construction_logger.info("Outputting Construction QA files.")
+    write_csv(os.path.join(qa_path, filename), change_log)
+
+
 def run_construction(  # noqa: C901
     snapshot_df: pd.DataFrame,
     config: dict,
     check_file_exists: Callable,
     read_csv: Callable,
+    write_csv: Callable,
+    run_id: int,
     is_run_all_data_construction: bool = False,
     is_run_postcode_construction: bool = False,
     is_northern_ireland: bool = False,
@@ -38,6 +66,8 @@ def run_construction(  # noqa: C901
             will be the hdfs or network version depending on settings.
         read_csv (callable): Function to read a csv file. This will be the hdfs
             or network version depending on settings.
+        write_csv (callable): Function to write a csv file, for the QA outputs.
+        run_id (int): Unique identifier for the run.
         is_run_all_data_construction (bool): A logical parameter to perform all
             construction. If this flag is True, and there is a construction
             file, all construction steps will be done before the imputation.
@@ -61,9 +91,10 @@ def run_construction(  # noqa: C901
             construction_logger,
             is_northern_ireland=True,
         )
-        updated_snapshot_df = all_data_construction(
+        updated_snapshot_df, change_log = all_data_construction(
             df, snapshot_df, construction_logger, config, is_northern_ireland=True
         )
+        construction_name = "ni_construction"
 
     elif is_run_all_data_construction:
         run_construction = config["global"]["run_all_data_construction"]
@@ -71,9 +102,10 @@ def run_construction(  # noqa: C901
         df = read_validate_all_construction_files(
             config, check_file_exists, read_csv, construction_logger
         )
-        updated_snapshot_df = all_data_construction(
+        updated_snapshot_df, change_log = all_data_construction(
             df, snapshot_df, construction_logger, config
         )
+        construction_name = "construction"
 
     elif is_run_postcode_construction:
         run_postcode_construction = config["global"]["run_postcode_construction"]
@@ -81,13 +113,17 @@ def run_construction(  # noqa: C901
         df = read_validate_postcode_construction_file(
             config, check_file_exists, read_csv, construction_logger
         )
-        updated_snapshot_df = postcode_data_construction(
+        updated_snapshot_df, change_log = postcode_data_construction(
             df, snapshot_df, construction_logger
         )
+        construction_name = "postcode_construction"
 
     # Skip this module if not needed
     if not run_construction and not run_postcode_construction:
         construction_logger.info("Skipping Construction...")
         return snapshot_df
 
+    if config["global"]["output_construction_qa"]:
+        write_change_log(change_log, config, write_csv, run_id, construction_name)
+
     return updated_snapshot_df
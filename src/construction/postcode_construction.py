@@ -1,16 +1,21 @@
 import logging
+from typing import Tuple
+
 import pandas as pd
 
 from src.outputs.outputs_helpers import create_period_year
 from src.staging.postcode_validation import format_postcodes
-from src.construction.construction_helpers import replace_values_in_construction
+from src.construction.construction_helpers import (
+    replace_values_in_construction,
+    build_construction_position_index,
+)
 
 
 def postcode_data_construction(
     construction_df: pd.DataFrame,
     snapshot_df: pd.DataFrame,
     construction_logger: logging.Logger,
-) -> pd.DataFrame:
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """Run postcode construction on GB data.
     This process is different from the all data construction that happens
     before mapping.
@@ -21,7 +26,8 @@ def postcode_data_construction(
         construction_logger (logging.Logger): The logger for the construction.
 
     Returns:
-        pd.DataFrame: The snapshot data with the constructed values
+        Tuple[pd.DataFrame, pd.DataFrame]: The snapshot data with the constructed
+            values, and the change log of every cell that construction changed.
     """
     construction_logger.info("Running postcode construction")
 
@@ -48,8 +54,9 @@ def postcode_data_construction(
         updated_snapshot_df["is_constructed"] = False
     construction_df["is_constructed"] = True
 
-    updated_snapshot_df, construction_df = replace_values_in_construction(
-        updated_snapshot_df, construction_df
+    position_index = build_construction_position_index(updated_snapshot_df)
+    updated_snapshot_df, construction_df, change_log = replace_values_in_construction(
+        updated_snapshot_df, construction_df, position_index
     )
 
     updated_snapshot_df = updated_snapshot_df.sort_values(
@@ -59,5 +66,8 @@ def postcode_data_construction(
     construction_logger.info(
         f"Postcode construction edited {construction_df.shape[0]} rows."
     )
+    construction_logger.info(
+        f"Postcode construction changed {change_log.shape[0]} values."
+    )
     construction_logger.info("Finished postcode construction")
-    return updated_snapshot_df
+    return updated_snapshot_df, change_log
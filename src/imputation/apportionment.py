@@ -5,6 +5,7 @@ import pandas as pd
 from typing import Dict, List
 
 from src.imputation.imputation_helpers import copy_first_to_group
+from src.utils.wrappers import track_df_changes
 
 ApportionmentLogger = logging.getLogger(__name__)
 
@@ -145,6 +146,7 @@ def apportion_headcounts(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@track_df_changes
 def run_apportionment(df: pd.DataFrame) -> pd.DataFrame:
     """Calculate apportionment for headcount and FTE.
 
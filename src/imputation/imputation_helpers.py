@@ -5,6 +5,7 @@ from typing import List, Tuple
 from itertools import chain
 
 from src.staging.validation import load_schema
+from src.utils.wrappers import track_df_changes
 
 ImputationHelpersLogger = logging.getLogger(__name__)
 
@@ -277,6 +278,7 @@ def split_df_on_trim(df: pd.DataFrame, trim_bool_col: str) -> pd.DataFrame:
         return df, df
 
 
+@track_df_changes
 def split_df_on_imp_class(df: pd.DataFrame, exclusion_list: List = ["817", "nan"]):
     """Split the dataframe based on the imputation class.
 
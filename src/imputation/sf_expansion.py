@@ -4,7 +4,7 @@ import pandas as pd
 import logging
 
 from src.imputation.imputation_helpers import split_df_on_imp_class
-from src.utils.wrappers import df_change_func_wrap
+from src.utils.wrappers import track_df_changes
 
 SFExpansionLogger = logging.getLogger(__name__)
 
@@ -89,7 +89,7 @@ def expansion_impute(
     return group_copy
 
 
-# @df_change_func_wrap
+# @track_df_changes
 def apply_expansion(
     df: pd.DataFrame,
     master_values: List,
@@ -184,7 +184,7 @@ def prepare_short_form_constructed(df: pd.DataFrame, master_cols: List) -> pd.Da
     return df
 
 
-@df_change_func_wrap
+@track_df_changes(key_cols=["reference", "instance"])
 def run_sf_expansion(df: pd.DataFrame, config: dict) -> pd.DataFrame:
     """Calculate the expansion imputated values for short forms using long form data."""
     # Get dictionary of short form master keys (or target variables)
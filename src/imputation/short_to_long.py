@@ -2,8 +2,10 @@ import pandas as pd
 
 from src.imputation.imputation_helpers import fill_sf_zeros
 from src.outputs.short_form import create_headcount_cols
+from src.utils.wrappers import track_df_changes
 
 
+@track_df_changes(key_cols=["reference", "instance"])
 def run_short_to_long(df: pd.DataFrame) -> pd.DataFrame:
     """Implement short form to long form conversion.
 
@@ -0,0 +1,210 @@
+"""Load, validate and cache the mappers used in staging and mapping.
+
+Each mapper is read and validated once per run. The validated mapper is also
+cached in a Parquet file named after the hashes of the mapper file and its
+schema, so a mapper is only validated again when it, or its schema, changes.
+
+The registry also gives lookups: the unique keys of a mapper, dictionary
+encoded in a hash index, and the mapped values as arrays aligned to the keys.
+Mapping a column is then a get_indexer and a take of each value, rather than a
+merge that copies every column of the responses.
+"""
+import hashlib
+import logging
+import os
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.mapping.ultfoc_mapping import validate_ultfoc_mapper
+from src.staging import staging_helpers as stage_hlp
+from src.staging import validation as val
+
+MapperRegistryLogger = logging.getLogger(__name__)
+
+# The checks each mapper must pass, beyond its schema, as (function, args) pairs
+MAPPER_VALIDATORS = {
+    "pg_num_alpha_mapper_path": [
+        (val.validate_many_to_one, ("pg_numeric", "pg_alpha")),
+    ],
+    "sic_pg_num_mapper_path": [
+        (val.validate_many_to_one, ("SIC 2007_CODE", "2016 > Form PG")),
+    ],
+    "ultfoc_mapper_path": [(validate_ultfoc_mapper, ())],
+}
+
+
+class MapperLookup:
+    """
+    A lookup from the unique keys of a mapper to its values.
+
+    Attributes
+    ==========
+    key_col
+        the mapper column the keys come from
+    keys
+        the unique keys, as an index, so they are hashed once
+    values
+        the value columns, each an array in the same order as the keys
+    """
+
+    def __init__(self, key_col: str, keys: pd.Index, values: Dict[str, object]):
+        self.key_col = key_col
+        self.keys = keys
+        self.values = values
+
+    @classmethod
+    def from_mapper(
+        cls, mapper: pd.DataFrame, key_col: str, value_cols: List[str]
+    ) -> "MapperLookup":
+        """Create a lookup from the key and value columns of a mapper.
+
+        Args:
+            mapper (pd.DataFrame): The mapper.
+            key_col (str): The column to look up.
+            value_cols (List[str]): The columns to look up the values of.
+
+        Raises:
+            ValueError: Raised if a key maps to more than one set of values.
+
+        Returns:
+            MapperLookup: The lookup.
+        """
+        mapper = mapper[[key_col] + value_cols].drop_duplicates()
+        if not mapper[key_col].is_unique:
+            raise ValueError(f"Column {key_col} is not unique.")
+
+        keys = pd.Index(mapper[key_col])
+        values = {col: mapper[col].array for col in value_cols}
+        return cls(key_col, keys, values)
+
+    def codes(self, keys: pd.Series) -> np.ndarray:
+        """Get the position of each key in the lookup, or -1 if it is missing."""
+        return self.keys.get_indexer(keys)
+
+    def take(self, codes: np.ndarray, col: str) -> pd.api.extensions.ExtensionArray:
+        """Get the values of a column at the given codes, missing for -1."""
+        return self.values[col].take(codes, allow_fill=True)
+
+    def map(self, keys: pd.Series, col: str) -> pd.Series:
+        """Map keys to the values of a column, like Series.map with a dict."""
+        return pd.Series(self.take(self.codes(keys), col), index=keys.index, name=col)
+
+
+class MapperRegistry:
+    """
+    Loads each mapper once, validating it only when its file or schema changes.
+
+    Attributes
+    ==========
+    config
+        the pipeline configuration, with the mapper paths
+    cache_folder
+        the folder for the validated Parquet copies, or None not to cache them
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        file_exists_func: Callable,
+        mkdir_func: Callable,
+        read_csv_func: Callable,
+        md5sum_func: Callable,
+        read_parquet_func: Callable,
+        write_parquet_func: Callable,
+    ):
+        self.config = config
+        self.cache_folder = config["mapping_paths"].get("mapper_cache_path")
+        self.file_exists_func = file_exists_func
+        self.mkdir_func = mkdir_func
+        self.read_csv_func = read_csv_func
+        self.md5sum_func = md5sum_func
+        self.read_parquet_func = read_parquet_func
+        self.write_parquet_func = write_parquet_func
+        self._mappers: Dict[str, pd.DataFrame] = {}
+        self._lookups: Dict[Tuple, MapperLookup] = {}
+
+    def _cache_path(self, mapper_path_key: str) -> str:
+        """The path of the cached copy, named after the mapper and schema hashes."""
+        mapper_path = self.config["mapping_paths"][mapper_path_key]
+        digest = hashlib.md5(self.md5sum_func(mapper_path).encode())
+
+        schema_path = stage_hlp.mapper_schema_path(mapper_path_key)
+        if os.path.exists(schema_path):
+            with open(schema_path, "rb") as file:
+                digest.update(file.read())
+
+        mapper_name = stage_hlp.getmappername(mapper_path_key, split=False)
+        return os.path.join(
+            self.cache_folder, f"{mapper_name}_{digest.hexdigest()}.parquet"
+        )
+
+    def _load_validate(self, mapper_path_key: str) -> pd.DataFrame:
+        """Read a mapper and run its schema and mapper-specific checks."""
+        mapper_df = stage_hlp.load_validate_mapper(
+            mapper_path_key,
+            self.config,
+            MapperRegistryLogger,
+            self.file_exists_func,
+            self.read_csv_func,
+        )
+        for validator, args in MAPPER_VALIDATORS.get(mapper_path_key, []):
+            validator(mapper_df, *args)
+        return mapper_df.reset_index(drop=True)
+
+    def _load(self, mapper_path_key: str) -> pd.DataFrame:
+        """Load a mapper from the cache, or validate it and cache it."""
+        if self.cache_folder is None:
+            return self._load_validate(mapper_path_key)
+
+        mapper_path = self.config["mapping_paths"][mapper_path_key]
+        self.file_exists_func(mapper_path, raise_error=True)
+        cache_path = self._cache_path(mapper_path_key)
+        if self.file_exists_func(cache_path):
+            MapperRegistryLogger.info(f"Loading validated {mapper_path_key} from cache")
+            return self.read_parquet_func(cache_path)
+
+        mapper_df = self._load_validate(mapper_path_key)
+        if not self.file_exists_func(self.cache_folder):
+            self.mkdir_func(self.cache_folder)
+        self.write_parquet_func(cache_path, mapper_df)
+        return mapper_df
+
+    def get(self, mapper_path_key: str) -> pd.DataFrame:
+        """Get a validated mapper.
+
+        The same mapper is returned each time it is asked for in a run, as a
+        shallow copy, so adding or replacing its columns does not affect it.
+
+        Args:
+            mapper_path_key (str): The key of the mapper path in the config,
+                e.g. "itl_mapper_path".
+
+        Returns:
+            pd.DataFrame: The validated mapper.
+        """
+        if mapper_path_key not in self._mappers:
+            self._mappers[mapper_path_key] = self._load(mapper_path_key)
+        return self._mappers[mapper_path_key].copy(deep=False)
+
+    def lookup(
+        self, mapper_path_key: str, key_col: str, value_cols: List[str]
+    ) -> MapperLookup:
+        """Get a lookup from one column of a validated mapper to others.
+
+        Args:
+            mapper_path_key (str): The key of the mapper path in the config.
+            key_col (str): The column to look up.
+            value_cols (List[str]): The columns to look up the values of.
+
+        Returns:
+            MapperLookup: The lookup, created once per run.
+        """
+        lookup_key = (mapper_path_key, key_col, tuple(value_cols))
+        if lookup_key not in self._lookups:
+            mapper = self.get(mapper_path_key)
+            self._lookups[lookup_key] = MapperLookup.from_mapper(
+                mapper, key_col, value_cols
+            )
+        return self._lookups[lookup_key]
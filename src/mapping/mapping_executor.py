@@ -0,0 +1,316 @@
+"""Map the responses in a single pass, from their key columns alone.
+
+Each mapping (PG, ultfoc, cellno universe count, postcode to ITL to region) is
+a lookup of one key column in a mapper, giving new column arrays. The arrays
+are attached to the responses in one concat at the end, rather than each step
+merging the mapper into, and so copying, the whole responses dataframe.
+
+Keys with no match in their mapper are collected into one QA table, so every
+mapping problem is reported at once, rather than only the first.
+"""
+import logging
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from src.mapping.cellno_mapping import clean_validate_cellno_mapper
+from src.mapping.mapper_registry import MapperLookup, MapperRegistry
+
+MappingExecutorLogger = logging.getLogger(__name__)
+
+UNMATCHED_COLUMNS = ["mapper", "key_col", "key", "count", "action"]
+
+# What is done with the unmatched keys of a mapper; "error" stops the run
+UNMATCHED_ACTIONS = {
+    "sic to pg": "left blank",
+    "pg numeric to alpha": "left blank",
+    "ultfoc": "filled with GB",
+    "cellno": "error",
+    "postcode mapper": "error",
+    "itl mapper": "warn",
+}
+
+
+def _unmatched(
+    mapper_name: str, key_col: str, keys: pd.Series, missing: pd.Series
+) -> pd.DataFrame:
+    """Count each key that has no match in a mapper."""
+    counts = keys.loc[missing].value_counts(sort=False)
+    return pd.DataFrame(
+        {
+            "mapper": mapper_name,
+            "key_col": key_col,
+            "key": counts.index,
+            "count": counts.to_numpy(),
+            "action": UNMATCHED_ACTIONS[mapper_name],
+        },
+        columns=UNMATCHED_COLUMNS,
+    )
+
+
+def _lookup(
+    mapper_name: str,
+    lookup: MapperLookup,
+    keys: pd.Series,
+    value_cols: List[str],
+    unmatched: List[pd.DataFrame],
+) -> Dict[str, pd.Series]:
+    """Look up keys, recording the non-null keys with no match in the mapper."""
+    codes = lookup.codes(keys)
+    missing = keys.notna() & (codes == -1)
+    if missing.any():
+        unmatched.append(_unmatched(mapper_name, keys.name, keys, missing))
+    return {
+        col: pd.Series(lookup.take(codes, col), index=keys.index, name=col)
+        for col in value_cols
+    }
+
+
+def _check_mapper_values(lookup: MapperLookup, col: str, mapper_name: str) -> None:
+    """Raise an error if any key in a mapper maps to a null value."""
+    values = pd.Series(lookup.values[col])
+    if values.isna().any():
+        mapless_errors = lookup.keys[values.isna().to_numpy()].tolist()
+        MappingExecutorLogger.error(
+            f"Mapping doesnt exist for the following {mapper_name} keys: "
+            f"{mapless_errors}"
+        )
+        raise Exception(f"Errors in the {mapper_name} mapper.")
+
+
+def map_product_groups(
+    df: pd.DataFrame,
+    mappers: MapperRegistry,
+    unmatched: List[pd.DataFrame],
+    pg_column: str = "201",
+    sic_column: str = "rusic",
+) -> Dict[str, pd.Series]:
+    """Map missing PG from SIC, then PG numeric to alpha-numeric.
+
+    Args:
+        df (pd.DataFrame): The responses.
+        mappers (MapperRegistry): The registry with the PG mappers.
+        unmatched (List[pd.DataFrame]): The unmatched keys found so far.
+        pg_column (str, optional): The product group column, default 201.
+        sic_column (str, optional): The SIC column, default rusic.
+
+    Returns:
+        Dict[str, pd.Series]: The alpha-numeric PG, replacing pg_column, and
+            the numeric PG in pg_numeric, both categorical.
+    """
+    sic_pg = mappers.lookup(
+        "sic_pg_num_mapper_path", "SIC 2007_CODE", ["2016 > Form PG"]
+    )
+    _check_mapper_values(sic_pg, "2016 > Form PG", "SIC to PG numeric")
+    pg_alpha = mappers.lookup("pg_num_alpha_mapper_path", "pg_numeric", ["pg_alpha"])
+    _check_mapper_values(pg_alpha, "pg_alpha", "PG numeric to alpha-numeric")
+
+    # Fill the missing PG from the SIC, in a copy of the PG column only
+    pg_numeric = df[pg_column].copy()
+    is_null = pg_numeric.isnull()
+    if is_null.any():
+        sic = df.loc[is_null, sic_column]
+        from_sic = _lookup("sic to pg", sic_pg, sic, ["2016 > Form PG"], unmatched)
+        pg_numeric.loc[is_null] = from_sic["2016 > Form PG"]
+
+    pg_numeric = pg_numeric.rename("pg_numeric")
+    alpha = _lookup(
+        "pg numeric to alpha", pg_alpha, pg_numeric, ["pg_alpha"], unmatched
+    )
+    return {
+        pg_column: alpha["pg_alpha"].astype("category"),
+        "pg_numeric": pg_numeric.astype("category"),
+    }
+
+
+def map_ultfoc(
+    df: pd.DataFrame, mappers: MapperRegistry, unmatched: List[pd.DataFrame]
+) -> Dict[str, pd.Series]:
+    """Map each reference to its foreign ownership, giving GB where it is blank."""
+    lookup = mappers.lookup("ultfoc_mapper_path", "ruref", ["ultfoc"])
+    ultfoc = _lookup("ultfoc", lookup, df["reference"], ["ultfoc"], [])["ultfoc"]
+
+    blank = ultfoc.isna() | (ultfoc == "")
+    if blank.any():
+        refs = df["reference"]
+        unmatched.append(_unmatched("ultfoc", "reference", refs, blank.to_numpy()))
+        ultfoc = ultfoc.fillna("GB").replace("", "GB")
+    return {"ultfoc": ultfoc}
+
+
+def map_cellno(
+    df: pd.DataFrame, mappers: MapperRegistry, unmatched: List[pd.DataFrame]
+) -> Dict[str, pd.Series]:
+    """Map each cellnumber to the universe count of its cell."""
+    cellno_df = clean_validate_cellno_mapper(mappers.get("cellno_path"))
+    lookup = MapperLookup.from_mapper(cellno_df, "cellnumber", ["uni_count"])
+    return _lookup("cellno", lookup, df["cellnumber"], ["uni_count"], unmatched)
+
+
+def map_itl_regions(
+    df: pd.DataFrame,
+    postcode_mapper: pd.DataFrame,
+    mappers: MapperRegistry,
+    config: dict,
+    unmatched: List[pd.DataFrame],
+    pc_col: str = "postcodes_harmonised",
+) -> Dict[str, pd.Series]:
+    """Map each postcode to its itl, then each itl to its regions.
+
+    Args:
+        df (pd.DataFrame): The responses.
+        postcode_mapper (pd.DataFrame): Mapper from postcode (pcd2) to itl.
+        mappers (MapperRegistry): The registry with the ITL mapper.
+        config (dict): Pipeline configuration settings.
+        unmatched (List[pd.DataFrame]): The unmatched keys found so far.
+        pc_col (str, optional): The column name for the postcodes.
+
+    Returns:
+        Dict[str, pd.Series]: The postcode mapper columns, including itl, and
+            the region columns.
+    """
+    postcode_mapper = postcode_mapper.rename(columns={"pcd2": pc_col})
+    postcode_cols = [col for col in postcode_mapper.columns if col != pc_col]
+    postcode_lookup = MapperLookup.from_mapper(postcode_mapper, pc_col, postcode_cols)
+    columns = _lookup(
+        "postcode mapper", postcode_lookup, df[pc_col], postcode_cols, unmatched
+    )
+
+    gb_itl_col = config["mappers"]["gb_itl"]
+    geo_cols = config["mappers"]["geo_cols"]
+    itl_mapper = mappers.get("itl_mapper_path")[[gb_itl_col] + geo_cols]
+    itl_lookup = MapperLookup.from_mapper(
+        itl_mapper.rename(columns={gb_itl_col: "itl"}), "itl", geo_cols
+    )
+    columns.update(
+        _lookup("itl mapper", itl_lookup, columns["itl"], geo_cols, unmatched)
+    )
+    return columns
+
+
+def build_postcode_regions(
+    postcode_mapper: pd.DataFrame,
+    mappers: MapperRegistry,
+    config: dict,
+    pc_col: str = "postcodes_harmonised",
+) -> MapperLookup:
+    """Build a lookup from each postcode straight to its itl and regions.
+
+    The postcode to itl and itl to region lookups are composed once, over the
+    postcode mapper, so re-mapping a changed postcode is a single lookup.
+
+    Args:
+        postcode_mapper (pd.DataFrame): Mapper from postcode (pcd2) to itl.
+        mappers (MapperRegistry): The registry with the ITL mapper.
+        config (dict): Pipeline configuration settings.
+        pc_col (str, optional): The column name for the postcodes.
+
+    Returns:
+        MapperLookup: The lookup from postcode to the postcode mapper columns,
+            including itl, and the region columns.
+    """
+    postcode_mapper = postcode_mapper.rename(columns={"pcd2": pc_col})
+    postcodes = postcode_mapper[pc_col].drop_duplicates()
+    columns = map_itl_regions(
+        postcodes.to_frame(), postcode_mapper, mappers, config, [], pc_col
+    )
+    values = {col: values.array for col, values in columns.items()}
+    return MapperLookup(pc_col, pd.Index(postcodes), values)
+
+
+def attach_columns(df: pd.DataFrame, columns: Dict[str, pd.Series]) -> pd.DataFrame:
+    """Attach new columns, and replace existing ones, in a single concat.
+
+    Replaced columns keep their place, new columns are added at the end, and
+    the result has a fresh RangeIndex, as a merge would give.
+    """
+    replaced = sorted(df.columns.get_loc(col) for col in columns if col in df.columns)
+    pieces, start = [], 0
+    for position in replaced:
+        name = df.columns[position]
+        pieces.append(df.iloc[:, start:position])
+        pieces.append(columns[name].to_frame(name))
+        start = position + 1
+    pieces.append(df.iloc[:, start:])
+    new = {col: values for col, values in columns.items() if col not in df.columns}
+    pieces.append(pd.DataFrame(new, index=df.index))
+
+    mapped_df = pd.concat(pieces, axis=1)
+    mapped_df.index = pd.RangeIndex(len(mapped_df))
+    return mapped_df
+
+
+def map_gb_responses(
+    df: pd.DataFrame,
+    mappers: MapperRegistry,
+    postcode_mapper: pd.DataFrame,
+    config: dict,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Map PG, ultfoc, universe count and ITL regions onto the GB responses.
+
+    Args:
+        df (pd.DataFrame): The GB responses.
+        mappers (MapperRegistry): The registry with the validated mappers.
+        postcode_mapper (pd.DataFrame): Mapper from postcode (pcd2) to itl.
+        config (dict): Pipeline configuration settings.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: The mapped responses, and the keys
+            that had no match in their mapper.
+    """
+    unmatched = []
+    columns = map_product_groups(df, mappers, unmatched)
+    columns.update(map_ultfoc(df, mappers, unmatched))
+    columns.update(map_cellno(df, mappers, unmatched))
+    columns.update(map_itl_regions(df, postcode_mapper, mappers, config, unmatched))
+
+    unmatched_df = pd.concat(
+        [pd.DataFrame(columns=UNMATCHED_COLUMNS)] + unmatched, ignore_index=True
+    )
+    MappingExecutorLogger.info("Mapping of the GB responses completed in one pass.")
+    return attach_columns(df, columns), unmatched_df
+
+
+def map_ni_responses(ni_df: pd.DataFrame, mappers: MapperRegistry) -> pd.DataFrame:
+    """Map PG onto the NI responses, and take their ultfoc from foc.
+
+    Args:
+        ni_df (pd.DataFrame): The NI responses.
+        mappers (MapperRegistry): The registry with the PG mappers.
+
+    Returns:
+        pd.DataFrame: The mapped NI responses.
+    """
+    columns = map_product_groups(ni_df, mappers, [])
+    ni_df = attach_columns(ni_df, columns).rename(columns={"foc": "ultfoc"})
+    ni_df["ultfoc"] = ni_df["ultfoc"].fillna("GB").replace("", "GB")
+    return ni_df
+
+
+def check_unmatched(unmatched_df: pd.DataFrame) -> None:
+    """Log the unmatched keys, and raise an error for any that stop the run.
+
+    Args:
+        unmatched_df (pd.DataFrame): The unmatched keys from map_gb_responses.
+
+    Raises:
+        ValueError: Raised if any mapper with the "error" action has unmatched
+            keys. The message lists the keys of every such mapper.
+    """
+    messages = []
+    for (mapper_name, key_col, action), keys in unmatched_df.groupby(
+        ["mapper", "key_col", "action"], sort=False
+    ):
+        msg = (
+            f"The following {key_col} values are not in the {mapper_name} mapper "
+            f"({action}): {keys['key'].tolist()}"
+        )
+        if action == "error":
+            messages.append(msg)
+        elif action == "warn":
+            MappingExecutorLogger.warning(msg)
+        else:
+            MappingExecutorLogger.info(msg)
+
+    if messages:
+        raise ValueError("Nulls found in the mapping joins.\n" + "\n".join(messages))
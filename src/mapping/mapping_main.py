@@ -5,12 +5,8 @@ from datetime import datetime
 from typing import Callable
 
 from src.mapping import mapping_helpers as hlp
-from src.mapping.pg_conversion import run_pg_conversion
-from src.mapping.ultfoc_mapping import join_fgn_ownership
-from src.mapping.cellno_mapping import validate_join_cellno_mapper
-from src.mapping.itl_mapping import join_itl_regions
-from src.staging import staging_helpers as stage_hlp
-from src.staging import validation as val
+from src.mapping import mapping_executor as executor
+from src.mapping.mapper_registry import MapperRegistry
 
 MappingMainLogger = logging.getLogger(__name__)
 
@@ -24,6 +20,7 @@ def run_mapping(
     rd_write_csv: Callable,
     rd_file_exists: Callable,
     run_id: int,
+    mappers: MapperRegistry,
 ):
     """Perform mapping to the responses dataframes and output QA to csv.
 
@@ -36,85 +33,30 @@ def run_mapping(
         rd_write_csv (Callable): Function to write a dataframe to a csv file.
         rd_file_exists (Callable): Function to check if a file exists.
         run_id (int): Unique identifier for the run.
+        mappers (MapperRegistry): Loads and validates the mappers.
 
     Returns:
-        Tuple[pd.DataFrame, pd.DataFrame]: The BERD full responses and Northern Ireland
-            full responses dataframes with the mappers added.
+        Tuple[pd.DataFrame, pd.DataFrame, MapperLookup]: The BERD full responses
+            and Northern Ireland full responses dataframes with the mappers added,
+            and the lookup from postcode to ITL regions.
     """
-    # Load ultfoc (Foreign Ownership) mapper
-    ultfoc_mapper = stage_hlp.load_validate_mapper(
-        "ultfoc_mapper_path", config, MappingMainLogger, rd_file_exists, rd_read_csv
-    )
-
-    # Load ITL mapper
-    itl_mapper = stage_hlp.load_validate_mapper(
-        "itl_mapper_path",
-        config,
-        MappingMainLogger,
-        rd_file_exists,
-        rd_read_csv,
-    )
-
-    # Loading cell number coverage
-    cellno_df = stage_hlp.load_validate_mapper(
-        "cellno_path",
-        config,
-        MappingMainLogger,
-        rd_file_exists,
-        rd_read_csv,
-    )
-
-    # Load and validate the PG mappers
-    pg_num_alpha = stage_hlp.load_validate_mapper(
-        "pg_num_alpha_mapper_path",
-        config,
-        MappingMainLogger,
-        rd_file_exists,
-        rd_read_csv,
-    )
-    val.validate_many_to_one(pg_num_alpha, "pg_numeric", "pg_alpha")
-
-    # Load and validate the SIC to PG mappers, to be used to impute missing PG
-    sic_pg_num = stage_hlp.load_validate_mapper(
-        "sic_pg_num_mapper_path",
-        config,
-        MappingMainLogger,
-        rd_file_exists,
-        rd_read_csv,
-    )
-    val.validate_many_to_one(sic_pg_num, "SIC 2007_CODE", "2016 > Form PG")
-
     # For survey year only 2022 it's necessary to update the reference list
     year = config["years"]["survey_year"]
     if year == 2022:
-        ref_list_817_mapper = stage_hlp.load_validate_mapper(
-            "ref_list_817_mapper_path",
-            config,
-            MappingMainLogger,
-            rd_file_exists,
-            rd_read_csv,
-        )
+        ref_list_817_mapper = mappers.get("ref_list_817_mapper_path")
         full_responses = hlp.update_ref_list(full_responses, ref_list_817_mapper)
     else:
         MappingMainLogger.info(f"Reference list not updated for survey year {year}.")
 
-    # create a tuple for the full_responses and ni_full_responses
-    responses = (full_responses, ni_full_responses)
-    # Join the mappers to the full responses dataframe, with validation.
-    responses = run_pg_conversion(responses, pg_num_alpha, sic_pg_num)
-    responses = join_fgn_ownership(responses, ultfoc_mapper)
-    responses = validate_join_cellno_mapper(responses, cellno_df, config)
-
-    # unpack the responses
-    full_responses, ni_full_responses = responses
-
-    # Join the ITL regions mapper to the BERD full_responses dataframe
-    full_responses = join_itl_regions(
-        full_responses, postcode_mapper, itl_mapper, config
+    # Map PG, ultfoc (foreign ownership), the universe counts of the cells and
+    # the ITL regions onto the BERD responses, in a single pass
+    full_responses, unmatched_df = executor.map_gb_responses(
+        full_responses, mappers, postcode_mapper, config
     )
 
     # Process the NI full responses if they exist
     if not ni_full_responses.empty:
+        ni_full_responses = executor.map_ni_responses(ni_full_responses, mappers)
         ni_full_responses = hlp.create_additional_ni_cols(ni_full_responses, config)
 
     # output QA files
@@ -122,6 +64,12 @@ def run_mapping(
     tdate = datetime.now().strftime("%y-%m-%d")
     survey_year = config["years"]["survey_year"]
 
+    # Report every key missing from its mapper together, then stop on errors
+    if config["global"]["output_mapping_qa"] and not unmatched_df.empty:
+        unmatched_filename = f"{survey_year}_mapping_unmatched_{tdate}_v{run_id}.csv"
+        rd_write_csv(os.path.join(qa_path, unmatched_filename), unmatched_df)
+    executor.check_unmatched(unmatched_df)
+
     if config["global"]["output_mapping_qa"]:
         MappingMainLogger.info("Outputting Mapping QA files.")
         full_responses_filename = (
@@ -140,5 +88,10 @@ def run_mapping(
         )
     MappingMainLogger.info("Finished Mapping NI QA calculation.")
 
+    # Keep the postcode to region lookup, to re-map postcodes changed later
+    postcode_regions = executor.build_postcode_regions(
+        postcode_mapper, mappers, config
+    )
+
     # return mapped_df
-    return (full_responses, ni_full_responses, itl_mapper)
+    return (full_responses, ni_full_responses, postcode_regions)
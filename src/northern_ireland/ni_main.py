@@ -48,6 +48,8 @@ def run_ni(
             config,
             check_file_exists,
             read_csv,
+            write_csv,
+            run_id,
             is_northern_ireland=True,
         )
     else:
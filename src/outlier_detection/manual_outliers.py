@@ -1,9 +1,12 @@
 import logging
 import pandas as pd
 
+from src.utils.wrappers import track_df_changes
+
 ManualOutlierLogger = logging.getLogger(__name__)
 
 
+@track_df_changes
 def apply_manual_outliers(df: pd.DataFrame) -> pd.DataFrame:
     """Applies the manual outliers by creating a new column that
     overwrites the automatic flags with a manual outlier flag.
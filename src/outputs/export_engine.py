@@ -0,0 +1,145 @@
+"""
+Transfer the selected outputs to the export folder, with their manifest.
+
+Each output is copied to the export folder with the storage backend's own
+copy, which is a server-side copy on s3. The manifest metadata is read from
+the source without reading the file again where the backend allows: on s3 the
+header, size and ETag come from one ranged get, and the md5 is the ETag or the
+md5 tag stored when the file was written. The files are transferred on worker
+threads, and the manifest is moved into the export folder only once every file
+is there, so the manifest never names a file that is not yet in place.
+
+Contains the following:
+    read_file_metadata: Reads the header, size and md5 of a file for the manifest.
+    export_outputs: Transfers outputs and writes their manifest.
+"""
+
+# Standard libraries
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+# Local libraries
+from src.outputs.manifest_output import Manifest
+from src.utils.storage import Storage
+
+ExportEngineLogger = logging.getLogger(__name__)
+
+# The number of files transferred at a time
+EXPORT_WORKERS = 4
+
+
+def read_file_metadata(storage: Storage, filepath: str) -> Dict[str, object]:
+    """Read the header, size and md5 of a file for the manifest.
+
+    The header of a csv is its first line, decompressed for .gz and .zst
+    files. The header of a Parquet file is read from its footer.
+
+    Args:
+        storage (Storage): The storage the file is on.
+        filepath (str): The path of the file.
+
+    Returns:
+        Dict[str, object]: The header, sizeBytes and md5 of the file.
+    """
+    if filepath.endswith(".parquet"):
+        header = ",".join(storage.read_parquet_columns(filepath))
+    else:
+        header = storage.read_header(filepath).rstrip("\r\n")
+    return {
+        "header": header,
+        "sizeBytes": int(storage.stat_size(filepath)),
+        "md5": storage.md5sum(filepath),
+    }
+
+
+def _export_file(storage: Storage, src_path: str, export_dir: str) -> dict:
+    """Copy a file into the export folder, returning its metadata."""
+    metadata = read_file_metadata(storage, src_path)
+    # The s3 copy reports failure by returning False rather than raising
+    if storage.copy_file(src_path, export_dir) is False:
+        raise OSError(f"File {src_path} could not be copied to {export_dir}.")
+    ExportEngineLogger.info(f"File {src_path} copied to {export_dir}.")
+    return metadata
+
+
+def _delete_copies(storage: Storage, dst_paths: List[str]) -> None:
+    """Delete the files this export copied to the export folder."""
+    for dst_path in dst_paths:
+        storage.delete_file(dst_path)
+
+
+def export_outputs(
+    storage: Storage,
+    manifest: Manifest,
+    selection: Dict[str, str],
+    schema_headers: Dict[str, str],
+    method: str = "copy",
+    max_workers: int = EXPORT_WORKERS,
+) -> None:
+    """Transfer the selected outputs to the export folder, with their manifest.
+
+    The files are copied concurrently. If a copy fails, or the manifest cannot
+    be written, the files this export copied are deleted and the error raised,
+    so files left by earlier exports are kept. Otherwise the manifest is moved
+    into the export folder last, and for a "move" the outputs are then deleted.
+
+    Args:
+        storage (Storage): The storage the outputs are on.
+        manifest (Manifest): The manifest for the export, with its outgoing
+            directory the outputs folder.
+        selection (Dict[str, str]): The path of each output to export, keyed by
+            output name.
+        schema_headers (Dict[str, str]): The expected header of each output,
+            keyed by "{output}_schema".
+        method (str, optional): "copy" or "move".
+        max_workers (int, optional): The number of files to transfer at a time.
+    """
+    if method not in ("copy", "move"):
+        raise ValueError(f"Unknown transfer method {method}; use copy or move.")
+
+    export_dir = manifest.export_directory
+    src_paths = [str(path) for path in selection.values()]
+    dst_paths = [os.path.join(export_dir, os.path.basename(p)) for p in src_paths]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_export_file, storage, src_path, export_dir)
+            for src_path in src_paths
+        ]
+    copied = [
+        dst_path
+        for dst_path, future in zip(dst_paths, futures)
+        if future.exception() is None
+    ]
+
+    try:
+        # Raises the error of the first failed copy, if any failed
+        copies = [future.result() for future in futures]
+
+        for (output, src_path), metadata in zip(selection.items(), copies):
+            manifest.add_file_metadata(
+                src_path,
+                column_header=schema_headers[f"{output}_schema"],
+                file_header_string=metadata["header"],
+                file_size_bytes=metadata["sizeBytes"],
+                md5sum=metadata["md5"],
+            )
+        manifest.write_manifest()
+    except Exception:
+        _delete_copies(storage, copied)
+        raise
+
+    if manifest.dry_run:
+        _delete_copies(storage, copied)
+        return
+
+    # Only moved in once every file is in place, so it never names a missing file
+    if storage.move_file(manifest.manifest_file_path, export_dir) is False:
+        _delete_copies(storage, copied)
+        raise OSError(f"The manifest could not be moved to {export_dir}.")
+    ExportEngineLogger.info(f"Manifest moved to {export_dir}.")
+
+    if method == "move":
+        for src_path in src_paths:
+            storage.delete_file(src_path)
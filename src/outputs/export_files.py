@@ -2,7 +2,6 @@
 the output folder to the outgoing folder, along with their manifest file."""
 
 
-import os
 import logging
 from datetime import datetime
 import toml
@@ -11,7 +10,9 @@ from pathlib import Path
 import getpass
 
 from src.utils.config import config_setup
+from src.outputs.export_engine import export_outputs
 from src.outputs.manifest_output import Manifest
+from src.utils.storage import get_storage
 
 
 # Set up logging
@@ -79,7 +80,8 @@ def get_file_choice(paths, config: dict):
     (with the "output" prefix removed) and the values are
     complete file paths with a ".csv" extension. The file paths are constructed
     by joining the root output path, directory name,
-    and file name from the configuration.
+    and file name from the configuration. Files chosen with a ".parquet",
+    ".gz" or ".zst" extension keep it, for Parquet and compressed outputs.
 
     Args:
         paths (dict): A dictionary containing various paths. The function
@@ -105,7 +107,11 @@ def get_file_choice(paths, config: dict):
 
     # Use dictionary comprehension to create the selection list dict
     selection_dict = {
-        dir[7:]: Path(f"{root_output}/{dir}/{file}").with_suffix(".csv")
+        dir[7:]: (
+            Path(f"{root_output}/{dir}/{file}")
+            if str(file).endswith((".parquet", ".gz", ".zst"))
+            else Path(f"{root_output}/{dir}/{file}").with_suffix(".csv")
+        )
         for dir, file in output_paths.items()
         if file != "None"
     }
@@ -116,9 +122,14 @@ def get_file_choice(paths, config: dict):
     return selection_dict
 
 
-def check_files_exist(file_list: List, config: dict, isfile: callable):
+def check_files_exist(
+    file_list: List, config: dict, isfile: callable, stat_many: callable = None
+):
     """Check that all the files in the file list exist using
-    the imported isfile function."""
+    the imported isfile function.
+
+    If a stat_many function is given, the files are checked with one batched
+    call instead, which also caches the metadata for the manifest on s3."""
 
     # Check if the output dirs supplied are string, change to list if so
 
@@ -127,6 +138,12 @@ def check_files_exist(file_list: List, config: dict, isfile: callable):
     if isinstance(file_list, str):
         file_list = [file_list]
 
+    if stat_many is not None:
+        stats = stat_many([str(Path(file)) for file in file_list])
+
+        def isfile(path: str) -> bool:
+            return stats[path]["isfile"]
+
     # Check the existence of every file using is_file
     for file in file_list:
         file_path = Path(file)  # Changes to path if str
@@ -139,24 +156,6 @@ def check_files_exist(file_list: List, config: dict, isfile: callable):
     OutgoingLogger.info("All output files exist")
 
 
-def transfer_files(source, destination, method, logger, copy_files, move_files):
-    """
-    Transfer files from source to destination using the specified method and log
-    the action.
-
-    Args:
-        source (str): The source file path.
-        destination (str): The destination file path.
-        method (str): The method to use for transferring files ("copy" or "move").
-        logger (logging.Logger): The logger to use for logging the action.
-    """
-    transfer_func = {"copy": copy_files, "move": move_files}[method]
-    past_tense = {"copy": "copied", "move": "moved"}[method]
-    transfer_func(str(source), destination)
-
-    logger.info(f"Files {source} successfully {past_tense} to {destination}.")
-
-
 def get_username():
     """
     Retrieves the username of the currently logged-in user.
@@ -223,27 +222,9 @@ def run_export(user_config_path: str, dev_config_path: str):
     logging_levels = {"INFO": logging.INFO, "DEBUG": logging.DEBUG}
     logging.basicConfig(level=logging_levels[logging_level.upper()])
 
-    # Check the environment switch
-    platform = config["global"]["platform"]
-
-    if platform == "s3":
-        # create singletion boto3 client object & pass in bucket string
-        from src.utils.singleton_boto import SingletonBoto
-
-        boto3_client = SingletonBoto.get_client(config)  # noqa
-        from src.utils import s3_mods as mods
-
-    elif platform == "network":
-        # If the platform is "network" or "hdfs", there is no need for a client.
-        # Adding a client = None for consistency.
-        config["client"] = None
-        from src.utils import local_file_mods as mods
-    elif platform == "hdfs":
-        config["client"] = None
-        from src.utils import hdfs_mods as mods
-    else:
-        OutgoingLogger.error(f"The selected platform {platform} is wrong")
-        raise ImportError(f"Cannot import {platform}_mods")
+    # Create the storage for the platform in the config
+    storage = get_storage(config)
+    platform = storage.platform
 
     OutgoingLogger.info(f"Using the {platform} file system as data source.")
 
@@ -256,7 +237,12 @@ def run_export(user_config_path: str, dev_config_path: str):
     file_select_dict = get_file_choice(paths, config)
 
     # Check that files exist
-    check_files_exist(list(file_select_dict.values()), config, mods.rd_isfile)
+    check_files_exist(
+        list(file_select_dict.values()),
+        config,
+        storage.isfile,
+        stat_many=storage.stat_many,
+    )
 
     # Creating a manifest object using the Manifest class in manifest_output.py
     manifest = Manifest(
@@ -264,57 +250,27 @@ def run_export(user_config_path: str, dev_config_path: str):
         export_directory=export_folder,
         pipeline_run_datetime=pipeline_run_datetime,
         dry_run=False,
-        delete_file_func=mods.rd_delete_file,
-        md5sum_func=mods.rd_md5sum,
-        stat_size_func=mods.rd_stat_size,
-        isdir_func=mods.rd_isdir,
-        isfile_func=mods.rd_isfile,
-        read_header_func=mods.rd_read_header,
-        string_to_file_func=mods.rd_write_string_to_file,
+        delete_file_func=storage.delete_file,
+        md5sum_func=storage.md5sum,
+        stat_size_func=storage.stat_size,
+        isdir_func=storage.isdir,
+        isfile_func=storage.isfile,
+        read_header_func=storage.read_header,
+        string_to_file_func=storage.write_string_to_file,
+        read_parquet_columns_func=storage.read_parquet_columns,
     )
 
     schemas_header_dict = get_schema_headers(config)
 
-    # Add the short form output file to the manifest object
-    for file_name, file_path in file_select_dict.items():
-        manifest.add_file(
-            file_path,
-            column_header=schemas_header_dict[f"{file_name}_schema"],
-            validate_col_name_length=True,
-            sep=",",
-        )
-
-    # Write the manifest file to the outgoing directory
-    manifest.write_manifest()
-
-    # Move the manifest file to the outgoing folder
-    manifest_file = mods.rd_search_file(manifest.outgoing_directory, "_manifest.json")
-
-    manifest_path = os.path.join(manifest.outgoing_directory, manifest_file)
-
-    transfer_files(
-        manifest_path,
-        manifest.export_directory,
-        "move",
-        OutgoingLogger,
-        mods.rd_copy_file,
-        mods.rd_move_file,
+    # Copy or move the files and their manifest to the export folder
+    export_outputs(
+        storage,
+        manifest,
+        file_select_dict,
+        schemas_header_dict,
+        method=config["export_choices"]["copy_or_move_files"],
     )
 
-    # Copy or Move files to outgoing folder
-    file_transfer_method = config["export_choices"]["copy_or_move_files"]
-
-    for file_path in file_select_dict.values():
-        file_path = os.path.join(file_path)
-        transfer_files(
-            file_path,
-            manifest.export_directory,
-            file_transfer_method,
-            OutgoingLogger,
-            mods.rd_copy_file,
-            mods.rd_move_file,
-        )
-
     log_exports(list(file_select_dict.values()), pipeline_run_datetime, OutgoingLogger)
 
     OutgoingLogger.info("Exporting files finished.")
@@ -1,13 +1,179 @@
+"""Prepare the data for the outputs, and the columns the outputs derive from it.
+
+Several outputs add the same derived columns, such as the CORA status and the
+sizebands, to the same data. form_output_prep registers each frame it prepares
+with OutputColumns, which tags the frame with a token. The token is carried by
+the copies and row filters the outputs make of the frame, so each derived
+column is computed once per prepared frame, the first time an output asks for
+it, and the outputs attach the cached column to their own copy of the rows.
+"""
+import itertools
+import threading
+from typing import Callable, Dict, List
+
 import pandas as pd
+
+import src.outputs.map_output_cols as map_o
 from src.staging.validation import flag_no_rand_spenders
 from src.estimation.apply_weights import apply_weights
 from src.outputs.outputs_helpers import create_period_year
 
 
+def _sum_columns(cols: List[str]) -> Callable:
+    """A derivation summing the given columns, treating missing values as zero."""
+    return lambda df: df[cols].fillna(0).sum(axis=1)
+
+
+def _form_status(df: pd.DataFrame) -> pd.Series:
+    """The CORA status, mapped from statusencoded where form_status is missing."""
+    cols = [col for col in ["form_status", "statusencoded"] if col in df.columns]
+    return map_o.create_cora_status_col(df[cols].copy())["form_status"]
+
+
+def _numeric_answer(col: str) -> Callable:
+    """A derivation mapping a Yes/No question to 1, 2 or 3 for unanswered."""
+    return lambda df: pd.Series(
+        map_o.lookup_codes(df[col], map_o.YES_NO_CODES, map_o.UNANSWERED_CODE),
+        index=df.index,
+    )
+
+
+def _sizeband(df: pd.DataFrame) -> pd.Series:
+    """The sizeband of the frozen employment."""
+    return pd.Series(map_o.band_codes(df["employment"], map_o.SIZEBANDS), df.index)
+
+
+# How each derived column is computed from the columns of the prepared data
+DERIVED_COLUMNS = {
+    "form_status": _form_status,
+    "sizeband": _sizeband,
+    "713": _numeric_answer("713"),
+    "714": _numeric_answer("714"),
+    "251": _numeric_answer("251"),
+    "307": _numeric_answer("307"),
+    "308": _numeric_answer("308"),
+    "309": _numeric_answer("309"),
+    "C_lnd_bl": _sum_columns(["219", "220"]),
+    "ovss_oth": _sum_columns(["243", "244", "245", "246", "247", "249"]),
+    "oth_sc": _sum_columns(["242", "248", "250"]),
+}
+
+
+# The key in DataFrame.attrs of the token of the prepared frame rows came from
+FRAME_TOKEN = "output_frame_token"
+
+# Tokens are unique across OutputColumns, so a token is never mistaken
+_frame_tokens = itertools.count(1)
+
+
+class OutputColumns:
+    """
+    Computes the derived output columns of each prepared frame once.
+
+    A prepared frame is registered with add_frame, which tags it with a token
+    in its attrs. pandas carries attrs through copies and row filters, so an
+    output's copy of any of the frame's rows is matched to the frame by its
+    token. Each derived column is computed on the whole registered frame when
+    first asked for, and aligned to the rows of the frame asking for it.
+
+    A copy of only some of the rows is matched if its index labels are unique,
+    are all in the registered frame and have the same references there.
+    Otherwise, as for a frame that was never registered, the column is derived
+    from the frame itself. The columns are computed from the source columns as
+    they are when first asked for. The outputs run in threads, so the cache is
+    locked while a column is computed.
+
+    Attributes
+    ==========
+    derivations
+        the function computing each derived column from a frame
+    """
+
+    def __init__(self, derivations: Dict[str, Callable] = None):
+        self.derivations = DERIVED_COLUMNS if derivations is None else derivations
+        # The registered frames and their derived columns, keyed by token
+        self._frames: Dict[int, pd.DataFrame] = {}
+        self._columns: Dict[int, Dict[str, pd.Series]] = {}
+        self._lock = threading.Lock()
+
+    def add_frame(self, df: pd.DataFrame) -> None:
+        """Register a prepared frame, tagging it with a new token.
+
+        Args:
+            df (pd.DataFrame): The frame, whose attrs are updated in place.
+        """
+        token = next(_frame_tokens)
+        df.attrs[FRAME_TOKEN] = token
+        with self._lock:
+            self._frames[token] = df
+            self._columns[token] = {}
+
+    def _registered_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """The registered frame the rows of df came from, or None if not known."""
+        frame = self._frames.get(df.attrs.get(FRAME_TOKEN))
+        if frame is None or df.index is frame.index:
+            return frame
+        if not (df.index.is_unique and frame.index.is_unique):
+            return None
+        if "reference" not in df.columns or "reference" not in frame.columns:
+            return None
+        if not df.index.isin(frame.index).all():
+            return None
+        references = frame["reference"].reindex(df.index)
+        if not references.equals(df["reference"]):
+            return None
+        return frame
+
+    def get(self, df: pd.DataFrame, col: str) -> pd.Series:
+        """Get a derived column of a frame, computing it on first request.
+
+        Args:
+            df (pd.DataFrame): A registered frame, or a copy of any of its rows.
+            col (str): The name of the derived column.
+
+        Returns:
+            pd.Series: The derived column, aligned to the frame.
+        """
+        frame = self._registered_frame(df)
+        if frame is None:
+            return self.derivations[col](df)
+
+        with self._lock:
+            columns = self._columns[df.attrs[FRAME_TOKEN]]
+            if col not in columns:
+                columns[col] = self.derivations[col](frame)
+            column = columns[col]
+        if df.index is frame.index:
+            return column
+        return column.reindex(df.index)
+
+    def attach(self, df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
+        """Add derived columns to a frame, replacing any of the same name.
+
+        Args:
+            df (pd.DataFrame): A registered frame, or a copy of any of its rows.
+            cols (List[str]): The derived columns to add.
+
+        Returns:
+            pd.DataFrame: A shallow copy of the frame with the columns added.
+        """
+        df = df.copy(deep=False)
+        for col in cols:
+            df[col] = self.get(df, col)
+        return df
+
+    def clear(self) -> None:
+        """Drop the cached columns, once the outputs are written."""
+        with self._lock:
+            self._frames.clear()
+            self._columns.clear()
+
+
 def form_output_prep(
     weighted_df: pd.DataFrame,
     ni_full_responses: pd.DataFrame,
     config: dict,
+    columns: OutputColumns = None,
 ):
     """Prepares the data for the outputs.
 
@@ -15,6 +181,8 @@ def form_output_prep(
         weighted_df (pd.DataFrame): Dataset with weights computed but not applied
         ni_full_responses(pd.DataFrame): Dataset with all NI data
         config (dict): The configuration settings.
+        columns (OutputColumns, optional): If given, each prepared frame is
+            registered with it, so the outputs share their derived columns.
 
     Returns:
         ni_full_responses (pd.DataFrame): If available, prepared NI data
@@ -39,11 +207,12 @@ def form_output_prep(
     if ni_full_responses is not None:
         # outputs_df = pd.concat([outputs_df, ni_full_responses])
         tau_outputs_df = pd.concat([tau_outputs_df, ni_full_responses])
-
-        return ni_full_responses, outputs_df, tau_outputs_df
-
     else:
         # create an empty ni_responses dataframe
         ni_full_responses = pd.DataFrame()
 
-        return ni_full_responses, outputs_df, tau_outputs_df
+    if columns is not None:
+        for df in [ni_full_responses, outputs_df, tau_outputs_df]:
+            columns.add_frame(df)
+
+    return ni_full_responses, outputs_df, tau_outputs_df
@@ -8,6 +8,7 @@ from datetime import datetime
 
 from src.outputs.outputs_helpers import create_output_df
 import src.outputs.map_output_cols as map_o
+from src.outputs.form_output_prep import OutputColumns
 from src.staging.validation import load_schema
 
 OutputMainLogger = logging.getLogger(__name__)
@@ -21,6 +22,7 @@ def output_frozen_group(
     write_csv: Callable,
     run_id: int,
     deduplicate: bool = True,
+    columns: OutputColumns = None,
 ) -> Dict[str, int]:
     """Creates a "frozen group" output  for the entire UK. In BERD (GB) data,
     creates foreign ownership and cora status. Selects the columns we need for
@@ -39,6 +41,8 @@ def output_frozen_group(
          This will be the hdfs or network version depending on settings.
         run_id (int): The current run id
         deduplicate (bool): If true, the data is deduplicated by aggregation.
+        columns (OutputColumns, optional): The derived columns shared between
+            outputs. If not given, the columns are derived for this output only.
 
     Returns:
         None
@@ -46,10 +50,14 @@ def output_frozen_group(
     """
     output_path = config["outputs_paths"]["outputs_master"]
 
-    df_gb = map_o.map_FG_cols_to_numeric(df_gb)
+    # Map the yes/no questions to numeric format, and the CORA statuses from
+    # the statusencoded column
+    columns = OutputColumns() if columns is None else columns
+    fg_numeric_cols = ["251", "307", "308", "309"]
+    df_gb = columns.attach(df_gb, fg_numeric_cols + ["form_status"])
     if df_ni is not None:
         if not df_ni.empty:
-            df_ni = map_o.map_FG_cols_to_numeric(df_ni)
+            df_ni = columns.attach(df_ni, fg_numeric_cols)
 
     # Categorical columns that we have in BERD and NI data
     category_columns = [
@@ -159,9 +167,6 @@ def output_frozen_group(
         "q258",
     ]
 
-    # Map to the CORA statuses from the statusencoded column
-    df_gb = map_o.create_cora_status_col(df_gb)
-
     # Select the columns we need
     need_columns = category_columns + value_columns
     df_gb_need = df_gb[need_columns]
@@ -4,7 +4,7 @@ import pandas as pd
 from datetime import datetime
 from typing import Callable, Dict, Any
 
-import src.outputs.map_output_cols as map_o
+from src.outputs.form_output_prep import OutputColumns
 from src.staging.validation import load_schema
 from src.outputs.outputs_helpers import create_output_df, regions
 
@@ -17,6 +17,7 @@ def output_gb_sas(
     intram_tot_dict: Dict[str, int],
     write_csv: Callable,
     run_id: int,
+    columns: OutputColumns = None,
 ) -> Dict[str, int]:
     """Run the outputs module.
 
@@ -27,31 +28,21 @@ def output_gb_sas(
         write_csv (Callable): Function to write to a csv file.
          This will be the hdfs or network version depending on settings.
         run_id (int): The current run id
-        ultfoc_mapper (pd.DataFrame): The ULTFOC mapper DataFrame.
+        columns (OutputColumns, optional): The derived columns shared between
+            outputs. If not given, the columns are derived for this output only.
     """
     output_path = config["outputs_paths"]["outputs_master"]
 
-    # Filter regions for GB only
-    df1 = df.copy().loc[df["region"].isin(regions()["GB"])]
-
-    # Prepare the columns needed for outputs:
-
-    # Map to the CORA statuses from the statusencoded column
-    df1 = map_o.create_cora_status_col(df1)
-
-    # Map the sizebands based on frozen employment
-    df1 = map_o.map_sizebands(df1)
-
-    # Create C_lnd_bl
-    df1["C_lnd_bl"] = df1[["219", "220"]].fillna(0).sum(axis=1)
-
-    # Create ovss_oth
-    df1["ovss_oth"] = (
-        df1[["243", "244", "245", "246", "247", "249"]].fillna(0).sum(axis=1)
+    # Prepare the columns needed for outputs: the CORA statuses, sizebands
+    # based on frozen employment, C_lnd_bl, ovss_oth and oth_sc. They are
+    # derived before filtering, so they are shared with the other outputs.
+    columns = OutputColumns() if columns is None else columns
+    df = columns.attach(
+        df, ["form_status", "sizeband", "C_lnd_bl", "ovss_oth", "oth_sc"]
     )
 
-    # Create oth_sc
-    df1["oth_sc"] = df1[["242", "248", "250"]].fillna(0).sum(axis=1)
+    # Filter regions for GB only
+    df1 = df.loc[df["region"].isin(regions()["GB"])]
 
     # caluclate the intram total for QA across different outputs
     intram_tot_dict["GB_sas"] = round(df1["211"].sum(), 0)
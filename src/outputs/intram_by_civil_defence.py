@@ -5,6 +5,8 @@ import numpy as np
 from datetime import datetime
 from typing import Callable, Dict, Any
 
+from src.outputs.intram_cube import build_intram_cube, roll_up
+
 OutputMainLogger = logging.getLogger(__name__)
 
 
@@ -14,6 +16,7 @@ def output_intram_by_civil_defence(
     write_csv: Callable,
     run_id: int,
     civil_defence_detailed: pd.DataFrame,
+    cube: pd.DataFrame = None,
 ):
     """Run the outputs module.
 
@@ -24,7 +27,8 @@ def output_intram_by_civil_defence(
          This will be the hdfs or network version depending on settings.
         run_id (int): The current run id
         civil_defence_detailed (pd.DataFrame): Detailed schema of C/D output
-
+        cube (pd.DataFrame, optional): The intram cube shared by the outputs.
+            If not given, it is built from df.
 
     """
     output_path = config["outputs_paths"]["outputs_master"]
@@ -32,11 +36,14 @@ def output_intram_by_civil_defence(
     period = config["years"]["survey_year"]
     period_str = str(period)
 
-    # Group by civil/defence (200) and aggregate intram (211)
+    if cube is None:
+        cube = build_intram_cube(df)
+
+    # Roll up to civil/defence (200) and aggregate intram (211)
     key_col = "200"
     value_col = "211"
 
-    df_agg = df.groupby([key_col]).agg({value_col: "sum"}).reset_index()
+    df_agg = roll_up(cube, [key_col], value_col=value_col)
 
     # Merge with output table
     df_merge = civil_defence_detailed.merge(
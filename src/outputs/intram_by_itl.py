@@ -11,6 +11,7 @@ from typing import Callable, Dict, Any, Union, Tuple
 # Third Party Imports
 import pandas as pd
 
+from src.outputs.intram_cube import build_intram_cube, roll_up
 
 OutputMainLogger = logging.getLogger(__name__)
 
@@ -85,6 +86,7 @@ def aggregate_itl(
     ni_df: pd.DataFrame,
     config,
     uk_output: bool = False,
+    cube: pd.DataFrame = None,
 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """Aggregates a dataframe to an ITL level.
 
@@ -93,24 +95,22 @@ def aggregate_itl(
         ni_df (pd.DataFrame): The NI microdata (weights are 1).
         config (Dict[str, Any]): Pipeline configuation settings.
         uk_output (bool, optional): Whether to output UK or GB data. Defaults to False.
+        cube (pd.DataFrame, optional): The intram cube shared by the outputs.
+            If not given, it is built from gb_df and ni_df.
 
     Returns:
         Tuple[pd.DataFrame, pd.DataFrame]: The ITL1 and ITL2 dataframes.
     """
     CURRENT_YEAR = config["years"]["survey_year"]
     GEO_COLS = config["mappers"]["geo_cols"]
-    BASE_COLS = ["postcodes_harmonised", "formtype", "211"]
-    df = gb_df[GEO_COLS + BASE_COLS]
 
-    # conditionally include NI responses to produce UK
-    if uk_output:
-        ni_df = ni_df.copy()[["formtype", "211"]]
-        for col in GEO_COLS + ["postcodes_harmonised"]:
-            ni_df[col] = pd.NA
-        df = df.append(ni_df, ignore_index=True).copy()
+    # NI responses have no ITL codes, so are included in the UK cube but
+    # dropped when rolling up to ITL regions
+    if cube is None:
+        cube = build_intram_cube(gb_df, ni_df if uk_output else None, GEO_COLS)
 
     # Aggregate to ITL2 and ITL1 (Keep 3 and 4 letter codes)
-    itl2 = df.groupby(GEO_COLS).agg({"211": "sum"}).reset_index()
+    itl2 = roll_up(cube, GEO_COLS, include_ni=uk_output)
     itl1 = itl2.drop(GEO_COLS[:2], axis=1).copy()
     itl1 = itl1.groupby(GEO_COLS[2:]).agg({"211": "sum"}).copy().reset_index()
 
@@ -130,6 +130,7 @@ def output_intram_by_itl(
     write_csv: Callable,
     run_id: int,
     uk_output: bool = False,
+    cube: pd.DataFrame = None,
 ):
     """Generate outputs aggregated to ITL levels 1 and 2.
 
@@ -141,12 +142,13 @@ def output_intram_by_itl(
         write_csv (Callable): A function to write to a csv file.
         run_id (int): The current run ID.
         uk_output (bool, optional): Whether to output UK or GB data. Defaults to False.
+        cube (pd.DataFrame, optional): The intram cube shared by the outputs.
     """
     # Declare Config Values
     OUTPUT_PATH = config["outputs_paths"]["outputs_master"]
 
     # Aggregate to ITL2 and ITL1 (Keep 3 and 4 letter codes)
-    itl1, itl2 = aggregate_itl(gb_df, ni_df, config, uk_output)
+    itl1, itl2 = aggregate_itl(gb_df, ni_df, config, uk_output, cube)
 
     # Export UK outputs
     area = "gb" if not uk_output else "uk"
@@ -4,6 +4,8 @@ import pandas as pd
 from datetime import datetime
 from typing import Callable, Dict, Any
 
+from src.outputs.intram_cube import build_intram_cube, roll_up
+
 OutputMainLogger = logging.getLogger(__name__)
 
 
@@ -16,6 +18,7 @@ def output_intram_by_pg(
     write_csv: Callable,
     run_id: int,
     uk_output: bool = False,
+    cube: pd.DataFrame = None,
 ) -> Dict[str, int]:
     """Run the outputs module.
 
@@ -29,6 +32,8 @@ def output_intram_by_pg(
             This will be the hdfs or network version depending on settings.
         run_id (int): The current run id
         uk_output (bool): If True, the output will include NI data.
+        cube (pd.DataFrame, optional): The intram cube shared by the outputs.
+            If not given, it is built from gb_df and ni_df.
 
     Returns:
         intram_tot_dict (dict): Dictionary with the intramural totals.
@@ -38,15 +43,11 @@ def output_intram_by_pg(
     key_col = "201"
     value_col = "211"
 
-    if uk_output:
-        cols_to_keep = [col for col in gb_df.columns if col in ni_df.columns]
-        gb_df = gb_df[cols_to_keep]
-        ni_df = ni_df[cols_to_keep]
-        # append the NI data to the GB data
-        gb_df = gb_df.append(ni_df)
+    if cube is None:
+        cube = build_intram_cube(gb_df, ni_df if uk_output else None)
 
-    # Group by PG and aggregate intram
-    df_agg = gb_df.groupby([key_col]).agg({value_col: "sum"}).reset_index()
+    # Roll up to PG to aggregate intram, including NI for the UK output
+    df_agg = roll_up(cube, [key_col], include_ni=uk_output, value_col=value_col)
 
     # Create Total and concatinate it to df_agg
     value_tot = df_agg[value_col].sum()
@@ -4,6 +4,8 @@ import pandas as pd
 from datetime import datetime
 from typing import Callable, Dict, Any
 
+from src.outputs.intram_cube import build_intram_cube, roll_up
+
 OutputMainLogger = logging.getLogger(__name__)
 
 
@@ -14,6 +16,7 @@ def output_intram_by_sic(
     write_csv: Callable,
     run_id: int,
     sic_div_detailed: pd.DataFrame,
+    cube: pd.DataFrame = None,
 ) -> Dict[str, int]:
     """Run the outputs module.
 
@@ -25,6 +28,8 @@ def output_intram_by_sic(
          This will be the hdfs or network version depending on settings.
         run_id (int): The current run id
         sic_div_detailed (pd.DataFrame): Format of the SIC output as mapper
+        cube (pd.DataFrame, optional): The intram cube shared by the outputs.
+            If not given, it is built from df.
 
     Returns:
         intram_tot_dict (dict): Dictionary with the intramural totals.
@@ -32,15 +37,14 @@ def output_intram_by_sic(
     output_path = config["outputs_paths"]["outputs_master"]
     period = config["years"]["survey_year"]
 
-    # Create sic_division column from rusic
-    df["rusic_string"] = df["rusic"].astype(str).str.zfill(5)
-    df["sic_division"] = df["rusic_string"].str[:2]
+    if cube is None:
+        cube = build_intram_cube(df)
 
-    # Group by sic_division and aggregate intram
+    # Roll up to the sic_division, derived from rusic, and aggregate intram
     key_col = "sic_division"
     value_col = "211"
 
-    df_agg = df.groupby([key_col]).agg({value_col: "sum"}).reset_index()
+    df_agg = roll_up(cube, [key_col], value_col=value_col)
 
     # Create Total and concatinate it to df_agg
     value_tot = df_agg[value_col].sum()
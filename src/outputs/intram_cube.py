@@ -0,0 +1,96 @@
+"""Pre-aggregate intramural expenditure once for all of the intram outputs.
+
+The intram outputs each sum question 211 over a different grouping of the same
+microdata: ITL regions, product group (201), SIC division and civil or
+defence (200). Rather than each output grouping the microdata itself, the
+cube groups it once by every one of these dimensions together. Each output
+then rolls the much smaller cube up to its own dimensions.
+"""
+# Standard Library Imports
+from typing import List
+
+# Third Party Imports
+import pandas as pd
+
+# The dimensions of the cube, after the source and the geographic columns
+CUBE_DIMENSIONS = ["201", "sic_division", "200", "formtype"]
+
+
+def sic_division(rusic: pd.Series) -> pd.Series:
+    """Get the two digit SIC division from the five digit SIC code."""
+    return rusic.astype(str).str.zfill(5).str[:2]
+
+
+def _cube_keys(
+    df: pd.DataFrame, source: str, geo_cols: List[str], value_col: str
+) -> pd.DataFrame:
+    """Select the dimensions and value of the cube, using NA for any missing."""
+    keys = pd.DataFrame(index=df.index)
+    keys["source"] = source
+    for dim in geo_cols + CUBE_DIMENSIONS:
+        if dim == "sic_division" and "rusic" in df.columns:
+            keys[dim] = sic_division(df["rusic"])
+        else:
+            keys[dim] = df[dim] if dim in df.columns else pd.NA
+    keys[value_col] = df[value_col]
+    return keys
+
+
+def build_intram_cube(
+    gb_df: pd.DataFrame,
+    ni_df: pd.DataFrame = None,
+    geo_cols: List[str] = None,
+    value_col: str = "211",
+) -> pd.DataFrame:
+    """Sum a value over every combination of the intram output dimensions.
+
+    Rows with missing dimensions are kept, so that rolling up to any subset of
+    the dimensions gives the same result as grouping the microdata directly.
+
+    Args:
+        gb_df (pd.DataFrame): The GB microdata with weights applied.
+        ni_df (pd.DataFrame, optional): The NI microdata, for UK outputs.
+        geo_cols (List[str], optional): The ITL code and name columns.
+        value_col (str, optional): The column to sum. Defaults to "211".
+
+    Returns:
+        pd.DataFrame: The cube, with a source column of "gb" or "ni", a column
+            for each dimension, and the summed value.
+    """
+    geo_cols = geo_cols or []
+    frames = [_cube_keys(gb_df, "gb", geo_cols, value_col)]
+    if ni_df is not None and not ni_df.empty:
+        frames.append(_cube_keys(ni_df, "ni", geo_cols, value_col))
+    keys = pd.concat(frames, ignore_index=True)
+
+    dims = ["source"] + geo_cols + CUBE_DIMENSIONS
+    return (
+        keys.groupby(dims, dropna=False, sort=False, observed=True)[value_col]
+        .sum()
+        .reset_index()
+    )
+
+
+def roll_up(
+    cube: pd.DataFrame,
+    dims: List[str],
+    include_ni: bool = False,
+    value_col: str = "211",
+) -> pd.DataFrame:
+    """Sum the cube over the given dimensions.
+
+    Like grouping the microdata, groups with a missing value in any of the
+    dimensions are dropped.
+
+    Args:
+        cube (pd.DataFrame): The cube from build_intram_cube.
+        dims (List[str]): The dimensions to group by.
+        include_ni (bool, optional): Whether to include NI, for UK outputs.
+        value_col (str, optional): The summed column. Defaults to "211".
+
+    Returns:
+        pd.DataFrame: The value summed for each group, sorted by the groups.
+    """
+    if not include_ni:
+        cube = cube.loc[cube["source"] == "gb"]
+    return cube.groupby(dims).agg({value_col: "sum"}).reset_index()
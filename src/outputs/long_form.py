@@ -4,7 +4,7 @@ import pandas as pd
 from datetime import datetime
 from typing import Callable, Dict, Any
 
-import src.outputs.map_output_cols as map_o
+from src.outputs.form_output_prep import OutputColumns
 from src.staging.validation import load_schema
 from src.outputs.outputs_helpers import create_output_df
 
@@ -16,6 +16,7 @@ def output_long_form(
     config: Dict[str, Any],
     write_csv: Callable,
     run_id: int,
+    columns: OutputColumns = None,
 ):
     """Run the outputs module on long forms.
 
@@ -25,13 +26,15 @@ def output_long_form(
         write_csv (Callable): Function to write to a csv file.
             This will be the hdfs or network version depending on settings.
         run_id (int): The current run id
-        ultfoc_mapper (pd.DataFrame): The ULTFOC mapper DataFrame.
+        columns (OutputColumns, optional): The derived columns shared between
+            outputs. If not given, the columns are derived for this output only.
 
     """
     output_path = config["outputs_paths"]["outputs_master"]
 
     # Map to the CORA statuses from the statusencoded column
-    df = map_o.create_cora_status_col(df)
+    columns = OutputColumns() if columns is None else columns
+    df = columns.attach(df, ["form_status"])
 
     # Filter for long-forms/NI (status mapping has already been done)
     df = df.loc[((df["formtype"] == "0001") | (df["formtype"] == "0003"))]
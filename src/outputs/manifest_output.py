@@ -44,6 +44,7 @@ class Manifest:
         string_to_file_func: callable,
         dry_run: bool = False,
         delete_on_fail=False,
+        read_parquet_columns_func: callable = None,
     ):
         self.outgoing_directory = outgoing_directory
         self.export_directory = export_directory
@@ -82,6 +83,7 @@ class Manifest:
         self.isfile = isfile_func
         self.read_header = read_header_func
         self.string_to_file = string_to_file_func
+        self.read_parquet_columns = read_parquet_columns_func
 
     def add_file(
         self,
@@ -101,11 +103,7 @@ class Manifest:
         column_header
             the exact column header string
         """
-        if "outputs" not in str(relative_file_path):
-            raise ManifestError(
-                f"""File must be in a subdirectory of the outgoing directory:
-                    {relative_file_path}"""
-            )
+        self._check_outgoing(relative_file_path)
 
         absolute_file_path = os.path.join(self.outgoing_directory, relative_file_path)
 
@@ -115,11 +113,47 @@ class Manifest:
                     {absolute_file_path}"""
             )
         # Get the col headers from the file
-        file_header_string = self.read_header(absolute_file_path)
+        file_header_string = self._read_file_header(absolute_file_path, sep)
+
+        self.add_file_metadata(
+            relative_file_path,
+            column_header,
+            file_header_string,
+            int(self.stat_size(absolute_file_path)),
+            self.md5sum(absolute_file_path),
+            validate_col_name_length,
+            sep,
+        )
 
-        # Cleanup file_header_list because \n is appearing in it
-        file_header_string = file_header_string.replace("\n", "")
+    def add_file_metadata(
+        self,
+        relative_file_path: str,
+        column_header: str,
+        file_header_string: str,
+        file_size_bytes: int,
+        md5sum: str,
+        validate_col_name_length: bool = True,
+        sep: str = ",",
+    ):
+        """
+        Add a file to the manifest from metadata already read, such as the
+        header, size and md5 computed while the file was being transferred.
 
+        Parameters
+        ----------
+        relative_file_path
+            from outgoing directory to the file that you want to add to the manifest
+        column_header
+            the exact column header string
+        file_header_string
+            the column header read from the file
+        file_size_bytes
+            the size of the file in bytes
+        md5sum
+            the md5sum of the file
+        """
+        self._check_outgoing(relative_file_path)
+        absolute_file_path = os.path.join(self.outgoing_directory, relative_file_path)
         file_header_list = file_header_string.split(sep)
 
         if file_header_string != column_header:
@@ -163,7 +197,6 @@ class Manifest:
                     "of 32: {col_above_max_len}\n"
                 )
         # Check that files are not more than 2.5Gb as nifi can't cope
-        file_size_bytes = int(self.stat_size(absolute_file_path))
         file_size_gb = file_size_bytes / 1024**3
         if file_size_gb > 2.5:
             raise ManifestError(
@@ -175,11 +208,36 @@ class Manifest:
             "file": os.path.basename(relative_file_path),
             "subfolder": os.path.dirname(relative_file_path),
             "sizeBytes": file_size_bytes,
-            "md5sum": self.md5sum(absolute_file_path),
+            "md5sum": md5sum,
             "header": column_header,
         }
         self.manifest["files"].append(file_manifest)
 
+    @staticmethod
+    def _check_outgoing(relative_file_path: str):
+        """Check a file is in a subdirectory of the outgoing directory."""
+        if "outputs" not in str(relative_file_path):
+            raise ManifestError(
+                f"""File must be in a subdirectory of the outgoing directory:
+                    {relative_file_path}"""
+            )
+
+    def _read_file_header(self, absolute_file_path: str, sep: str) -> str:
+        """
+        Read the column header of a file, as a string joined by `sep`.
+        Parquet files hold their column names in the footer metadata, so only
+        that is read; other files are read up to the end of the first line.
+        """
+        if str(absolute_file_path).endswith(".parquet"):
+            if self.read_parquet_columns is None:
+                raise ManifestError(
+                    f"Cannot read the Parquet header of {absolute_file_path}"
+                )
+            return sep.join(self.read_parquet_columns(absolute_file_path))
+
+        # Cleanup file_header_list because \n is appearing in it
+        return self.read_header(absolute_file_path).replace("\n", "")
+
     def write_manifest(self):
         """
         Write outgoing file manifest to JSON in HDFS.
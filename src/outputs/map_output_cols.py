@@ -1,11 +1,89 @@
-"""Map the missing columns that are required for the outputs"""
+"""Map the missing columns that are required for the outputs
+
+The mappings are built on two vectorised kernels: band_codes, which finds the
+band of each value with a binary search of the band edges, and lookup_codes,
+which maps each distinct value of a column once and takes the result for each
+row by its categorical code. Both accept numpy, nullable, categorical and
+Arrow backed columns.
+"""
 import logging
+from typing import Any, Dict, List, Tuple
 
 import pandas as pd
 import numpy as np
 
 OutputMainLogger = logging.getLogger(__name__)
 
+# The (min, max) frozen employment of each sizeband, numbered from 1
+SIZEBANDS = [(0, 9), (10, 19), (20, 49), (50, 99), (100, 249), (250, np.inf)]
+
+# The CORA status for each statusencoded value
+CORA_STATUSES = {
+    "100": "200",
+    "101": "100",
+    "102": "1000",
+    "200": "400",
+    "201": "500",
+    "210": "600",
+    "211": "800",
+    "302": "1200",
+    "303": "1300",
+    "304": "900",
+    "309": "1400",
+}
+
+# The numeric code for each answer to a yes/no question; others are unanswered
+YES_NO_CODES = {"Yes": 1, "No": 2, "": 3}
+UNANSWERED_CODE = 3
+
+
+def band_codes(
+    values: pd.Series, bands: List[Tuple[float, float]]
+) -> pd.arrays.IntegerArray:
+    """Number the band each value falls in, from 1, by binary search.
+
+    Args:
+        values (pd.Series): The values to band.
+        bands (List[Tuple[float, float]]): The inclusive (min, max) of each
+            band, in ascending order.
+
+    Returns:
+        pd.arrays.IntegerArray: The band of each value, missing if the value is
+            missing or outside every band.
+    """
+    mins = np.array([band[0] for band in bands], dtype=float)
+    maxs = np.array([band[1] for band in bands], dtype=float)
+    x = pd.Series(values).astype("Float64").to_numpy(dtype=float, na_value=np.nan)
+
+    position = np.searchsorted(mins, x, side="right") - 1
+    in_band = (position >= 0) & (x <= maxs[position.clip(0)])
+    return pd.arrays.IntegerArray((position + 1).astype("int64"), ~in_band)
+
+
+def lookup_codes(
+    values: pd.Series, table: Dict[Any, Any], default: Any = pd.NA, dtype="Int64"
+):
+    """Map values through a lookup table, once per distinct value.
+
+    Args:
+        values (pd.Series): The values to map.
+        table (Dict[Any, Any]): The result for each value.
+        default (Any, optional): The result for missing values, and values not
+            in the table.
+        dtype (optional): The dtype of the results. Defaults to "Int64".
+
+    Returns:
+        ExtensionArray: The result for each value.
+    """
+    categorical = pd.Categorical(values)
+    # One result per category, followed by the default for code -1
+    results = pd.array(
+        [table.get(category, default) for category in categorical.categories]
+        + [default],
+        dtype=dtype,
+    )
+    return results.take(np.asarray(categorical.codes))
+
 
 def map_sizebands(
     df: pd.DataFrame,
@@ -18,34 +96,7 @@ def map_sizebands(
     Returns:
         (pd.DataFrame): The dataframe with the sizebands column added
     """
-    # Create a dictionary of sizeband parameters
-    sizeband_dict = {
-        1: {"min": 0, "max": 9},
-        2: {"min": 10, "max": 19},
-        3: {"min": 20, "max": 49},
-        4: {"min": 50, "max": 99},
-        5: {"min": 100, "max": 249},
-        6: {"min": 250, "max": np.inf},
-    }
-
-    # Create empty column
-    df["sizeband"] = np.nan
-
-    # Create conditions for sizebands
-    conditions = [
-        (sizeband_dict[key]["min"] <= df["employment"])
-        & (df["employment"] <= sizeband_dict[key]["max"])
-        for key in sizeband_dict.keys()
-    ]
-    decisions = [key for key in sizeband_dict.keys()]
-
-    # Apply the sizebands
-    for i in range(len(conditions)):
-        df.loc[conditions[i], "sizeband"] = decisions[i]
-
-    # Convert datatype to int
-    df["sizeband"] = df["sizeband"].astype("Int64")
-
+    df["sizeband"] = band_codes(df["employment"], SIZEBANDS)
     return df
 
 
@@ -60,44 +111,15 @@ def create_cora_status_col(df, main_col="statusencoded"):
     Returns:
         df: main data with cora status column added
     """
-    # Create hardcoded dictionary for mapping
-    status_before = [
-        "100",
-        "101",
-        "102",
-        "200",
-        "201",
-        "210",
-        "211",
-        "302",
-        "303",
-        "304",
-        "309",
-    ]
-    status_after = [
-        "200",
-        "100",
-        "1000",
-        "400",
-        "500",
-        "600",
-        "800",
-        "1200",
-        "1300",
-        "900",
-        "1400",
-    ]
-
-    cora_dict = dict(zip(status_before, status_after))
-
     # Create a new column, if required, and map values from main_col
-    # using the cora_dict.  NI already have form_status,
+    # using the CORA statuses.  NI already have form_status,
     # so it only deals with rows with a value in the main col
     if "form_status" not in df.columns:
         df["form_status"] = None
-    df.loc[df["form_status"].isnull(), "form_status"] = df.loc[
-        df["form_status"].isnull(), main_col
-    ].map(cora_dict)
+    cora_status = lookup_codes(df[main_col], CORA_STATUSES, np.nan, dtype=object)
+    df["form_status"] = df["form_status"].where(
+        df["form_status"].notnull(), cora_status
+    )
 
     return df
 
@@ -106,8 +128,7 @@ def map_to_numeric(df: pd.DataFrame):
     """Map q713 and q714 in dataframe from letters to numeric format
     Yes is mapped to 1
     No is mapped to 2
-    Unanswered is mapped to 3
-    Others are mapped to None
+    Unanswered, and any other answer, is mapped to 3
 
     Args:
         df (pd.DataFrame): The original dataframe
@@ -115,20 +136,9 @@ def map_to_numeric(df: pd.DataFrame):
     Returns:
         df: Dataframe with numeric values for q713/714
     """
-
-    df = df.astype({"713": "object", "714": "object"})
-    # Map the actual responses to the corresponding integer
-    mapper_dict = {"Yes": 1, "No": 2, "": 3}
-
-    df["713"] = df["713"].map(mapper_dict)
-    df["714"] = df["714"].map(mapper_dict)
-
-    # Convert all nulls to unanswered (map to 3)
-    df.loc[df["713"].isnull(), "713"] = 3
-    df.loc[df["714"].isnull(), "714"] = 3
-
-    # Return columns as integers
-    df = df.astype({"713": "Int64", "714": "Int64"})
+    df = df.copy(deep=False)
+    for col in ["713", "714"]:
+        df[col] = lookup_codes(df[col], YES_NO_CODES, UNANSWERED_CODE)
     return df
 
 
@@ -146,18 +156,7 @@ def map_FG_cols_to_numeric(
     Returns:
         df: Dataframe with numeric values for specified cols
     """
-
     for col in col_list:
-        df[col] = df[col].astype("object")
-        # Map the actual responses to the corresponding integer
-        mapper_dict = {"Yes": 1, "No": 2, "": 3}
-
-        df[col] = df[col].map(mapper_dict)
-
-        # Convert all nulls to unanswered (map to 3)
-        df.loc[df[col].isnull(), col] = 3
-
-        # Return columns as integers
-        df[col] = df[col].astype("Int64")
+        df[col] = lookup_codes(df[col], YES_NO_CODES, UNANSWERED_CODE)
 
     return df
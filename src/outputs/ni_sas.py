@@ -3,7 +3,7 @@ import logging
 import pandas as pd
 from datetime import datetime
 from typing import Callable, Dict, Any
-import src.outputs.map_output_cols as map_o
+from src.outputs.form_output_prep import OutputColumns
 from src.staging.validation import load_schema
 from src.outputs.outputs_helpers import create_output_df
 
@@ -15,6 +15,7 @@ def output_ni_sas(
     config: Dict[str, Any],
     write_csv: Callable,
     run_id: int,
+    columns: OutputColumns = None,
 ):
     """Run the outputs module.
 
@@ -24,22 +25,15 @@ def output_ni_sas(
         write_csv (Callable): Function to write to a csv file.
             This will be the hdfs or network version depending on settings.
         run_id (int): The current run id
+        columns (OutputColumns, optional): The derived columns shared between
+            outputs. If not given, the columns are derived for this output only.
     """
     output_path = config["outputs_paths"]["outputs_master"]
 
-    # Map the sizebands based on frozen employment
-    df = map_o.map_sizebands(df)
-
-    # Create C_lnd_bl
-    df["C_lnd_bl"] = df[["219", "220"]].fillna(0).sum(axis=1)
-
-    # Create ovss_oth
-    df["ovss_oth"] = (
-        df[["243", "244", "245", "246", "247", "249"]].fillna(0).sum(axis=1)
-    )
-
-    # Create oth_sc
-    df["oth_sc"] = df[["242", "248", "250"]].fillna(0).sum(axis=1)
+    # Map the sizebands based on frozen employment, and create C_lnd_bl,
+    # ovss_oth and oth_sc
+    columns = OutputColumns() if columns is None else columns
+    df = columns.attach(df, ["sizeband", "C_lnd_bl", "ovss_oth", "oth_sc"])
 
     # Create NI SAS output dataframe with required columns from schema
     schema_path = config["schema_paths"]["ni_sas_schema"]
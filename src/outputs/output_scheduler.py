@@ -0,0 +1,118 @@
+"""Run independent outputs concurrently and merge their intramural totals.
+
+Each output is declared as an OutputTask with its arguments and the keys it
+adds to the intramural totals dictionary. The tasks run on a thread pool, as
+most of their time is spent in pandas and in writing files. Each task works on
+its own shallow copy of the input dataframes, and is given its own empty totals
+dictionary, and these are merged in the order the tasks were declared, so the
+result does not depend on which task finishes first.
+"""
+# Standard Library Imports
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from typing import Any, Callable, Dict, List, Tuple
+
+# Third Party Imports
+import pandas as pd
+
+OutputSchedulerLogger = logging.getLogger(__name__)
+
+# The number of outputs generated at once
+DEFAULT_OUTPUT_WORKERS = 4
+
+# Placeholder in a task's arguments for its intramural totals dictionary
+INTRAM_TOTALS = object()
+
+
+class OutputTask:
+    """
+    One output to generate, with its arguments and the totals it produces.
+
+    Attributes
+    ==========
+    name
+        the name of the output, used in the logs
+    func
+        the function that generates and writes the output
+    args
+        the positional arguments, with INTRAM_TOTALS in place of the totals
+        dictionary for outputs that produce totals
+    kwargs
+        the keyword arguments
+    totals_keys
+        the patterns of the keys the output adds to the totals dictionary
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable,
+        args: Tuple,
+        kwargs: Dict[str, Any] = None,
+        totals_keys: Tuple[str, ...] = (),
+    ):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.totals_keys = totals_keys
+
+    def run(self) -> Dict[str, Any]:
+        """Generate the output, returning the totals it produced.
+
+        Each dataframe is passed as a shallow copy, so the columns an output
+        adds or replaces are not seen by the outputs running alongside it. The
+        copy shares its column data and index with the input, so the shared
+        derived columns are matched to it, and outputs must not set values in
+        their input in place, with .loc for example.
+
+        Raises:
+            ValueError: Raised if the output adds a totals key it did not declare.
+        """
+        OutputSchedulerLogger.info(f"Starting {self.name} output...")
+        totals = {}
+        args = [
+            totals
+            if arg is INTRAM_TOTALS
+            else arg.copy(deep=False) if isinstance(arg, pd.DataFrame) else arg
+            for arg in self.args
+        ]
+        self.func(*args, **self.kwargs)
+
+        undeclared = [
+            key
+            for key in totals
+            if not any(fnmatchcase(key, pattern) for pattern in self.totals_keys)
+        ]
+        if undeclared:
+            raise ValueError(f"{self.name} output added undeclared totals {undeclared}")
+        OutputSchedulerLogger.info(f"Finished {self.name} output.")
+        return totals
+
+
+def run_output_tasks(
+    tasks: List[OutputTask],
+    intram_tot_dict: Dict[str, Any],
+    max_workers: int = DEFAULT_OUTPUT_WORKERS,
+) -> Dict[str, Any]:
+    """Run output tasks concurrently and merge the totals they produce.
+
+    Every task runs to completion, even if another fails. The first error in
+    the order the tasks were declared is then raised.
+
+    Args:
+        tasks (List[OutputTask]): The outputs to generate.
+        intram_tot_dict (dict): The intramural totals from earlier modules.
+        max_workers (int, optional): The number of outputs generated at once.
+
+    Returns:
+        dict: The earlier totals updated with those of each task, in order.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(task.run) for task in tasks]
+
+    merged = dict(intram_tot_dict)
+    for future in futures:
+        merged.update(future.result())
+    return merged
@@ -7,7 +7,9 @@ from typing import Callable, Dict, Any
 import pandas as pd
 
 # Local Imports
-from src.outputs.form_output_prep import form_output_prep
+from src.outputs.form_output_prep import OutputColumns, form_output_prep
+from src.outputs.intram_cube import build_intram_cube
+from src.outputs.output_scheduler import INTRAM_TOTALS, OutputTask, run_output_tasks
 from src.outputs.frozen_group import output_frozen_group
 from src.outputs.short_form import output_short_form
 from src.outputs.long_form import output_long_form
@@ -50,184 +52,174 @@ def run_outputs(  # noqa: C901
         sic_division_detailed (pd.DataFrame): Detailed descriptons of SIC divisions
     """
 
+    # The derived columns, such as the sizebands, are computed once for each
+    # prepared frame and shared by the outputs that use them
+    columns = OutputColumns()
     (ni_full_responses, outputs_df, tau_outputs_df) = form_output_prep(
-        weighted_df, ni_full_responses, config
+        weighted_df, ni_full_responses, config, columns
     )
-
-    # Running short form output
-    if config["global"]["output_short_form"]:
-        OutputMainLogger.info("Starting short form output...")
-        output_short_form(
+    global_config = config["global"]
+    ni_loaded = global_config["load_ni_data"]
+    uk_outputs = ni_loaded and not ni_full_responses.empty
+
+    # Short form uses every instance. Instance 0 is removed from all other
+    # outputs, and records that answer "no R&D" from all but long form.
+    short_form_df = outputs_df
+    long_form_df = outputs_df.loc[outputs_df.instance != 0]
+    outputs_df = long_form_df.loc[~(long_form_df["604"] == "No")]
+    tau_outputs_df = tau_outputs_df.loc[~(tau_outputs_df["604"] == "No")]
+
+    # Group the microdata once for all the intram outputs, which roll it up
+    cube_outputs = [
+        "output_intram_by_pg_gb",
+        "output_intram_by_pg_uk",
+        "output_intram_gb_itl",
+        "output_intram_uk_itl",
+        "output_intram_by_civil_defence",
+        "output_intram_by_sic",
+    ]
+    cube = None
+    if any(global_config[output] for output in cube_outputs):
+        cube = build_intram_cube(
             outputs_df,
-            config,
-            write_csv,
-            run_id,
+            ni_full_responses if uk_outputs else None,
+            config["mappers"]["geo_cols"],
         )
-        OutputMainLogger.info("Finished short form output.")
-
-    # Instance 0 should now be removed from all subsequent outputs
-    outputs_df = outputs_df.copy().loc[outputs_df.instance != 0]
 
-    # Running long form output
-    if config["global"]["output_long_form"]:
-        OutputMainLogger.info("Starting long form output...")
-        output_long_form(
-            outputs_df,
-            config,
-            write_csv,
-            run_id,
+    # Declare each output with its arguments and the totals keys it adds
+    tasks = []
+    if global_config["output_short_form"]:
+        tasks.append(
+            OutputTask(
+                "short form",
+                output_short_form,
+                (short_form_df, config, write_csv, run_id),
+                kwargs={"columns": columns},
+            )
         )
-        OutputMainLogger.info("Finished long form output.")
-
-    # Filter out records that answer "no R&D" for all subsequent outputs
-    tau_outputs_df = tau_outputs_df.copy().loc[~(tau_outputs_df["604"] == "No")]
-    outputs_df = outputs_df.copy().loc[~(outputs_df["604"] == "No")]
-
-    # Running TAU output
-    if config["global"]["output_tau"]:
-        OutputMainLogger.info("Starting TAU output...")
-        intram_tot_dict = output_tau(
-            tau_outputs_df,
-            config,
-            intram_tot_dict,
-            write_csv,
-            run_id,
+    if global_config["output_long_form"]:
+        tasks.append(
+            OutputTask(
+                "long form",
+                output_long_form,
+                (long_form_df, config, write_csv, run_id),
+                kwargs={"columns": columns},
+            )
         )
-        OutputMainLogger.info("Finished TAU output.")
-
-    # Running GB SAS output
-    if config["global"]["output_gb_sas"]:
-        OutputMainLogger.info("Starting GB SAS output...")
-        intram_tot_dict = output_gb_sas(
-            outputs_df, config, intram_tot_dict, write_csv, run_id
+    if global_config["output_tau"]:
+        tasks.append(
+            OutputTask(
+                "TAU",
+                output_tau,
+                (tau_outputs_df, config, INTRAM_TOTALS, write_csv, run_id),
+                kwargs={"columns": columns},
+                totals_keys=("GB_Tau_estimated",),
+            )
         )
-        OutputMainLogger.info("Finished GB SAS output.")
-
-    # Running NI SAS output
-    if config["global"]["output_ni_sas"]:
-        if not config["global"]["load_ni_data"]:
+    if global_config["output_gb_sas"]:
+        tasks.append(
+            OutputTask(
+                "GB SAS",
+                output_gb_sas,
+                (outputs_df, config, INTRAM_TOTALS, write_csv, run_id),
+                kwargs={"columns": columns},
+                totals_keys=("GB_sas",),
+            )
+        )
+    if global_config["output_ni_sas"]:
+        if not ni_loaded:
             OutputMainLogger.info("Skipping NI SAS output as NI data is NOT loaded...")
         else:
-            OutputMainLogger.info("Starting NI SAS output...")
-            output_ni_sas(
-                ni_full_responses,
-                config,
-                write_csv,
-                run_id,
+            tasks.append(
+                OutputTask(
+                    "NI SAS",
+                    output_ni_sas,
+                    (ni_full_responses, config, write_csv, run_id),
+                    kwargs={"columns": columns},
+                )
             )
-            OutputMainLogger.info("Finished NI SAS output.")
-
-    # Running Intram by PG output (GB)
-    if config["global"]["output_intram_by_pg_gb"]:
-        OutputMainLogger.info("Starting Intram by PG (GB) output...")
-        intram_tot_dict = output_intram_by_pg(
-            outputs_df,
-            ni_full_responses,
-            pg_detailed,
-            config,
-            intram_tot_dict,
-            write_csv,
-            run_id,
-            uk_output=False,
-        )
-        OutputMainLogger.info("Finished Intram by PG (GB) output.")
-
-    # Running Intram by PG output (UK)
-    if config["global"]["output_intram_by_pg_uk"]:
-        if (not config["global"]["load_ni_data"]) or ni_full_responses.empty:
+    for area, uk_output in [("GB", False), ("UK", True)]:
+        if not global_config[f"output_intram_by_pg_{area.lower()}"]:
+            continue
+        if uk_output and not uk_outputs:
             OutputMainLogger.info(
                 "Skipping Intram by PG (UK) output as NI data is NOT loaded..."
             )
-        else:
-            OutputMainLogger.info("Starting Intram by PG (UK) output...")
-            intram_tot_dict = output_intram_by_pg(
-                outputs_df,
-                ni_full_responses,
-                pg_detailed,
-                config,
-                intram_tot_dict,
-                write_csv,
-                run_id,
-                uk_output=True,
+            continue
+        tasks.append(
+            OutputTask(
+                f"Intram by PG ({area})",
+                output_intram_by_pg,
+                (outputs_df, ni_full_responses, pg_detailed, config, INTRAM_TOTALS)
+                + (write_csv, run_id),
+                kwargs={"uk_output": uk_output, "cube": cube},
+                totals_keys=(f"intram_by_pg_{area.lower()}",),
             )
-            OutputMainLogger.info("Finished Intram by PG (UK) output.")
-
-    # Running Intram by ITL (GB)
-    if config["global"]["output_intram_gb_itl"]:
-        OutputMainLogger.info("Starting Intram by ITL (GB) output...")
-        intram_tot_dict = output_intram_by_itl(
-            outputs_df,
-            ni_full_responses,
-            config,
-            intram_tot_dict,
-            write_csv,
-            run_id,
         )
-        OutputMainLogger.info("Finished Intram by ITL (GB) output.")
-
-    # Running Intram by ITL (UK)
-    if config["global"]["output_intram_uk_itl"]:
-        if (not config["global"]["load_ni_data"]) or ni_full_responses.empty:
+    for area, uk_output in [("GB", False), ("UK", True)]:
+        if not global_config[f"output_intram_{area.lower()}_itl"]:
+            continue
+        if uk_output and not uk_outputs:
             OutputMainLogger.info(
                 "Skipping Intram by ITL (UK) output as NI data is NOT loaded..."
             )
-        else:
-            OutputMainLogger.info("Starting Intram by ITL (UK) output...")
-            intram_tot_dict = output_intram_by_itl(
-                outputs_df,
-                ni_full_responses,
-                config,
-                intram_tot_dict,
-                write_csv,
-                run_id,
-                uk_output=True,
+            continue
+        tasks.append(
+            OutputTask(
+                f"Intram by ITL ({area})",
+                output_intram_by_itl,
+                (outputs_df, ni_full_responses, config, INTRAM_TOTALS)
+                + (write_csv, run_id),
+                kwargs={"uk_output": uk_output, "cube": cube},
+                totals_keys=(f"{area.lower()}_itl*",),
             )
-            OutputMainLogger.info("Finished Intram by ITL (UK) output.")
-
-    # Running frozen group
-    if config["global"]["output_frozen_group"]:
-        OutputMainLogger.info("Starting frozen group output...")
-        intram_tot_dict = output_frozen_group(
-            outputs_df,
-            ni_full_responses,
-            config,
-            intram_tot_dict,
-            write_csv,
-            run_id,
         )
-        OutputMainLogger.info("Finished frozen group output.")
-
-    # Running Intram by civil or defence
-    if config["global"]["output_intram_by_civil_defence"]:
-        OutputMainLogger.info("Starting Intram by civil or defence output...")
-        output_intram_by_civil_defence(
-            outputs_df,
-            config,
-            write_csv,
-            run_id,
-            civil_defence_detailed,
+    if global_config["output_frozen_group"]:
+        tasks.append(
+            OutputTask(
+                "frozen group",
+                output_frozen_group,
+                (outputs_df, ni_full_responses, config, INTRAM_TOTALS)
+                + (write_csv, run_id),
+                kwargs={"columns": columns},
+                totals_keys=("frozen_group",),
+            )
         )
-        OutputMainLogger.info("Finished Intram by civil or defence output.")
-
-    # Running Intram by SIC
-    if config["global"]["output_intram_by_sic"]:
-        OutputMainLogger.info("Starting Intram by SIC output...")
-        intram_tot_dict = output_intram_by_sic(
-            outputs_df,
-            config,
-            intram_tot_dict,
-            write_csv,
-            run_id,
-            sic_division_detailed,
+    if global_config["output_intram_by_civil_defence"]:
+        tasks.append(
+            OutputTask(
+                "Intram by civil or defence",
+                output_intram_by_civil_defence,
+                (outputs_df, config, write_csv, run_id, civil_defence_detailed),
+                kwargs={"cube": cube},
+            )
+        )
+    if global_config["output_intram_by_sic"]:
+        tasks.append(
+            OutputTask(
+                "Intram by SIC",
+                output_intram_by_sic,
+                (outputs_df, config, INTRAM_TOTALS, write_csv, run_id)
+                + (sic_division_detailed,),
+                kwargs={"cube": cube},
+                totals_keys=("intram_by_sic",),
+            )
+        )
+    if global_config["output_fte_total_qa"]:
+        tasks.append(
+            OutputTask(
+                "FTE total QA",
+                qa_output_total_fte,
+                (outputs_df, config, write_csv, run_id),
+            )
         )
-        OutputMainLogger.info("Finished Intram by SIC output.")
 
-    # Running FTE total QA
-    if config["global"]["output_fte_total_qa"]:
-        qa_output_total_fte(outputs_df, config, write_csv, run_id)
-        OutputMainLogger.info("Finished FTE total QA output.")
+    # The outputs run concurrently, and their totals are merged in the order
+    # declared above
+    intram_tot_dict = run_output_tasks(tasks, intram_tot_dict)
+    columns.clear()
 
-    if config["global"]["output_intram_totals"]:
+    if global_config["output_intram_totals"]:
         output_intram_totals(intram_tot_dict, config, write_csv, run_id)
         OutputMainLogger.info("Finished Intramural totals output.")
 
@@ -4,7 +4,7 @@ import pandas as pd
 from datetime import datetime
 from typing import Callable, Dict, Any
 
-import src.outputs.map_output_cols as map_o
+from src.outputs.form_output_prep import OutputColumns
 from src.staging.validation import load_schema
 from src.imputation.imputation_helpers import fill_sf_zeros
 from src.outputs.outputs_helpers import create_output_df
@@ -92,6 +92,7 @@ def output_short_form(
     config: Dict[str, Any],
     write_csv: Callable,
     run_id: int,
+    columns: OutputColumns = None,
 ):
     """Run the outputs module.
 
@@ -101,17 +102,15 @@ def output_short_form(
         write_csv (Callable): Function to write to a csv file.
             This will be the hdfs or network version depending on settings.
         run_id (int): The current run id
+        columns (OutputColumns, optional): The derived columns shared between
+            outputs. If not given, the columns are derived for this output only.
     """
     output_path = config["outputs_paths"]["outputs_master"]
 
-    # Map to the CORA statuses from the statusencoded column
-    df = map_o.create_cora_status_col(df)
-
-    # Map the sizebands based on frozen employment
-    df = map_o.map_sizebands(df)
-
-    # Map q713 and q714 to numeric format
-    df = map_o.map_to_numeric(df)
+    # Map to the CORA statuses, the sizebands based on frozen employment, and
+    # q713 and q714 to numeric format
+    columns = OutputColumns() if columns is None else columns
+    df = columns.attach(df, ["form_status", "sizeband", "713", "714"])
 
     # Prepare the shortform output dataframe
     df = run_shortform_prep(df, round_val=4)
@@ -3,7 +3,7 @@ import logging
 import pandas as pd
 from datetime import datetime
 from typing import Callable, Dict, Any
-import src.outputs.map_output_cols as map_o
+from src.outputs.form_output_prep import OutputColumns
 from src.staging.validation import load_schema
 from src.outputs.outputs_helpers import create_output_df
 
@@ -16,6 +16,7 @@ def output_tau(
     intram_tot_dict: Dict[str, int],
     write_csv: Callable,
     run_id: int,
+    columns: OutputColumns = None,
 ) -> Dict[str, int]:
     """Run the outputs module.
 
@@ -26,35 +27,23 @@ def output_tau(
         write_csv (Callable): Function to write to a csv file.
           This will be the hdfs or network version depending on settings.
         run_id (int): The current run id
+        columns (OutputColumns, optional): The derived columns shared between
+            outputs. If not given, the columns are derived for this output only.
 
     Returns:
         intram_tot_dict (dict): Dictionary with the intramural totals.
     """
     output_path = config["outputs_paths"]["outputs_master"]
-    # Prepare the columns needed for outputs:
-
-    # Map to the CORA statuses from the statusencoded column
-    df = map_o.create_cora_status_col(df)
-
-    # Map the sizebands based on column "employment"
-    df = map_o.map_sizebands(df)
-
-    # Map q713 and q714 to numeric format
-    df = map_o.map_to_numeric(df)
-
-    # Create C_lnd_bl
-    df["C_lnd_bl"] = df[["219", "220"]].fillna(0).sum(axis=1)
-
-    # Create ovss_oth
-    df["ovss_oth"] = (
-        df[["243", "244", "245", "246", "247", "249"]].fillna(0).sum(axis=1)
+    # Prepare the columns needed for outputs: the CORA statuses, sizebands,
+    # q713 and q714 in numeric format, C_lnd_bl, ovss_oth and oth_sc
+    columns = OutputColumns() if columns is None else columns
+    df = columns.attach(
+        df,
+        ["form_status", "sizeband", "713", "714", "C_lnd_bl", "ovss_oth", "oth_sc"],
     )
 
-    # Create oth_sc
-    df["oth_sc"] = df[["242", "248", "250"]].fillna(0).sum(axis=1)
-
     # get Intram toatl with estimation weights applied for gb only
-    gb_tau = df.copy().loc[df["formtype"].isin(["0001", "0006"])]
+    gb_tau = df.loc[df["formtype"].isin(["0001", "0006"])]
 
     intram_tot = round((gb_tau["211"] * gb_tau["a_weight"]).sum(), 0)
     intram_tot_dict["GB_Tau_estimated"] = intram_tot
@@ -1,19 +1,34 @@
 """The main pipeline"""
 # Core Python modules
 import logging
+from functools import partial
 import pandas as pd
 
 # Our local modules
 from src.utils import runlog
 from src._version import __version__ as version
 from src.utils.config import config_setup
-from src.utils.wrappers import logger_creator
+from src.utils.wrappers import (
+    logger_creator,
+    run_stage,
+    clear_df_metrics,
+    clear_stage_metrics,
+)
 from src.utils.path_helpers import filename_validation
+from src.utils.output_formats import OutputFormatMiddleware
+from src.utils.storage import (
+    BackgroundWriteMiddleware,
+    CachingMiddleware,
+    MetricsMiddleware,
+    Storage,
+    get_storage,
+)
 from src.staging.staging_main import run_staging
 from src.utils.helpers import validate_updated_postcodes
 from src.freezing.freezing_main import run_freezing
 from src.northern_ireland.ni_main import run_ni
 from src.construction.construction_main import run_construction
+from src.mapping.mapper_registry import MapperRegistry
 from src.mapping.mapping_main import run_mapping
 from src.imputation.imputation_main import run_imputation  # noqa
 from src.outlier_detection.outlier_main import run_outliers
@@ -43,38 +58,42 @@ def run_pipeline(user_config_path, dev_config_path):
     # validate the filenames in the config
     config = filename_validation(config)
 
-    # Check the environment switch
-    platform = config["global"]["platform"]
-
-    if platform == "s3":
-        # create singletion boto3 client object & pass in bucket string
-        from src.utils.singleton_boto import SingletonBoto
-
-        boto3_client = SingletonBoto.get_client(config)  # noqa
-        from src.utils import s3_mods as mods
-
-    elif platform == "network":
-        # If the platform is "network" or "hdfs", there is no need for a client.
-        # Adding a client = None for consistency.
-        # config["client"] = None
-        from src.utils import local_file_mods as mods
-    elif platform == "hdfs":
-        # config["client"] = None
-        from src.utils import hdfs_mods as mods
-    else:
-        MainLogger.error(f"The selected platform {platform} is wrong")
-        raise ImportError(f"Cannot import {platform}_mods")
+    # Create the storage for the platform in the config. Every module reads and
+    # writes through this one object, so middleware added here applies to all.
+    # Outputs are converted to their configured format innermost, so that
+    # background writes also write Parquet outputs off the main thread. The
+    # metadata cache sits outside the background writes, so its lookups wait
+    # for pending writes, and the metrics record what the stages wait for.
+    middleware = [
+        partial(
+            OutputFormatMiddleware,
+            formats=config.get("output_formats"),
+            schema_paths=config["schema_paths"],
+            compression=config.get("output_compression"),
+        )
+    ]
+    if config["global"]["background_writes"]:
+        middleware.append(BackgroundWriteMiddleware)
+    if config["global"]["cache_storage_metadata"]:
+        middleware.append(CachingMiddleware)
+    middleware.append(MetricsMiddleware)
+    storage = get_storage(config, middleware)
 
     # Set up the run logger
     runlog_obj = runlog.RunLog(
         config,
         version,
-        mods.rd_file_exists,
-        mods.rd_mkdir,
-        mods.rd_read_csv,
-        mods.rd_write_csv,
+        storage.file_exists,
+        storage.mkdir,
+        storage.read_csv,
+        storage.write_csv,
+        storage.list_files,
+        storage.create_exclusive,
+        storage.delete_file,
     )
     runlog_obj.create_runlog_files()
+    clear_df_metrics()
+    clear_stage_metrics()
     runlog_obj.write_config_log()
     runlog_obj.write_mainlog()
 
@@ -85,9 +104,63 @@ def run_pipeline(user_config_path, dev_config_path):
     MainLogger.info("Launching Pipeline .......................")
     logger.info("Collecting logging parameters ..........")
 
+    # The stage timings and dataframe metrics are written even if a stage fails,
+    # so a failed run can be profiled up to the stage that failed
+    try:
+        _run_stages(config, storage, run_id)
+        MainLogger.info("Finishing Pipeline .......................")
+        runlog_obj.write_runlog()
+    except BaseException:
+        # The stage error is the one raised; a failure writing the metrics, or
+        # in a pending background write, is only logged
+        try:
+            _write_run_metrics(runlog_obj, storage)
+        except Exception:
+            MainLogger.exception("Could not write the metrics of the failed run")
+        raise
+    _write_run_metrics(runlog_obj, storage)
+    runlog_obj.mark_mainlog_passed()
+    storage.flush()
+
+    return runlog_obj.time_taken
+
+
+def _write_run_metrics(runlog_obj: runlog.RunLog, storage: MetricsMiddleware) -> None:
+    """Write the run's metrics and wait for the pending writes.
+
+    Args:
+        runlog_obj (runlog.RunLog): The run logger.
+        storage (MetricsMiddleware): The storage every module reads and writes
+            through, recording the time taken by each operation.
+    """
+    runlog_obj.write_df_metrics()
+    runlog_obj.write_stages_log()
+    storage.log_metrics()
+    storage.flush()
+
+
+def _run_stages(config: dict, storage: Storage, run_id: int) -> None:
+    """Run the stages of the pipeline in order.
+
+    Args:
+        config (dict): The pipeline configuration.
+        storage (Storage): The storage every module reads and writes through.
+        run_id (int): Unique identifier for the run.
+    """
     # Data Ingest
     MainLogger.info("Starting Data Ingest...")
 
+    # The mappers are validated once, and cached until they or their schemas change
+    mappers = MapperRegistry(
+        config,
+        storage.file_exists,
+        storage.mkdir,
+        storage.read_csv,
+        storage.md5sum,
+        storage.read_parquet,
+        storage.write_parquet,
+    )
+
     # Staging and validatation and Data Transmutation
     MainLogger.info("Starting Staging and Validation...")
     (
@@ -99,36 +172,36 @@ def run_pipeline(user_config_path, dev_config_path):
         civil_defence_detailed,
         sic_division_detailed,
         manual_trimming_df,
-    ) = run_staging(
+    ) = run_stage(
+        "staging",
+        run_staging,
         config,
-        mods.rd_file_exists,
-        mods.rd_load_json,
-        mods.rd_read_csv,
-        mods.rd_write_csv,
-        mods.rd_read_feather,
-        mods.rd_write_feather,
+        storage.file_exists,
+        storage.load_json,
+        storage.read_csv,
+        storage.write_csv,
+        storage.read_feather,
+        storage.write_feather,
         run_id,
+        mappers,
     )
 
     # Freezing module
     MainLogger.info("Starting Freezing module...")
-    full_responses = run_freezing(
+    full_responses = run_stage(
+        "freezing",
+        run_freezing,
         full_responses,
         config,
-        mods.rd_write_csv,
-        mods.rd_read_csv,
-        mods.rd_file_exists,
+        storage.write_csv,
+        storage.read_csv,
+        storage.file_exists,
         run_id,
     )
     MainLogger.info("Finished Freezing module...")
 
     if config["global"]["load_updated_snapshot_for_comparison"]:
-        MainLogger.info("Finishing Pipeline .......................")
-
-        runlog_obj.write_runlog()
-        runlog_obj.mark_mainlog_passed()
-
-        return runlog_obj.time_taken
+        return
 
     MainLogger.info("Finished Data Ingest.")
 
@@ -136,8 +209,14 @@ def run_pipeline(user_config_path, dev_config_path):
     load_ni_data = config["global"]["load_ni_data"]
     if load_ni_data:
         MainLogger.info("Starting NI module...")
-        ni_df = run_ni(
-            config, mods.rd_file_exists, mods.rd_read_csv, mods.rd_write_csv, run_id
+        ni_df = run_stage(
+            "northern_ireland",
+            run_ni,
+            config,
+            storage.file_exists,
+            storage.read_csv,
+            storage.write_csv,
+            run_id,
         )
         MainLogger.info("Finished NI Data Ingest.")
     else:
@@ -149,11 +228,15 @@ def run_pipeline(user_config_path, dev_config_path):
     MainLogger.info("Starting Construction module...")
     run_all_data_construction = config["global"]["run_all_data_construction"]
     if run_all_data_construction:
-        full_responses = run_construction(
+        full_responses = run_stage(
+            "all_data_construction",
+            run_construction,
             full_responses,
             config,
-            mods.rd_file_exists,
-            mods.rd_read_csv,
+            storage.file_exists,
+            storage.read_csv,
+            storage.write_csv,
+            run_id,
             is_run_all_data_construction=True,
         )
     else:
@@ -162,26 +245,31 @@ def run_pipeline(user_config_path, dev_config_path):
 
     # Mapping module
     MainLogger.info("Starting Mapping...")
-    (mapped_df, ni_full_responses, itl_mapper) = run_mapping(
+    (mapped_df, ni_full_responses, postcode_regions) = run_stage(
+        "mapping",
+        run_mapping,
         full_responses,
         ni_df,
         postcode_mapper,
         config,
-        mods.rd_read_csv,
-        mods.rd_write_csv,
-        mods.rd_file_exists,
+        storage.read_csv,
+        storage.write_csv,
+        storage.file_exists,
         run_id,
+        mappers,
     )
     MainLogger.info("Finished Mapping...")
 
     # Imputation module
     MainLogger.info("Starting Imputation...")
-    imputed_df = run_imputation(
+    imputed_df = run_stage(
+        "imputation",
+        run_imputation,
         mapped_df,
         manual_trimming_df,
         backdata,
         config,
-        mods.rd_write_csv,
+        storage.write_csv,
         run_id,
     )
     MainLogger.info("Finished  Imputation...")
@@ -189,59 +277,75 @@ def run_pipeline(user_config_path, dev_config_path):
     # Perform postcode construction now imputation is complete
     run_postcode_construction = config["global"]["run_postcode_construction"]
     if run_postcode_construction:
-        imputed_df = run_construction(
+        imputed_df = run_stage(
+            "postcode_construction",
+            run_construction,
             imputed_df,
             config,
-            mods.rd_file_exists,
-            mods.rd_read_csv,
+            storage.file_exists,
+            storage.read_csv,
+            storage.write_csv,
+            run_id,
             is_run_postcode_construction=True,
         )
 
-    imputed_df = validate_updated_postcodes(
+    imputed_df = run_stage(
+        "validate_updated_postcodes",
+        validate_updated_postcodes,
         imputed_df,
-        postcode_mapper,
-        itl_mapper,
+        postcode_regions,
         config,
     )
 
     # Outlier detection module
     MainLogger.info("Starting Outlier Detection...")
-    outliered_responses_df = run_outliers(
-        imputed_df, manual_outliers, config, mods.rd_write_csv, run_id
+    outliered_responses_df = run_stage(
+        "outliers",
+        run_outliers,
+        imputed_df,
+        manual_outliers,
+        config,
+        storage.write_csv,
+        run_id,
     )
     MainLogger.info("Finished Outlier module.")
 
     # Estimation module
     MainLogger.info("Starting Estimation...")
-    estimated_responses_df = run_estimation(
-        outliered_responses_df, config, mods.rd_write_csv, run_id
+    estimated_responses_df = run_stage(
+        "estimation",
+        run_estimation,
+        outliered_responses_df,
+        config,
+        storage.write_csv,
+        run_id,
     )
     MainLogger.info("Finished Estimation module.")
 
     # Data processing: Apportionment to sites
-    apportioned_responses_df, intram_tot_dict = run_site_apportionment(
-        estimated_responses_df, config, mods.rd_write_csv, run_id
+    apportioned_responses_df, intram_tot_dict = run_stage(
+        "site_apportionment",
+        run_site_apportionment,
+        estimated_responses_df,
+        config,
+        storage.write_csv,
+        run_id,
     )
 
     MainLogger.info("Finished Site Apportionment module.")
 
     MainLogger.info("Starting Outputs...")
 
-    run_outputs(
+    run_stage(
+        "outputs",
+        run_outputs,
         apportioned_responses_df,
         ni_full_responses,
         config,
         intram_tot_dict,
-        mods.rd_write_csv,
+        storage.write_csv,
         run_id,
         pg_detailed,
         civil_defence_detailed,
         sic_division_detailed,
     )
-
-    MainLogger.info("Finishing Pipeline .......................")
-
-    runlog_obj.write_runlog()
-    runlog_obj.mark_mainlog_passed()
-
-    return runlog_obj.time_taken
@@ -75,6 +75,20 @@ def getmappername(mapper_path_key: str, split: bool) -> str:
     return mapper_name
 
 
+def mapper_schema_path(mapper_path_key: str) -> str:
+    """Get the path of the toml schema used to validate a mapper.
+
+    Args:
+        mapper_path_key (str): The key of the mapper path in the config.
+
+    Returns:
+        str: The path of the schema, in the config folder.
+    """
+    mapper_name = getmappername(mapper_path_key, split=True)
+    schema_prefix = "_".join(word for word in mapper_name.split() if word != "mapper")
+    return f"./config/{schema_prefix}_schema.toml"
+
+
 def load_validate_mapper(
     mapper_path_key: str,
     config: dict,
@@ -125,8 +139,7 @@ def load_validate_mapper(
     mapper_df = rd_read_csv(mapper_path)
 
     # Construct the path of the schema from the mapper name
-    schema_prefix = "_".join(word for word in mapper_name.split() if word != "mapper")
-    schema_path = f"./config/{schema_prefix}_schema.toml"
+    schema_path = mapper_schema_path(mapper_path_key)
 
     # Validate the DataFrame against the schema
     val.validate_data_with_schema(mapper_df, schema_path)
@@ -8,6 +8,7 @@ import os
 import pandas as pd
 
 import src.staging.staging_helpers as helpers
+from src.mapping.mapper_registry import MapperRegistry
 from src.staging import validation as val
 
 # from src.utils.breakdown_validation import run_breakdown_validation
@@ -24,6 +25,7 @@ def run_staging(  # noqa: C901
     rd_read_feather: Callable,
     rd_write_feather: Callable,
     run_id: int,
+    mappers: MapperRegistry,
 ) -> Tuple:
     """Run the staging and validation module.
 
@@ -49,6 +51,7 @@ def run_staging(  # noqa: C901
         rd_write_feather (Callable): Function to write feather files from Pandas
             Available in HDFS and Windows only.
         run_id (int): The run id for this run.
+        mappers (MapperRegistry): Loads and validates the mappers.
     Returns:
         tuple
             full_responses (pd.DataFrame): The staged and vaildated snapshot data,
@@ -219,30 +222,16 @@ def run_staging(  # noqa: C901
         StagingMainLogger.info("Backdata File Loaded Successfully...")
 
         # Loading Civil or Defence detailed mapper
-        civil_defence_detailed_mapper = helpers.load_validate_mapper(
-            "civil_defence_detailed_mapper_path",
-            config,
-            StagingMainLogger,
-            rd_file_exists,
-            rd_read_csv,
+        civil_defence_detailed_mapper = mappers.get(
+            "civil_defence_detailed_mapper_path"
         )
 
         # Loading SIC division detailed mapper
-        sic_division_detailed_mapper = helpers.load_validate_mapper(
-            "sic_division_detailed_mapper_path",
-            config,
-            StagingMainLogger,
-            rd_file_exists,
-            rd_read_csv,
+        sic_division_detailed_mapper = mappers.get(
+            "sic_division_detailed_mapper_path"
         )
 
-        pg_detailed_mapper = helpers.load_validate_mapper(
-            "pg_detailed_mapper_path",
-            config,
-            StagingMainLogger,
-            rd_file_exists,
-            rd_read_csv,
-        )
+        pg_detailed_mapper = mappers.get("pg_detailed_mapper_path")
 
         # seaparate PNP data from full_responses (BERD data)
         # NOTE: PNP data can be output for QA but won't be further processed in the pipeline
@@ -0,0 +1,371 @@
+"""Benchmark the pipeline on synthetic data, and catch performance regressions.
+
+The whole pipeline is run on a synthetic snapshot at each of a few sizes, with
+every output switched on, so that each stage (staging, imputation, outliers,
+estimation, site apportionment, outputs and the stages between) does the work
+it would in a full run. The wall time, CPU time and peak memory of each stage
+are taken from the stage metrics recorded by run_stage, with tracemalloc on so
+the peak memory of each stage is its own. Each run is stored against the git
+revision it was run at, and compared with an earlier revision: a stage that
+has become slower, or uses more memory, beyond a threshold is a regression.
+
+Each size is run from freshly generated inputs in a temporary folder, so no
+cached mapper or earlier output makes a run faster than the one before.
+
+Contains the following:
+    git_revision: The git revision of the working tree.
+    setup_benchmark_run: Writes the inputs and configs for a run at one size.
+    run_benchmark: Runs the pipeline at each size and returns the stage metrics.
+    append_results: Adds the results of a run to the results file.
+    baseline_results: Gets the results of the revision to compare against.
+    find_regressions: Finds the stages that are slower or use more memory.
+"""
+# Standard libraries
+import logging
+import os
+import subprocess
+import tempfile
+import tracemalloc
+from datetime import datetime
+from typing import List, Tuple
+
+# Third party libraries
+import pandas as pd
+import yaml
+
+# Local libraries
+from src.pipeline import run_pipeline
+from src.utils import local_file_mods
+from src.utils.config import config_setup
+from src.utils.local_file_mods import safeload_yaml
+from src.utils.storage import ModsStorage
+from src.utils.synthetic_data import DEFAULT_SEED, write_synthetic_data
+from src.utils.wrappers import get_stage_metrics
+
+BenchmarkLogger = logging.getLogger(__name__)
+
+USER_CONFIG = os.path.join("src", "user_config.yaml")
+DEV_CONFIG = os.path.join("src", "dev_config.yaml")
+
+# The number of responses in the snapshot of each run
+DEFAULT_SCALES = [5000, 20000]
+
+# How much slower, or larger, a stage can be than the baseline, as a share
+DEFAULT_THRESHOLD = 0.25
+
+# Differences smaller than these are noise, whatever the share
+MIN_SECONDS = 1.0
+MIN_MB = 20.0
+
+# The metrics compared with the baseline, each with its minimum difference
+COMPARED_METRICS = {"wall_seconds": MIN_SECONDS, "peak_traced_mb": MIN_MB}
+
+# The modules whose paths hold folders the pipeline writes to
+WRITTEN_MODULES = [
+    "staging",
+    "freezing",
+    "mapping",
+    "imputation",
+    "outliers",
+    "estimation",
+    "apportionment",
+    "outputs",
+]
+
+# The folders, under the outputs folder, that each output is written to
+OUTPUT_FOLDERS = [
+    "output_fte_total_qa",
+    "output_frozen_group",
+    "output_gb_sas",
+    "output_intram_by_civil_defence",
+    "output_intram_by_pg_gb",
+    "output_intram_by_pg_uk",
+    "output_intram_by_sic",
+    "output_intram_gb_itl1",
+    "output_intram_gb_itl2",
+    "output_intram_totals",
+    "output_intram_uk_itl1",
+    "output_intram_uk_itl2",
+    "output_long_form",
+    "output_ni_sas",
+    "output_short_form",
+    "output_status_filtered_qa",
+    "output_tau",
+]
+
+
+def git_revision() -> str:
+    """Get the git revision of the working tree, marked if it has changes.
+
+    Returns:
+        str: The abbreviated commit hash, ending "-dirty" if there are
+            uncommitted changes, or "unknown" outside a git repository.
+    """
+    try:
+        result = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return result.stdout.strip()
+
+
+def _benchmark_configs(
+    root: str, user_config: dict, dev_config: dict, n_responses: int
+) -> Tuple[dict, dict]:
+    """Point the configs at a root folder, with every output switched on."""
+    year = user_config["years"]["survey_year"]
+    for setting in user_config["global"]:
+        if setting.startswith("output_"):
+            user_config["global"][setting] = True
+    user_config["global"]["load_manual_outliers"] = True
+    user_config["global"]["load_manual_imputation"] = True
+
+    mappers = user_config[f"{year}_mappers"]
+    mappers_folder = os.path.join(
+        root, f"{year}_surveys", "mappers", mappers["mappers_version"]
+    )
+    snapshot_name = f"snapshot_{year}12_synthetic_{n_responses}.json"
+    snapshot_path = os.path.join(root, snapshot_name)
+
+    # Keep the logs and runlog of the run out of the repository's own
+    dev_config["global"]["platform"] = "network"
+    dev_config["global"]["log_to_file"] = False
+    dev_config["network_paths"].update(
+        {
+            "root": root + os.sep,
+            "logs_foldername": os.path.join(root, "logs", "run_logs"),
+            "snapshot_path": snapshot_path,
+            "updated_snapshot_path": snapshot_path,
+            "backdata_path": os.path.join(root, "synthetic_backdata.csv"),
+            "postcode_masterlist": os.path.join(
+                mappers_folder, mappers["postcode_mapper"]
+            ),
+        }
+    )
+    return user_config, dev_config
+
+
+def _make_folders(config: dict) -> None:
+    """Create the folders the pipeline reads from and writes to."""
+    root = config["network_paths"]["root"]
+    paths = [
+        path
+        for module in WRITTEN_MODULES
+        for path in config[f"{module}_paths"].values()
+        if isinstance(path, str) and path.startswith(root)
+    ]
+    for path in paths:
+        # Paths with an extension are files, the others folders
+        if os.path.splitext(path)[1]:
+            path = os.path.dirname(path)
+        os.makedirs(path, exist_ok=True)
+    os.makedirs(config["network_paths"]["logs_foldername"], exist_ok=True)
+    outputs_folder = config["outputs_paths"]["outputs_master"]
+    for folder in OUTPUT_FOLDERS:
+        os.makedirs(os.path.join(outputs_folder, folder), exist_ok=True)
+
+
+def setup_benchmark_run(
+    root: str,
+    n_responses: int,
+    seed: int = DEFAULT_SEED,
+    user_config_path: str = USER_CONFIG,
+    dev_config_path: str = DEV_CONFIG,
+) -> Tuple[str, str]:
+    """Write the synthetic inputs and the configs for a run at one size.
+
+    The configs are copies of the user and developer configs, with the
+    network paths pointed at the root folder and every output switched on.
+    The inputs are written to the paths in the configs, and the folders the
+    pipeline writes to are created.
+
+    Args:
+        root (str): The folder to run the pipeline in. It must exist.
+        n_responses (int): The number of responses in the snapshot.
+        seed (int, optional): The seed for the synthetic data.
+        user_config_path (str, optional): The user config to start from.
+        dev_config_path (str, optional): The developer config to start from.
+
+    Returns:
+        Tuple[str, str]: The paths of the user and developer configs written.
+    """
+    user_config, dev_config = _benchmark_configs(
+        root,
+        safeload_yaml(user_config_path),
+        safeload_yaml(dev_config_path),
+        n_responses,
+    )
+    config_paths = []
+    for name, config in [("user", user_config), ("dev", dev_config)]:
+        config_paths.append(os.path.join(root, f"benchmark_{name}_config.yaml"))
+        with open(config_paths[-1], "w") as file:
+            yaml.safe_dump(config, file)
+
+    config = config_setup(*config_paths)
+    _make_folders(config)
+    write_synthetic_data(
+        ModsStorage("network", local_file_mods),
+        root,
+        n_responses,
+        period=int(f"{config['years']['survey_year']}12"),
+        seed=seed,
+        paths={**config["mapping_paths"], **config["staging_paths"]},
+    )
+    return tuple(config_paths)
+
+
+def _benchmark_pipeline(
+    n_responses: int,
+    seed: int,
+    user_config_path: str,
+    dev_config_path: str,
+    trace_memory: bool,
+) -> pd.DataFrame:
+    """Run the pipeline once, in a temporary folder, returning its stage metrics."""
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as root:
+        config_paths = setup_benchmark_run(
+            root, n_responses, seed, user_config_path, dev_config_path
+        )
+        BenchmarkLogger.info(f"Benchmarking {n_responses} responses in {root}")
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            run_pipeline(*config_paths)
+        finally:
+            tracemalloc.stop()
+    return get_stage_metrics()
+
+
+def run_benchmark(
+    scales: List[int] = DEFAULT_SCALES,
+    seed: int = DEFAULT_SEED,
+    trace_memory: bool = True,
+    user_config_path: str = USER_CONFIG,
+    dev_config_path: str = DEV_CONFIG,
+) -> pd.DataFrame:
+    """Run the pipeline on synthetic data at each size, recording each stage.
+
+    Tracing memory slows the pipeline several times over, so the stages are
+    timed in a run without tracing, and their peak memory taken from a second
+    run with it.
+
+    Args:
+        scales (List[int], optional): The number of responses of each run.
+        seed (int, optional): The seed for the synthetic data.
+        trace_memory (bool, optional): Whether to make the second run, for
+            the peak memory of each stage.
+        user_config_path (str, optional): The user config to start from.
+        dev_config_path (str, optional): The developer config to start from.
+
+    Returns:
+        pd.DataFrame: The stage metrics of every size, with the revision, time
+            and number of responses of the run.
+    """
+    revision = git_revision()
+    args = (seed, user_config_path, dev_config_path)
+    results = []
+    for n_responses in scales:
+        metrics = _benchmark_pipeline(n_responses, *args, trace_memory=False)
+        if trace_memory:
+            traced = _benchmark_pipeline(n_responses, *args, trace_memory=True)
+            traced = traced.set_index("stage")["peak_traced_mb"]
+            metrics["peak_traced_mb"] = metrics["stage"].map(traced)
+
+        metrics.insert(0, "revision", revision)
+        metrics.insert(1, "run_time", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        metrics.insert(2, "responses", n_responses)
+        results.append(metrics)
+    return pd.concat(results, ignore_index=True)
+
+
+def append_results(results_path: str, results: pd.DataFrame) -> None:
+    """Add the results of a benchmark run to the results file.
+
+    Args:
+        results_path (str): The csv file of all the benchmark results. It is
+            created if it does not exist.
+        results (pd.DataFrame): The results of the run.
+    """
+    if os.path.exists(results_path):
+        earlier = pd.read_csv(results_path, dtype={"revision": str})
+        results = pd.concat([earlier, results], ignore_index=True)
+    results.to_csv(results_path, index=False)
+
+
+def baseline_results(
+    results_path: str, revision: str, baseline: str = None
+) -> pd.DataFrame:
+    """Get the results to compare a revision with, from the results file.
+
+    Args:
+        results_path (str): The csv file of all the benchmark results.
+        revision (str): The revision being compared.
+        baseline (str, optional): The revision to compare with. If not given,
+            the most recently run revision other than the one being compared.
+
+    Returns:
+        pd.DataFrame: The latest results of the baseline revision for each
+            number of responses and stage. Empty if there is no baseline.
+    """
+    if not os.path.exists(results_path):
+        return pd.DataFrame()
+    results = pd.read_csv(results_path, dtype={"revision": str})
+    results = results.sort_values("run_time", kind="stable")
+
+    if baseline is None:
+        earlier = results.loc[results["revision"] != revision, "revision"]
+        if earlier.empty:
+            return pd.DataFrame()
+        baseline = earlier.iloc[-1]
+
+    results = results[results["revision"] == baseline]
+    return results.drop_duplicates(["responses", "stage"], keep="last")
+
+
+def find_regressions(
+    results: pd.DataFrame, baseline: pd.DataFrame, threshold: float = DEFAULT_THRESHOLD
+) -> pd.DataFrame:
+    """Find the stages that are slower, or use more memory, than the baseline.
+
+    A stage has regressed when a compared metric is above the baseline by more
+    than the threshold share, and by more than the metric's minimum difference.
+
+    Args:
+        results (pd.DataFrame): The results being compared.
+        baseline (pd.DataFrame): The results of the baseline revision.
+        threshold (float, optional): The share the baseline can be exceeded by.
+
+    Returns:
+        pd.DataFrame: One row for each regressed metric, with the number of
+            responses, stage, metric, baseline and new values and the change.
+    """
+    columns = ["responses", "stage", "metric", "baseline", "value", "change"]
+    if baseline.empty:
+        return pd.DataFrame(columns=columns)
+
+    compared = results.merge(
+        baseline, on=["responses", "stage"], suffixes=("", "_baseline")
+    )
+    regressions = []
+    for metric, min_difference in COMPARED_METRICS.items():
+        # A metric not recorded, such as memory that was not traced, is NaN
+        value = compared[metric].astype(float)
+        base = compared[f"{metric}_baseline"].astype(float)
+        regressed = (value - base > min_difference) & (value > base * (1 + threshold))
+        regressions.append(
+            pd.DataFrame(
+                {
+                    "responses": compared["responses"],
+                    "stage": compared["stage"],
+                    "metric": metric,
+                    "baseline": base,
+                    "value": value,
+                    "change": (value / base - 1).round(3),
+                }
+            )[regressed]
+        )
+    return pd.concat(regressions, ignore_index=True)[columns]
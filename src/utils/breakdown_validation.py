@@ -1,11 +1,23 @@
 """Function to validate the breakdown totals."""
 import logging
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
 
 from typing import Tuple
 
 BreakdownValidationLogger = logging.getLogger(__name__)
 
+ERROR_TABLE_COLS = ["reference", "instance", "check", "diff"]
+
+QA_ID_COLS = ["reference", "instance", "imp_class", "imp_marker"]
+
+GREATER_THAN_CHECKS = {
+    "check14": ["209", "221"],
+    "check15": ["211", "202"],
+}
+
 
 def get_equality_dicts(config: dict, sublist: str = "default") -> dict:
     """
@@ -53,6 +65,214 @@ def get_all_wanted_columns(config: dict) -> list:
     return all_columns
 
 
+class BreakdownCheckResult:
+    """
+    The outcome of evaluating a BreakdownCheckPlan against a dataframe.
+
+    Only the check matrices are held; the tidy error table and QA dataframes
+    are built from the original dataframe when requested.
+
+    Attributes
+    ==========
+    plan
+        the plan that was evaluated
+    df
+        the dataframe that was checked (not copied)
+    diffs
+        (rows x checks) array of breakdown sum minus total, NaN where the total
+        is null
+    skip
+        (rows x checks) boolean array, True where all the columns of a check
+        are null or all are zero
+    """
+
+    def __init__(
+        self,
+        plan: "BreakdownCheckPlan",
+        df: pd.DataFrame,
+        diffs: np.ndarray,
+        skip: np.ndarray,
+    ):
+        self.plan = plan
+        self.df = df
+        self.diffs = diffs
+        self.skip = skip
+
+    def equality_failures(self) -> np.ndarray:
+        """Rows and checks where the breakdowns do not exactly equal the total.
+
+        Checks where all the columns are null or zero are not failed, but a null
+        total with non-null breakdowns is.
+        """
+        return ~self.skip & ~(self.diffs == 0)
+
+    def tolerance_failures(self, tolerance: float = 0.5) -> np.ndarray:
+        """Rows and checks where the breakdowns differ from a non-null total by
+        more than the tolerance.
+        """
+        with np.errstate(invalid="ignore"):
+            return np.abs(self.diffs) > tolerance
+
+    def error_table(self, failures: np.ndarray) -> pd.DataFrame:
+        """Build the tidy error table for the given failures.
+
+        Args:
+            failures (np.ndarray): A (rows x checks) boolean array of failures.
+
+        Returns:
+            pd.DataFrame: One row per failed check, in row order then check
+                order, with the reference, instance, check name and diff.
+        """
+        rows, checks = np.nonzero(failures)
+        return (
+            self.df[["reference", "instance"]]
+            .iloc[rows]
+            .assign(
+                check=np.array(self.plan.check_names, dtype=object)[checks],
+                diff=self.diffs[rows, checks],
+            )
+        )
+
+    def check_results_dict(self, failures: np.ndarray) -> dict:
+        """Build a QA dataframe of the failing rows for each check.
+
+        Args:
+            failures (np.ndarray): A (rows x checks) boolean array of failures.
+
+        Returns:
+            dict: The QA dataframe for each check, empty where the check passed.
+        """
+        id_cols = [col for col in QA_ID_COLS if col in self.df.columns]
+        check_results_dict = {}
+        for j, key in enumerate(self.plan.check_names):
+            mask = failures[:, j]
+            if not mask.any():
+                check_results_dict[key] = pd.DataFrame()
+                continue
+            check_results_dict[key] = self.df.loc[
+                mask, id_cols + self.plan.checks[key]
+            ].assign(**{f"{key}_diff": self.diffs[mask, j]})
+        return check_results_dict
+
+    def qa_df(self, failures: np.ndarray) -> pd.DataFrame:
+        """Build one QA dataframe covering every reference with an error.
+
+        Args:
+            failures (np.ndarray): A (rows x checks) boolean array of failures.
+
+        Returns:
+            pd.DataFrame: All rows for the failing references, with the columns
+                and a diff column for each failed check.
+        """
+        id_cols = [col for col in QA_ID_COLS if col in self.df.columns]
+        failed_rows = failures.any(axis=1)
+        wanted_refs = self.df["reference"].to_numpy()[failed_rows]
+        ref_mask = self.df["reference"].isin(wanted_refs).to_numpy()
+
+        cols = []
+        diff_cols = {}
+        for j, key in enumerate(self.plan.check_names):
+            mask = failures[:, j]
+            if not mask.any():
+                continue
+            cols += [c for c in id_cols + self.plan.checks[key] if c not in cols]
+            diff_cols[f"{key}_diff"] = np.where(mask, self.diffs[:, j], np.nan)
+
+        return self.df.loc[ref_mask, cols].assign(
+            **{col: diff[ref_mask] for col, diff in diff_cols.items()}
+        )
+
+
+class BreakdownCheckPlan:
+    """
+    A compiled set of breakdown checks, evaluated in one pass over the data.
+
+    Each check is a list of columns where the breakdown columns should sum to
+    the last (total) column. The plan is held as an incidence matrix with one
+    row per column and one column per check, +1 for breakdowns and -1 for the
+    total, so every breakdown sum minus total is a single matrix product.
+
+    Attributes
+    ==========
+    checks
+        the checks, keyed by name
+    check_names
+        the check names, in order
+    columns
+        every column used by any check, in order of first use
+    total_index
+        the position of each check's total column in columns
+    incidence
+        (columns x checks) array of +1 for breakdowns and -1 for totals
+    membership
+        (columns x checks) array of 1 where a column is used by a check
+    """
+
+    def __init__(self, checks: dict):
+        self.checks = {key: list(columns) for key, columns in checks.items()}
+        self.check_names = list(self.checks)
+
+        self.columns = []
+        for columns in self.checks.values():
+            self.columns += [col for col in columns if col not in self.columns]
+        col_positions = {col: i for i, col in enumerate(self.columns)}
+
+        shape = (len(self.columns), len(self.check_names))
+        self.incidence = np.zeros(shape)
+        self.membership = np.zeros(shape)
+        self.total_index = np.zeros(len(self.check_names), dtype=int)
+        for j, columns in enumerate(self.checks.values()):
+            positions = [col_positions[col] for col in columns]
+            self.incidence[positions[:-1], j] += 1
+            self.incidence[positions[-1], j] -= 1
+            self.membership[positions, j] = 1
+            self.total_index[j] = positions[-1]
+        self.n_members = self.membership.sum(axis=0)
+
+    def evaluate(self, df: pd.DataFrame) -> BreakdownCheckResult:
+        """Evaluate every check against a dataframe.
+
+        Args:
+            df (pd.DataFrame): The dataframe to check.
+
+        Returns:
+            BreakdownCheckResult: The check matrices for the dataframe.
+        """
+        values = df[self.columns].to_numpy(dtype=float, na_value=np.nan)
+        is_null = np.isnan(values)
+
+        diffs = np.where(is_null, 0, values) @ self.incidence
+        diffs[is_null[:, self.total_index]] = np.nan
+
+        all_null = (is_null @ self.membership) == self.n_members
+        all_zero = ((values == 0) @ self.membership) == self.n_members
+        return BreakdownCheckResult(self, df, diffs, all_null | all_zero)
+
+
+@lru_cache(maxsize=None)
+def _compile_check_plan(checks_key: tuple) -> BreakdownCheckPlan:
+    """Compile a check plan from a hashable form of the checks."""
+    return BreakdownCheckPlan({key: list(columns) for key, columns in checks_key})
+
+
+def get_check_plan(checks: dict) -> BreakdownCheckPlan:
+    """
+    Get the compiled check plan for a dictionary of checks.
+
+    Plans are compiled once and shared, so the same checks used in staging,
+    construction and imputation are only compiled once per run.
+
+    Args:
+        checks (dict): The dictionary of columns to check.
+
+    Returns:
+        BreakdownCheckPlan
+    """
+    return _compile_check_plan(
+        tuple((key, tuple(columns)) for key, columns in checks.items())
+    )
+
+
 def replace_nulls_with_zero(df: pd.DataFrame, equals_checks) -> pd.DataFrame:
     """
     Replace nulls with zeros where the total is zero.
@@ -95,6 +315,72 @@ def remove_all_nulls_rows(df: pd.DataFrame, config: dict) -> pd.DataFrame:
     return rows_to_validate
 
 
+def _stack_errors(errors: list) -> pd.DataFrame:
+    """Combine per-check error tables into one table in row order.
+
+    The sort is stable, so the errors for each row stay in check order.
+
+    Args:
+        errors (list): A list of error tables, one per check, in check order.
+
+    Returns:
+        pd.DataFrame: The combined error table, indexed by row label.
+    """
+    if not errors:
+        return pd.DataFrame(columns=ERROR_TABLE_COLS)
+    return pd.concat(errors).sort_index(kind="stable")
+
+
+def get_equality_errors(df: pd.DataFrame, equals_checks: dict) -> pd.DataFrame:
+    """
+    Find rows where the breakdown columns do not sum to the total column.
+
+    All checks are evaluated together through the compiled check plan. Rows
+    where all the columns of a check are null or zero are not checked.
+
+    Args:
+        df (pd.DataFrame): The dataframe to check.
+        equals_checks (dict): The dictionary of columns to check, where the last
+            column in each list is the total.
+
+    Returns:
+        pd.DataFrame: One row per failed check, with the reference, instance,
+            check name and the difference between the breakdown sum and total.
+    """
+    result = get_check_plan(equals_checks).evaluate(df)
+    return result.error_table(result.equality_failures())
+
+
+def get_greater_than_errors(
+    df: pd.DataFrame, greater_than_checks: dict = GREATER_THAN_CHECKS
+) -> pd.DataFrame:
+    """
+    Find rows where a value is greater than one it should not exceed.
+
+    Args:
+        df (pd.DataFrame): The dataframe to check.
+        greater_than_checks (dict): The dictionary of columns to check, where the
+            first column should not be exceeded by the second.
+
+    Returns:
+        pd.DataFrame: One row per failed check, with the reference, instance,
+            check name and how much the second column exceeds the first.
+    """
+    errors = []
+    for key, columns in greater_than_checks.items():
+        should_be_greater = columns[0]
+        should_not_be_greater = columns[1]
+        fail = df[should_not_be_greater] > df[should_be_greater]
+        if fail.any():
+            check_df = df.loc[fail, ["reference", "instance"]]
+            check_df["check"] = key
+            check_df["diff"] = (
+                df.loc[fail, should_not_be_greater] - df.loc[fail, should_be_greater]
+            )
+            errors.append(check_df)
+    return _stack_errors(errors)
+
+
 def equal_validation(
     rows_to_validate: pd.DataFrame, equals_checks: dict
 ) -> pd.DataFrame:
@@ -110,28 +396,19 @@ def equal_validation(
     """
     BreakdownValidationLogger.info("Doing breakdown total checks...")
 
+    errors_df = get_equality_errors(rows_to_validate, equals_checks)
+
     msg = ""
-    count = 0
-    for index, row in rows_to_validate.iterrows():
-        for key, columns in equals_checks.items():
-            total_column = columns[-1]
-            breakdown_columns = columns[:-1]
-            if (
-                rows_to_validate[columns].isnull().all(axis=1).iloc[index]
-                or (rows_to_validate[columns] == 0).all(axis=1).iloc[index]
-            ):
-                continue
-            if not (
-                rows_to_validate[breakdown_columns].sum(axis=1)
-                == rows_to_validate[total_column]
-            ).iloc[index]:
-                msg += (
-                    f"Columns {breakdown_columns} do not equal column"
-                    f" {total_column} for reference: {row['reference']}, instance"
-                    f" {row['instance']}.\n "
-                )
-                count += 1
-    return msg, count
+    for reference, instance, key in zip(
+        errors_df["reference"], errors_df["instance"], errors_df["check"]
+    ):
+        columns = equals_checks[key]
+        msg += (
+            f"Columns {columns[:-1]} do not equal column"
+            f" {columns[-1]} for reference: {reference}, instance"
+            f" {instance}.\n "
+        )
+    return msg, errors_df.shape[0]
 
 
 def greater_than_validation(
@@ -151,25 +428,18 @@ def greater_than_validation(
     BreakdownValidationLogger.info(
         "Doing checks for values that should be greater than..."
     )
-    greater_than_checks = {
-        "check14": ["209", "221"],
-        "check15": ["211", "202"],
-    }
-    for index, row in rows_to_validate.iterrows():
-        for key, columns in greater_than_checks.items():
-            should_be_greater = columns[0]
-            should_not_be_greater = columns[1]
-            if (
-                rows_to_validate[should_not_be_greater]
-                > rows_to_validate[should_be_greater]
-            ).all():
-                msg += (
-                    f"Column {should_not_be_greater} is greater than"
-                    f" {should_be_greater} for reference: {row['reference']}, instance"
-                    f" {row['instance']}.\n "
-                )
-                count += 1
-    return msg, count
+    errors_df = get_greater_than_errors(rows_to_validate)
+
+    for reference, instance, key in zip(
+        errors_df["reference"], errors_df["instance"], errors_df["check"]
+    ):
+        should_be_greater, should_not_be_greater = GREATER_THAN_CHECKS[key]
+        msg += (
+            f"Column {should_not_be_greater} is greater than"
+            f" {should_be_greater} for reference: {reference}, instance"
+            f" {instance}.\n "
+        )
+    return msg, count + errors_df.shape[0]
 
 
 def get_breakdown_errors(df: pd.DataFrame, to_check: dict) -> pd.DataFrame:
@@ -177,49 +447,15 @@ def get_breakdown_errors(df: pd.DataFrame, to_check: dict) -> pd.DataFrame:
 
     Args:
         df (pd.DataFrame): The dataframe to check.
-        config (dict): The config dictionary.
+        to_check (dict): The dictionary of columns to check.
 
     Returns:
         dict: A dictionary with boolean values for each check.
         pd.DataFrame: The dataframe with the breakdown errors
     """
-    qa_df = df.copy()
-    wanted_refs = []  # a list of references that have errors
-    cols = []  # a list of columns that have errors
-
-    check_results_dict = {}
-    for key, columns in to_check.items():
-        total_column = columns[-1]
-        breakdown_columns = columns[:-1]
-        check_cond = abs(df[breakdown_columns].sum(axis=1) - df[total_column]) > 0.5
-        # if there are any errors for particular check..
-        if any(check_cond):
-            # ...create a mini dataframe for the relevant rows and columns
-            wanted_cols = ["reference", "instance", "imp_class", "imp_marker"] + list(
-                columns
-            )
-            check_df = df.copy().loc[check_cond, wanted_cols]
-            check_df[f"{key}_diff"] = (
-                df.loc[check_cond, breakdown_columns].sum(axis=1)
-                - df.loc[check_cond, total_column]
-            )
-
-            # add the diff column to the qa dataframe
-            qa_df.loc[check_cond, f"{key}_diff"] = check_df[f"{key}_diff"]
-            wanted_refs += [
-                r for r in (check_df["reference"].tolist()) if r not in wanted_refs
-            ]
-            cols += [c for c in check_df.columns if c not in cols] + [f"{key}_diff"]
-
-            # add the mini-dataframe to the dict for unit testing and logger messages
-            check_results_dict[key] = check_df
-        else:
-            check_results_dict[key] = pd.DataFrame()
-
-    # Filter and select so the qa dataframe has only relevant columns and rows
-    qa_df = qa_df.loc[df["reference"].isin(wanted_refs)][cols]
-
-    return check_results_dict, qa_df
+    result = get_check_plan(to_check).evaluate(df)
+    failures = result.tolerance_failures()
+    return result.check_results_dict(failures), result.qa_df(failures)
 
 
 def log_errors_to_screen(check_results_dict: dict, check_type: str) -> None:
@@ -257,10 +493,8 @@ def run_imputation_breakdown_validation(df: pd.DataFrame, config: dict) -> None:
         None
     """
     to_check_dict = get_equality_dicts(config, "imputation")
-    check_results_dict, qa_df = get_breakdown_errors(df, to_check_dict)
-    # temp output of qa_df for debugging
-    # if not qa_df.empty:
-    #     print(qa_df)
+    result = get_check_plan(to_check_dict).evaluate(df)
+    check_results_dict = result.check_results_dict(result.tolerance_failures())
 
     log_errors_to_screen(check_results_dict, "imputation")
 
@@ -308,11 +542,8 @@ def run_staging_breakdown_validation(df: pd.DataFrame, config: dict) -> None:
     to_check_dict = get_equality_dicts(config)
     df = replace_nulls_with_zero(df, to_check_dict)
 
-    check_results_dict, qa_df = get_breakdown_errors(df, to_check_dict)
-
-    # Note: this is a temporary implementation to show the QA output while we debug
-    # if not qa_df.empty:
-    #     print(qa_df)
+    result = get_check_plan(to_check_dict).evaluate(df)
+    check_results_dict = result.check_results_dict(result.tolerance_failures())
 
     log_errors_to_screen(check_results_dict, "staging")
     return df
@@ -33,6 +33,7 @@ def config_setup(user_config_path: str, dev_config_path: str) -> Dict:
 
     validate_freezing_config_settings(combined_config)
     validate_construction_config_settings(combined_config)
+    validate_runlog_config_settings(combined_config)
     return combined_config
 
 
@@ -404,3 +405,17 @@ def validate_construction_config_settings(config):
                 "If running NI construction, a NI construction file path must be"
                 " provided."
             )
+
+
+def validate_runlog_config_settings(config: dict) -> None:
+    """Check that the runlog is not written to both csv and SQLite.
+
+    The two stores each allocate their own run ids, and the runlog is read back
+    from the csv files, so a run written to both would not be read back whole.
+    """
+    runlog_writer = config["runlog_writer"]
+    if runlog_writer["write_csv"] and runlog_writer["write_sql"]:
+        raise ValueError(
+            "The runlog can be written to csv or to SQL, not both. Set one of"
+            " write_csv and write_sql to False."
+        )
@@ -0,0 +1,184 @@
+"""
+Serialise dataframes to csv in blocks of rows, optionally compressed.
+
+A wide dataframe serialised with one call to to_csv builds the whole csv as
+one string. Here the csv is built a block of rows at a time, optionally on
+worker threads, and each block is compressed and written in order as soon as
+it is ready.
+
+Contains the following:
+    iter_csv_chunks: Serialises a dataframe to csv in blocks of rows.
+    iter_csv_blocks: The same, with the blocks serialised on worker threads.
+    compression_for: Gets the compression of a file from its suffix.
+    write_csv_blocks: Writes a dataframe to an open binary file.
+    stream_decompressor: Creates a decompressor for the blocks of a stream.
+    open_text: Opens a compressed binary stream as text.
+"""
+
+# Standard libraries
+import gzip
+import io
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+# Third party libraries
+import pandas as pd
+
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# The date format used for every csv output
+CSV_DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f+00"
+
+DEFAULT_CHUNK_ROWS = 50000
+
+# The number of threads serialising the blocks of a csv written to a file
+DEFAULT_WRITE_WORKERS = 2
+
+# The compression used for each file suffix
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+
+
+def iter_csv_chunks(
+    data: pd.DataFrame, chunk_rows: int = DEFAULT_CHUNK_ROWS
+) -> Iterator[bytes]:
+    """Serialise a dataframe to utf-8 csv, one block of rows at a time.
+
+    The header is written with the first block only, so joining the blocks gives
+    the same csv as a single call to to_csv. An empty dataframe gives one block
+    holding the header.
+
+    Args:
+        data (pd.DataFrame): The dataframe to serialise.
+        chunk_rows (int, optional): The number of rows in each block.
+
+    Yields:
+        bytes: The csv for each block of rows.
+    """
+    for start in range(0, max(len(data), 1), chunk_rows):
+        yield _csv_block(data, start, chunk_rows)
+
+
+def _csv_block(data: pd.DataFrame, start: int, chunk_rows: int) -> bytes:
+    """Serialise the block of rows starting at start, with the header if first."""
+    return (
+        data.iloc[start : start + chunk_rows]
+        .to_csv(
+            header=(start == 0),
+            date_format=CSV_DATE_FORMAT,
+            index=False,
+        )
+        .encode("utf-8")
+    )
+
+
+def iter_csv_blocks(
+    data: pd.DataFrame, chunk_rows: int = DEFAULT_CHUNK_ROWS, workers: int = 1
+) -> Iterator[bytes]:
+    """Serialise a dataframe to utf-8 csv in blocks, on worker threads.
+
+    The blocks are yielded in order. At most two blocks per worker are
+    serialised ahead of the one being yielded, to bound the memory used.
+
+    Args:
+        data (pd.DataFrame): The dataframe to serialise.
+        chunk_rows (int, optional): The number of rows in each block.
+        workers (int, optional): The number of threads serialising blocks. With
+            one worker the blocks are serialised on the calling thread.
+
+    Yields:
+        bytes: The csv for each block of rows.
+    """
+    if workers <= 1:
+        yield from iter_csv_chunks(data, chunk_rows)
+        return
+
+    starts = iter(range(0, max(len(data), 1), chunk_rows))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for start in starts:
+            pending.append(executor.submit(_csv_block, data, start, chunk_rows))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            block = pending.popleft().result()
+            start = next(starts, None)
+            if start is not None:
+                pending.append(executor.submit(_csv_block, data, start, chunk_rows))
+            yield block
+
+
+def compression_for(filepath: str) -> str:
+    """Get the compression of a file from its suffix: "gzip", "zstd" or None."""
+    for suffix, compression in COMPRESSION_SUFFIXES.items():
+        if str(filepath).endswith(suffix):
+            return compression
+    return None
+
+
+def _compressor(compression: str):
+    """Create a streaming compressor, with compress and flush methods."""
+    if compression is None:
+        return None
+    if compression == "gzip":
+        # A wbits of 31 writes the gzip header and trailer
+        return zlib.compressobj(wbits=31)
+    if compression == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise ImportError("zstd compression needs the zstandard package.")
+        return zstandard.ZstdCompressor().compressobj()
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def write_csv_blocks(
+    file,
+    data: pd.DataFrame,
+    compression: str = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    workers: int = 1,
+) -> None:
+    """Write a dataframe as csv to a binary file, in blocks of rows.
+
+    Args:
+        file: The binary file object to write to.
+        data (pd.DataFrame): The dataframe to write.
+        compression (str, optional): "gzip", "zstd" or None.
+        chunk_rows (int, optional): The number of rows to serialise at a time.
+        workers (int, optional): The number of threads serialising blocks.
+    """
+    compressor = _compressor(compression)
+    for block in iter_csv_blocks(data, chunk_rows, workers):
+        file.write(compressor.compress(block) if compressor else block)
+    if compressor:
+        file.write(compressor.flush())
+
+
+def stream_decompressor(compression: str):
+    """Create a streaming decompressor, with a decompress method, or None."""
+    if compression is None:
+        return None
+    if compression == "gzip":
+        return zlib.decompressobj(wbits=31)
+    if compression == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise ImportError("zstd compression needs the zstandard package.")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def open_text(file, filepath: str):
+    """Open a compressed binary stream as utf-8 text, for its suffix."""
+    compression = compression_for(filepath)
+    if compression == "gzip":
+        file = gzip.GzipFile(fileobj=file, mode="rb")
+    elif compression == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise ImportError("zstd compression needs the zstandard package.")
+        file = zstandard.ZstdDecompressor().stream_reader(file)
+    return io.TextIOWrapper(file, encoding="utf-8")
@@ -1,5 +1,7 @@
 """All general functions for the hdfs file system which uses PyDoop.
-    These functions will need to be tested separately, using mocking.
+    Every operation uses the in-process pydoop hdfs client, rather than a
+    'hadoop fs' subprocess. They can be tested without a cluster by replacing
+    the hdfs module with the local file system stand-in in local_hdfs.py.
 
     NOTE: these functions used to be name-spaced with the prefix 'hdfs_',
     but these have now been updated to 'rd_' representing "R and D".
@@ -10,14 +12,22 @@
 
 import pandas as pd
 import json
+import hashlib
 import logging
-import subprocess
 import os
 import pathlib
-from typing import List, Union
+import uuid
+from typing import Union
+from urllib.parse import urlparse
 
 import yaml
 
+from src.utils.csv_blocks import (
+    DEFAULT_WRITE_WORKERS,
+    compression_for,
+    open_text,
+    write_csv_blocks,
+)
 from src.utils.wrappers import time_logger_wrap
 
 try:
@@ -31,6 +41,9 @@ except ImportError:
 # set up logging
 rd_logger = logging.getLogger(__name__)
 
+# The block size used to stream files through the md5 hash
+MD5_BLOCK_SIZE = 1024**2
+
 
 def rd_read_csv(filepath: str, **kwargs) -> pd.DataFrame:
     """Reads a csv from HDFS into a Pandas Dataframe using pydoop. 
@@ -65,15 +78,32 @@ def rd_read_csv(filepath: str, **kwargs) -> pd.DataFrame:
 def rd_write_csv(filepath: str, data: pd.DataFrame):
     """Writes a Pandas Dataframe to csv in DAP
 
+    The csv is serialised in blocks of rows, and compressed if the filepath
+    ends in .gz or .zst.
+
     Args:
         filepath (str): Filepath (Specified in config)
         data (pd.DataFrame): Data to be stored
     """
     # Open the file in write mode
-    with hdfs.open(filepath, "wt") as file:
+    with hdfs.open(filepath, "wb") as file:
         # Write dataframe to DAP context
-        data.to_csv(file, date_format="%Y-%m-%d %H:%M:%S.%f+00", index=False)
-    return None
+        write_csv_blocks(
+            file, data, compression_for(filepath), workers=DEFAULT_WRITE_WORKERS
+        )
+
+
+def rd_open(filepath: str, mode: str = "rb"):
+    """Open a file on HDFS as a stream, using pydoop.
+
+    Args:
+        filepath (str): The path of the file.
+        mode (str, optional): The mode to open the file in.
+
+    Returns:
+        A file object, to be used as a context manager.
+    """
+    return hdfs.open(filepath, mode)
 
 
 def rd_load_json(filepath: str) -> dict:
@@ -191,88 +221,77 @@ def rd_read_feather(filepath):
     return df
 
 
-def _perform(
-    command,
-    shell: bool = False,
-    str_output: bool = False,
-    ignore_error: bool = False,
-    full_out=False,
-):
-    """
-    Run shell command in subprocess returning exit code or full string output.
-    _perform() will build the command that will be put into HDFS.
-    This will also be used for the functions below.
-    Parameters
-    ----------
-    shell
-        If true, the command will be executed through the shell.
-        See subprocess.Popen() reference.
-    str_output
-        output exception as string
-    ignore_error
-    """
-    process = subprocess.Popen(
-        command, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-    )
-    stdout, stderr = process.communicate()
+def _hdfs_path(name: str) -> str:
+    """Strip the scheme and host from a path listed by hdfs.lsl."""
+    return urlparse(name).path
 
-    if str_output:
-        if stderr and not ignore_error:
-            raise Exception(stderr.decode("UTF-8").strip("\n"))
-        if full_out:
-            return stdout
-        return stdout.decode("UTF-8").strip("\n")
 
-    return process.returncode == 0
+def _destination(src_path: str, dst_path: str) -> str:
+    """Copy or move into a directory as 'hadoop fs' does, keeping the file name."""
+    if hdfs.path.isdir(dst_path):
+        return os.path.join(dst_path, os.path.basename(src_path.rstrip("/")))
+    return dst_path
 
 
-def rd_delete_file(path: str):
+def rd_delete_file(path: str) -> bool:
     """
-    Delete a file. Uses 'hadoop fs -rm'.
+    Delete a file. Uses the in-process hdfs client.
 
     Returns
     -------
     True for successfully completed operation. Else False.
     """
-    command = ["hadoop", "fs", "-rm", path]
-    return _perform(command)
+    try:
+        hdfs.rm(path, recursive=False)
+    except (IOError, OSError) as e:
+        rd_logger.error(f"Could not delete {path}: {e}")
+        return False
+    return True
 
 
-def rd_md5sum(path: str):
+def rd_md5sum(path: str) -> str:
     """
-    Get md5sum of a specific file on HDFS.
+    Get md5sum of a specific file on HDFS. The file is read in blocks, so the
+    whole file is never held in memory.
     """
-    return _perform(
-        f"hadoop fs -cat {path} | md5sum",
-        shell=True,
-        str_output=True,
-        ignore_error=True,
-    ).split(" ")[0]
+    md5 = hashlib.md5()
+    with hdfs.open(path, "rb") as file:
+        for block in iter(lambda: file.read(MD5_BLOCK_SIZE), b""):
+            md5.update(block)
+    return md5.hexdigest()
 
 
-def rd_stat_size(path: str):
+def rd_stat_size(path: str) -> int:
     """
-    Runs stat command on a file or directory to get the size in bytes.
+    Get the size in bytes of a file, or the total size of the files in a
+    directory and its subdirectories.
     """
-    command = ["hadoop", "fs", "-du", "-s", path]
-    return _perform(command, str_output=True).split(" ")[0]
+    if not hdfs.path.isdir(path):
+        return hdfs.path.getsize(path)
+
+    size = 0
+    for entry in hdfs.lsl(path):
+        if entry["kind"] == "directory":
+            size += rd_stat_size(_hdfs_path(entry["name"]))
+        else:
+            size += entry["size"]
+    return size
 
 
 def rd_isdir(path: str) -> bool:
     """
-    Test if directory exists. Uses 'hadoop fs -test -d'.
+    Test if directory exists.
 
     Returns
     -------
     True for successfully completed operation. Else False.
     """
-    command = ["hadoop", "fs", "-test", "-d", path]
-    return _perform(command)
+    return hdfs.path.isdir(path)
 
 
 def rd_isfile(path: str) -> bool:
     """
-    Test if file exists. Uses 'hadoop fs -test -f.
+    Test if file exists.
 
     Returns
     -------
@@ -286,94 +305,145 @@ def rd_isfile(path: str) -> bool:
     if path is None:
         return False
 
-    command = ["hadoop", "fs", "-test", "-f", path]
-    return _perform(command)
+    return hdfs.path.isfile(path)
+
+
+def rd_stat_many(paths: list) -> dict:
+    """
+    Test if many files exist on HDFS and get their sizes.
+
+    Returns
+    -------
+    A dictionary of whether each path is a file and its size in bytes.
+    """
+    stats = {}
+    for path in paths:
+        isfile = rd_isfile(path)
+        size = int(rd_stat_size(path)) if isfile else 0
+        stats[path] = {"isfile": isfile, "size": size}
+    return stats
 
 
 def rd_read_header(path: str):
     """
-    Reads the first line of a file on HDFS
+    Reads the first line of a file on HDFS, without the new line character.
+    .gz and .zst files are decompressed.
     """
-    return _perform(
-        f"hadoop fs -cat {path} | head -1",
-        shell=True,
-        str_output=True,
-        ignore_error=True,
-    )
+    if compression_for(path):
+        with hdfs.open(path, "rb") as file:
+            return open_text(file, path).readline().rstrip("\n")
+    with hdfs.open(path, "rt") as file:
+        return file.readline().rstrip("\n")
 
 
 def rd_write_string_to_file(content: bytes, path: str):
     """
     Writes a string into the specified file path
     """
-    _write_string_to_file = subprocess.Popen(
-        f"hadoop fs -put - {path}", stdin=subprocess.PIPE, shell=True
-    )
-    return _write_string_to_file.communicate(content)
+    with hdfs.open(path, "wb") as file:
+        file.write(content)
+    return None
+
+
+def rd_create_exclusive(path: str, content: bytes = b""):
+    """
+    Creates a file on HDFS, failing if it already exists. The content is
+    written to a temporary file and renamed, which HDFS refuses to do if the
+    destination exists, so two concurrent runs cannot both create the file.
+
+    Raises
+    ------
+    FileExistsError if the file already exists.
+    """
+    if hdfs.path.exists(path):
+        raise FileExistsError(f"File: {path} already exists")
 
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with hdfs.open(tmp_path, "wb") as file:
+        file.write(content)
+    try:
+        hdfs.rename(tmp_path, path)
+    except (IOError, OSError) as e:
+        hdfs.rm(tmp_path, recursive=False)
+        raise FileExistsError(f"File: {path} already exists") from e
 
-def rd_copy_file(src_path: str, dst_path: str):
+
+def rd_copy_file(src_path: str, dst_path: str) -> bool:
     """
-    Copy a file from one location to another. Uses 'hadoop fs -cp'.
+    Copy a file from one location to another. If the destination is a
+    directory, the file is copied into it.
+
+    Returns
+    -------
+    True for successfully completed operation. Else False.
     """
-    command = ["hadoop", "fs", "-cp", src_path, dst_path]
-    return _perform(command)
+    try:
+        hdfs.cp(src_path, _destination(src_path, dst_path))
+    except (IOError, OSError) as e:
+        rd_logger.error(f"Could not copy {src_path} to {dst_path}: {e}")
+        return False
+    return True
 
 
-def rd_move_file(src_path: str, dst_path: str):
+def rd_move_file(src_path: str, dst_path: str) -> bool:
     """
-    Move a file from one location to another. Uses 'hadoop fs -mv'.
+    Move a file from one location to another. If the destination is a
+    directory, the file is moved into it.
+
+    Returns
+    -------
+    True for successfully completed operation. Else False.
     """
-    command = ["hadoop", "fs", "-mv", src_path, dst_path]
-    return _perform(command)
+    try:
+        hdfs.rename(src_path, _destination(src_path, dst_path))
+    except (IOError, OSError) as e:
+        rd_logger.error(f"Could not move {src_path} to {dst_path}: {e}")
+        return False
+    return True
 
 
 def rd_list_files(path: str, ext: str = None, order=None):
     """
-    List files in a directory. Uses 'hadoop fs -ls'.
+    List files in a directory, optionally with an extension and sorted by
+    modification time.
     """
-    # Forming the command line command and executing
-    command = ["hadoop", "fs", "-ls", path]
+    files = [entry for entry in hdfs.lsl(path) if entry["kind"] == "file"]
+
     if order:
-        ord_dict = {"newest": "-t", "oldest": "-t -r"}
-        command = ["hadoop", "fs", "-ls", ord_dict[order], path]
-    files_as_str = _perform(command, str_output=True)
+        ord_dict = {"newest": True, "oldest": False}
+        files = sorted(files, key=lambda f: f["last_mod"], reverse=ord_dict[order])
 
-    # Breaking up the returned string, and stripping down to just paths of files
-    file_paths = [line.split()[-1] for line in files_as_str.strip().split("\n")[1:]]
+    file_paths = [_hdfs_path(file["name"]) for file in files]
 
     # Filtering the files to just those with the required extension
     if ext:
-        ext = f".{ext}"
+        ext = f".{ext.lstrip('.')}"
         file_paths = [file for file in file_paths if os.path.splitext(file)[1] == ext]
 
     return file_paths
 
 
 def rd_search_file(dir_path, ending):
-    """Find a file in a directory with a specific ending using grep and hadoop fs -ls.
+    """Find a file in a directory with a specific ending.
 
     Args:
-        dir_path (_type_): _description_
-        ending (_type_): _description_
-    """
-    target_file = _perform(
-        f"hadoop fs -ls {dir_path} | grep {ending}",
-        shell=True,
-        str_output=True,
-        ignore_error=True,
+        dir_path (str): The directory to search in.
+        ending (str): The file name ending to search for.
+
+    Returns:
+        str: The path of the last matching file, in name order.
+    """
+    target_files = sorted(
+        file for file in rd_list_files(dir_path) if file.endswith(ending)
     )
 
     # Handle case where file does not exist
-    if not target_file:
+    if not target_files:
         raise FileNotFoundError(
             f"File with ending {ending} does not exist in {dir_path}"
         )
 
-    # Return file path + name
-    target_file = target_file.split()[-1]
-
-    return target_file
+    return target_files[-1]
 
 
 def safeload_yaml(path: Union[str, pathlib.Path]) -> dict:
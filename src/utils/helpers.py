@@ -1,12 +1,16 @@
 """Define helper functions to be used throughout the pipeline.."""
+import logging
 import yaml
 import toml
+import numpy as np
 import pandas as pd
 
 from typing import Union
 
 from src.utils.defence import type_defence
-from src.mapping.itl_mapping import join_itl_regions
+from src.mapping.mapper_registry import MapperLookup
+
+HelpersLogger = logging.getLogger(__name__)
 
 # Define paths
 user_config_path = "config/userconfig.toml"
@@ -113,46 +117,60 @@ def values_in_column(
 
 def validate_updated_postcodes(
     df: pd.DataFrame,
-    postcode_mapper: pd.DataFrame,
-    itl_mapper: pd.DataFrame,
+    postcode_regions: MapperLookup,
     config: dict,
 ) -> pd.DataFrame:
-    """Update the postcodes_harmonised column and re-map the itl columns.
+    """Re-map the itl columns of records whose postcodes changed after mapping.
+
+    Only records that have been constructed or imputed with backdata can have
+    had their postcodes_harmonised changed. Of those, the records whose itl no
+    longer matches their postcode are updated in place, so no copy of the
+    dataframe is made and the order of the records is kept.
 
     Args:
         df (pd.DataFrame): The full responses dataframe.
-        postcode_mapper (pd.DataFrame): The postcode mapper dataframe mapping to itl.
-        itl_mapper (pd.DataFrame): The ITL mapper dataframe mapping to ITL regions.
+        postcode_regions (MapperLookup): The lookup from postcode to itl and
+            ITL regions, built in mapping.
         config (dict): The pipeline configuration settings.
 
     Returns:
-        pd.DataFrame: The updated full responses dataframe with the postcodes_harmonised
-            column updated and the itl columns re-mapped.
+        pd.DataFrame: The full responses dataframe, with the itl columns
+            re-mapped.
     """
     # filter out records that have been constructed or imputed with backdata
-    imp_marker_mask = df["imp_marker"].isin(["CF", "MoR", "constructed"])
+    mask = df["imp_marker"].isin(["CF", "MoR", "constructed"])
     if "is_constructed" in df.columns:
-        constructed_mask = df["is_constructed"].isin([True])
-        mask = imp_marker_mask | constructed_mask
-    else:
-        mask = imp_marker_mask
-    filtered_df = df.copy().loc[mask]
-
-    # re-calculate the itl columns based on imputed and constructed columns
-    geo_cols = config["mappers"]["geo_cols"]
-    filtered_df = filtered_df.copy().drop(["itl"] + geo_cols, axis=1)
-    filtered_df = join_itl_regions(
-        filtered_df,
-        postcode_mapper,
-        itl_mapper,
-        config,
-        pc_col="postcodes_harmonised",
-        warn_only=True,
+        mask = mask | df["is_constructed"].isin([True])
+    positions = np.flatnonzero(mask.to_numpy())
+
+    postcodes = df["postcodes_harmonised"].iloc[positions]
+    codes = postcode_regions.codes(postcodes)
+    unmatched = postcodes.notna().to_numpy() & (codes == -1)
+    if unmatched.any():
+        HelpersLogger.warning(
+            "The following postcodes_harmonised values are not in the postcode "
+            f"mapper: {postcodes[unmatched].unique()}"
+        )
+
+    # find the records whose itl is out of date for their postcode
+    current_itl = df["itl"].iloc[positions]
+    mapped_itl = pd.Series(
+        postcode_regions.take(codes, "itl"), index=current_itl.index
     )
+    same_itl = current_itl.eq(mapped_itl).fillna(False) | (
+        current_itl.isna() & mapped_itl.isna()
+    )
+    changed = ~same_itl.to_numpy()
+    if not changed.any():
+        return df
 
-    filtered_df = filtered_df[list(df.columns)]
-
-    df = pd.concat([df.loc[~mask], filtered_df])
+    # re-calculate the itl columns based on imputed and constructed columns
+    changed_positions = positions[changed]
+    for col in ["itl"] + config["mappers"]["geo_cols"]:
+        df.iloc[changed_positions, df.columns.get_loc(col)] = postcode_regions.take(
+            codes[changed], col
+        )
+    HelpersLogger.info(f"Re-mapped the itl columns of {changed.sum()} records.")
     return df
 
 
@@ -17,6 +17,12 @@ from typing import Union
 
 import yaml
 
+from src.utils.csv_blocks import (
+    DEFAULT_WRITE_WORKERS,
+    compression_for,
+    open_text,
+    write_csv_blocks,
+)
 from src.utils.wrappers import time_logger_wrap
 
 # Set up logger
@@ -58,14 +64,32 @@ def rd_read_csv(filepath: str, **kwargs) -> pd.DataFrame:
 def rd_write_csv(filepath: str, data: pd.DataFrame):
     """Writes a Pandas Dataframe to csv on a local network drive
 
+    The csv is serialised in blocks of rows, and compressed if the filepath
+    ends in .gz or .zst.
+
     Args:
         filepath (str): Filepath
         data (pd.DataFrame): Data to be stored
     """
     # Open the file in write mode
-    with open(filepath, "w", newline="\n", encoding="utf-8") as file:
+    with open(filepath, "wb") as file:
         # Write dataframe to the file
-        data.to_csv(file, date_format="%Y-%m-%d %H:%M:%S.%f+00", index=False)
+        write_csv_blocks(
+            file, data, compression_for(filepath), workers=DEFAULT_WRITE_WORKERS
+        )
+
+
+def rd_open(filepath: str, mode: str = "rb"):
+    """Open a file on the local file system as a stream.
+
+    Args:
+        filepath (str): The path of the file.
+        mode (str, optional): The mode to open the file in.
+
+    Returns:
+        A file object, to be used as a context manager.
+    """
+    return open(filepath, mode)
 
 
 def rd_load_json(filepath: str) -> dict:
@@ -252,14 +276,34 @@ def rd_isfile(path: str) -> bool:
     return os.path.isfile(path)
 
 
+def rd_stat_many(paths: list) -> dict:
+    """
+    Test if many files exist on the local file system and get their sizes.
+
+    Returns
+    -------
+    A dictionary of whether each path is a file and its size in bytes.
+    """
+    stats = {}
+    for path in paths:
+        isfile = rd_isfile(path)
+        size = os.stat(path).st_size if isfile else 0
+        stats[path] = {"isfile": isfile, "size": size}
+    return stats
+
+
 def rd_read_header(path: str):
     """
-    Reads the first line of a file on the local file system.
+    Reads the first line of a file on the local file system, decompressing
+    .gz and .zst files.
 
     Returns
     -------
     The first line of the file as a string.
     """
+    if compression_for(path):
+        with open(path, "rb") as f:
+            return open_text(f, path).readline()
     with open(path, "r") as f:
         return f.readline()
 
@@ -276,6 +320,20 @@ def rd_write_string_to_file(content: bytes, path: str):
         f.write(content)
 
 
+def rd_create_exclusive(path: str, content: bytes = b""):
+    """
+    Creates a file on the local file system, failing if it already exists.
+    Used to claim names, such as run ids, that must be unique across
+    concurrent runs.
+
+    Raises
+    ------
+    FileExistsError if the file already exists.
+    """
+    with open(path, "xb") as f:
+        f.write(content)
+
+
 def rd_copy_file(src_path: str, dst_path: str):
     """
     Copies a file from src_path to dst_path on the local file system.
@@ -0,0 +1,81 @@
+"""
+A local file system stand-in for the parts of pydoop.hdfs used by hdfs_mods.
+
+The functions have the same names, arguments and return values as their
+pydoop.hdfs equivalents, so the hdfs_mods functions can be tested without a
+cluster by replacing hdfs_mods.hdfs with this module.
+
+Contains the following:
+    open: Opens a file.
+    mkdir: Creates a directory and any missing parents.
+    rm: Removes a file or directory.
+    cp: Copies a file or directory.
+    rename: Moves a file or directory.
+    lsl: Lists a directory, with the metadata of each entry.
+    path: The exists, isdir, isfile and getsize functions.
+"""
+
+# Standard libraries
+import builtins
+import os
+import shutil
+from types import SimpleNamespace
+from typing import List
+
+path = SimpleNamespace(
+    exists=os.path.exists,
+    isdir=os.path.isdir,
+    isfile=os.path.isfile,
+    getsize=os.path.getsize,
+)
+
+
+def open(hdfs_path: str, mode: str = "r"):
+    """Open a file, in the same modes as pydoop.hdfs.open."""
+    return builtins.open(hdfs_path, mode)
+
+
+def mkdir(hdfs_path: str) -> None:
+    """Create a directory and any missing parents."""
+    os.makedirs(hdfs_path, exist_ok=True)
+
+
+def rm(hdfs_path: str, recursive: bool = True) -> None:
+    """Remove a file, or a directory if recursive is True."""
+    if os.path.isdir(hdfs_path):
+        if not recursive:
+            raise IOError(f"{hdfs_path} is a directory")
+        shutil.rmtree(hdfs_path)
+    else:
+        os.remove(hdfs_path)
+
+
+def cp(src_hdfs_path: str, dest_hdfs_path: str) -> None:
+    """Copy a file or directory to a new path."""
+    if os.path.isdir(src_hdfs_path):
+        shutil.copytree(src_hdfs_path, dest_hdfs_path)
+    else:
+        shutil.copyfile(src_hdfs_path, dest_hdfs_path)
+
+
+def rename(from_path: str, to_path: str) -> None:
+    """Move a file or directory to a new path, failing if it exists, as HDFS does."""
+    if os.path.exists(to_path):
+        raise IOError(f"{to_path} already exists")
+    os.rename(from_path, to_path)
+
+
+def lsl(hdfs_path: str) -> List[dict]:
+    """List a directory, giving the name, kind, size and last_mod of each entry."""
+    entries = []
+    for entry in os.scandir(hdfs_path):
+        stat = entry.stat()
+        entries.append(
+            {
+                "name": os.path.abspath(entry.path),
+                "kind": "directory" if entry.is_dir() else "file",
+                "size": stat.st_size,
+                "last_mod": stat.st_mtime,
+            }
+        )
+    return entries
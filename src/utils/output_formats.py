@@ -0,0 +1,209 @@
+"""
+Write the pipeline outputs and QA files as Parquet, for outputs configured so.
+
+Every output and QA file is written with write_csv, to a file named
+"{year}_{output}_{date}_v{run_id}.csv". The output_formats section of the
+user config gives the format of each output, by the output part of that name.
+OutputFormatMiddleware sends the writes of outputs set to "parquet" to a
+Parquet file of the same name instead, with the column types taken from the
+output's TOML schema, so the change applies to every storage backend and needs
+nothing of the modules writing the outputs. The output_compression section
+likewise sets outputs to be compressed with gzip or zstd: csv outputs get a
+.gz or .zst suffix, which the local and hdfs backends compress for, and
+Parquet outputs use the compression as their codec.
+
+Contains the following:
+    output_name: Gets the name of the output a file is for.
+    arrow_types: Maps the types in an output schema to Arrow types.
+    to_arrow_table: Converts a dataframe to an Arrow table of the given types.
+    OutputFormatMiddleware: Writes outputs in the format configured for them.
+"""
+
+# Standard libraries
+import io
+import logging
+import os
+import re
+from typing import Dict
+
+# Third party libraries
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import toml
+
+# Local libraries
+from src.utils.storage import Storage, StorageMiddleware
+
+OutputFormatsLogger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = {"csv", "parquet"}
+
+# The suffix added to csv outputs for each compression
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+# The Arrow type for each Deduced_Data_Type used in the output schemas
+ARROW_TYPES = {
+    "Int64": pa.int64(),
+    "int64": pa.int64(),
+    "float": pa.float64(),
+    "float64": pa.float64(),
+    "bool": pa.bool_(),
+    "boolean": pa.bool_(),
+    "str": pa.string(),
+    "object": pa.string(),
+    "category": pa.string(),
+    "pd.NA": pa.string(),
+    "datetime64[ns]": pa.timestamp("ns"),
+}
+
+# Output and QA file names: the survey year, output, date and run id
+OUTPUT_FILENAME = re.compile(
+    r"^\d{4}_(?:output_)?(?P<output>.+?)_?\d{2}-\d{2}-\d{2}_v\d+\.csv$"
+)
+
+
+def output_name(filepath: str) -> str:
+    """Get the name of the output a file is for, or None if it is not an output.
+
+    For example "2023_output_tau_24-10-14_v3.csv" is for the "tau" output.
+    """
+    match = OUTPUT_FILENAME.match(os.path.basename(filepath))
+    return match.group("output") if match else None
+
+
+def arrow_types(schema_dict: Dict[str, dict]) -> Dict[str, pa.DataType]:
+    """Map the Deduced_Data_Type of each column in an output schema to Arrow.
+
+    Columns without a type, or with a type not in ARROW_TYPES, are left out,
+    so their type is inferred from the data.
+    """
+    return {
+        column: ARROW_TYPES[spec["Deduced_Data_Type"]]
+        for column, spec in schema_dict.items()
+        if spec.get("Deduced_Data_Type") in ARROW_TYPES
+    }
+
+
+def _to_arrow_array(series: pd.Series, arrow_type: pa.DataType = None) -> pa.Array:
+    """Convert a column to Arrow, cast to the given type if it can be."""
+    try:
+        array = pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columns of mixed types are written as strings
+        array = pa.array(series.where(series.isnull(), series.astype(str)))
+
+    if arrow_type is None or array.type == arrow_type:
+        return array
+    try:
+        return array.cast(arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        OutputFormatsLogger.warning(
+            f"Column {series.name} cannot be written as {arrow_type}; "
+            f"writing it as {array.type}."
+        )
+        return array
+
+
+def to_arrow_table(
+    df: pd.DataFrame, types: Dict[str, pa.DataType] = None
+) -> pa.Table:
+    """Convert a dataframe to an Arrow table, with the types given for columns.
+
+    Args:
+        df (pd.DataFrame): The dataframe to convert.
+        types (Dict[str, pa.DataType], optional): The Arrow type of each column.
+            Columns not given a type keep the type inferred from the data.
+
+    Returns:
+        pa.Table: The table, without the dataframe index.
+    """
+    types = types or {}
+    arrays = [_to_arrow_array(df[col], types.get(col)) for col in df.columns]
+    return pa.Table.from_arrays(arrays, names=[str(col) for col in df.columns])
+
+
+def _set_options(
+    options: Dict[str, str], allowed: set, description: str
+) -> Dict[str, str]:
+    """The options set in a config section, checking each is allowed."""
+    options = {
+        output: option for output, option in (options or {}).items() if option
+    }
+    unknown = set(options.values()) - allowed
+    if unknown:
+        raise ValueError(f"Unknown {description} {unknown}; use one of {allowed}.")
+    return options
+
+
+class OutputFormatMiddleware(StorageMiddleware):
+    """
+    Writes each output in the format set for it in the output_formats config.
+
+    A write_csv of an output set to "parquet" writes a Parquet file, with the
+    .csv suffix replaced by .parquet. A csv output set to be compressed is
+    passed on with the suffix for its compression added. Other writes,
+    including files that are not outputs, such as the runlogs, are passed on
+    unchanged.
+
+    Attributes
+    ==========
+    formats
+        the format of each output, keyed by output name
+    compression
+        the compression of each compressed output, keyed by output name
+    schema_paths
+        the paths of the output schemas, keyed by "{output}_schema"
+    """
+
+    def __init__(
+        self,
+        inner: Storage,
+        formats: Dict[str, str] = None,
+        schema_paths: Dict[str, str] = None,
+        compression: Dict[str, str] = None,
+    ):
+        super().__init__(inner)
+        self.formats = _set_options(formats, OUTPUT_FORMATS, "output formats")
+        self.compression = _set_options(
+            compression, set(COMPRESSION_SUFFIXES), "output compressions"
+        )
+        self.schema_paths = schema_paths or {}
+        self._types: Dict[str, Dict[str, pa.DataType]] = {}
+
+    def output_format(self, filepath: str) -> str:
+        """The format to write a file in: "parquet" or "csv"."""
+        return self.formats.get(output_name(filepath), "csv")
+
+    def call(self, operation: str, *args, **kwargs):
+        if operation != "write_csv" or output_name(args[0]) is None:
+            return super().call(operation, *args, **kwargs)
+
+        filepath, *rest = args
+        if self.output_format(filepath) == "parquet":
+            return self._write_output_parquet(filepath, *rest, **kwargs)
+        compression = self.compression.get(output_name(filepath))
+        if compression is not None:
+            filepath += COMPRESSION_SUFFIXES[compression]
+        return super().call(operation, filepath, *rest, **kwargs)
+
+    def _output_types(self, output: str) -> Dict[str, pa.DataType]:
+        """The Arrow types of the columns of an output, from its schema."""
+        if output not in self._types:
+            schema_path = self.schema_paths.get(f"{output}_schema")
+            schema_dict = toml.load(schema_path) if schema_path else {}
+            self._types[output] = arrow_types(schema_dict)
+        return self._types[output]
+
+    def _write_output_parquet(self, filepath: str, data: pd.DataFrame) -> None:
+        """Write an output as Parquet, in place of the csv file."""
+        parquet_path = os.path.splitext(filepath)[0] + ".parquet"
+        output = output_name(filepath)
+        table = to_arrow_table(data, self._output_types(output))
+
+        buffer = io.BytesIO()
+        codec = self.compression.get(output, "snappy")
+        pq.write_table(table, buffer, compression=codec)
+        with self.open(parquet_path, "wb") as file:
+            file.write(buffer.getvalue())
+        OutputFormatsLogger.info(f"Written {parquet_path} as Parquet")
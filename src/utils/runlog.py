@@ -1,3 +1,4 @@
+import logging
 import os
 # import csv
 from datetime import datetime
@@ -5,6 +6,19 @@ from typing import Tuple
 
 import pandas as pd
 
+from src.utils.runlog_store import create_runlog_store
+from src.utils.wrappers import (
+    DF_METRICS_COLUMNS,
+    LOG_CAPTURE,
+    LOG_RECORD_COLUMNS,
+    STAGE_METRICS_COLUMNS,
+    get_df_metrics,
+    get_log_records,
+    get_stage_metrics,
+)
+
+RunLogger = logging.getLogger(__name__)
+
 
 class RunLog:
     """Creates a runlog instance for the pipeline."""
@@ -17,6 +31,9 @@ class RunLog:
         mkdir_func,
         read_csv_func,
         write_csv_func,
+        list_files_func,
+        create_exclusive_func,
+        delete_file_func,
     ):
         # config based attrs
         self.config = config
@@ -31,11 +48,21 @@ class RunLog:
         self.read_csv_func = read_csv_func
         self.write_func = write_csv_func
         self.write_csv_func = write_csv_func
+        # the append-only store for this run's logs
+        self.store = create_runlog_store(
+            config,
+            file_exists_func,
+            mkdir_func,
+            read_csv_func,
+            write_csv_func,
+            list_files_func,
+            create_exclusive_func,
+            delete_file_func,
+        )
         # pipeline information
         self.run_id = self._create_run_id()
         self.version = version
         # logs
-        self.logs = []
         self.timestamp = datetime.now().strftime("%d/%m/%Y-%H:%M:%S")
 
     def _create_folder(self):
@@ -52,21 +79,11 @@ class RunLog:
         return self.context
 
     def _create_run_id(self):
-        """Create a unique run_id from the previous iteration"""
-        # Import name of main log file
-        main_path = self.log_filenames["main"]
-        mainfile = os.path.join(self.logs_folder, main_path)
-        latest_id = 0
-        # If the file exists, read it using the read_csv function
-        if self.file_exists_func(mainfile):
-            runfile = self.read_csv_func(mainfile)
-            # Check if the dataframe has at least one data row
-            if len(runfile):
-                latest_id = max(runfile.run_id)
-                
-        # increment the latest id by 1
-        run_id = latest_id + 1
-        return run_id
+        """Claim a unique run_id from the runlog store.
+
+        The claim is atomic, so two runs starting together get different ids.
+        """
+        return self.store.claim_run_id()
 
     def _record_time_taken(self):
         """Get the time taken for the pipeline to run (in seconds).
@@ -79,25 +96,15 @@ class RunLog:
         return self.time_taken
 
     def _retrieve_pipeline_logs(self):
-        """
-        Get all of the logs from the pipeline run and append them to self.saved_logs df.
-        """
-        with open("logs/main.log", "r") as f:
-            # Split logs by line
-            lines = f.read().splitlines()
-
-        self.runids = {"run_id": self.run_id}
-        self.users = {"user": self.user}
-        # Add run_id and user to logs
-        for line in lines:
-            self.logs.append(line.split(" - "))
-            self.runids.update({"run_id": self.run_id})
-            self.users.update({"user": self.user})
-        self.run_logs_df = pd.DataFrame(
-            self.logs, columns=["timestamp", "module", "function", "message"]
-        )
-        self.run_logs_df.insert(0, "run_id", self.runids["run_id"])
-        self.run_logs_df.insert(1, "user", self.users["user"])
+        """Get the log records captured during the pipeline run."""
+        if LOG_CAPTURE.dropped:
+            RunLogger.warning(
+                f"The runlog is missing the first {LOG_CAPTURE.dropped} log records"
+                " of the run; see logs/main.log for the full log."
+            )
+        self.run_logs_df = get_log_records()
+        self.run_logs_df.insert(0, "run_id", self.run_id)
+        self.run_logs_df.insert(1, "user", self.user)
 
         return self.run_logs_df
 
@@ -165,11 +172,21 @@ class RunLog:
         file_path = str(os.path.join(self.logs_folder, file_name))
         self.log_csv_creator(file_path, config_columns)
 
-        log_columns = ["run_id", "user", "timestamp", "module", "function", "message"]
+        log_columns = ["run_id", "user"] + LOG_RECORD_COLUMNS
         file_name = self.log_filenames["logs"]
         file_path = str(os.path.join(self.logs_folder, file_name))
         self.log_csv_creator(file_path, log_columns)
 
+        df_metrics_columns = ["run_id", "user"] + DF_METRICS_COLUMNS
+        file_name = self.log_filenames["df_metrics"]
+        file_path = str(os.path.join(self.logs_folder, file_name))
+        self.log_csv_creator(file_path, df_metrics_columns)
+
+        stages_columns = ["run_id", "user"] + STAGE_METRICS_COLUMNS
+        file_name = self.log_filenames["stages"]
+        file_path = str(os.path.join(self.logs_folder, file_name))
+        self.log_csv_creator(file_path, stages_columns)
+
         return None
 
     def _retrieve_config_log(self) -> pd.DataFrame:
@@ -225,21 +242,14 @@ class RunLog:
         Args:
             logfile_name (str): The name of the file to write to,
             logs_df (pd.DataFrame): The dataframe to append to the logs file.
-            update (bool, optional): Whether or not to write the dataframe as the logs,
-                or to append to current logs. Defaults to False.
+            update (bool, optional): Whether to replace the rows this run has
+                written to the logs, or to append to them. Defaults to False.
         """
         # Get the runlog settings from the config file
         write_csv, write_hdf5, write_sql = self._get_runlog_settings()
-        if write_csv:
-            # write the runlog to a csv file
-            file_path = str(os.path.join(self.logs_folder, logfile_name))
-            if update:
-                self.write_func(file_path, logs_df)
-            else:
-                df = self.read_csv_func(file_path)
-                # df = df.append(logs_df)
-                df = pd.concat([df, logs_df], ignore_index=True)
-                self.write_func(file_path, df)
+        if write_csv or write_sql:
+            # write this run's rows to the run's own file or database rows
+            self.store.write(self.run_id, logfile_name, logs_df, replace=update)
         if write_hdf5:
             # write the runlog to a hdf5 file
             logfile_name = f"{os.path.splitext(logfile_name)[0]}.hdf"
@@ -249,16 +259,6 @@ class RunLog:
                 df = pd.read_hdf(logfile_name)
                 df = df.append(self.logs_df)
                 df.to_hdf(logfile_name, mode="a", index=False, header=False)
-        if write_sql:
-            # write the runlog to a sql database
-            logfile_name = f"{os.path.splitext(logfile_name)[0]}.sql"
-            if update:
-                logs_df.to_sql(logfile_name, mode="a", index=False, header=False)
-            else:
-                df = pd.read_sql(logfile_name)
-                # df = df.append(logs_df)
-                df = pd.concat([df, logs_df], ignore_index=True)
-                df.to_sql(logfile_name, mode="a", index=False, header=False)
 
     def write_runlog(self) -> None:
         """Write the logs from the pipeline run to file."""
@@ -266,6 +266,22 @@ class RunLog:
         self._write_log(self.log_filenames["logs"], logs)
         return None
 
+    def write_df_metrics(self) -> None:
+        """Write the dataframe metrics recorded during the run to file."""
+        metrics_df = get_df_metrics()
+        metrics_df.insert(0, "run_id", self.run_id)
+        metrics_df.insert(1, "user", self.user)
+        self._write_log(self.log_filenames["df_metrics"], metrics_df)
+        return None
+
+    def write_stages_log(self) -> None:
+        """Write the timings and row counts of each pipeline stage to file."""
+        stages_df = get_stage_metrics()
+        stages_df.insert(0, "run_id", self.run_id)
+        stages_df.insert(1, "user", self.user)
+        self._write_log(self.log_filenames["stages"], stages_df)
+        return None
+
     def write_config_log(self) -> None:
         """Write the config log to file."""
         logs = self._retrieve_config_log()
@@ -279,17 +295,8 @@ class RunLog:
         return None
 
     def mark_mainlog_passed(self):
-        """Mark the most recent run as passed in the main log."""
+        """Mark this run as passed in the main log, rewriting only its own row."""
         self._record_time_taken()
-        mainlog_df = self._read_log(self.log_filenames["main"])
-        (
-            mainlog_df.loc[
-                mainlog_df[mainlog_df.run_id == self.run_id].index[0], "status"
-            ]
-        ) = "PASSED"
-        (
-            mainlog_df.loc[
-                mainlog_df[mainlog_df.run_id == self.run_id].index[0], "time_taken"
-            ]
-        ) = self.time_taken
-        self._write_log(self.log_filenames["main"], mainlog_df, update=True)
+        self.mainlog_df["status"] = "PASSED"
+        self.mainlog_df["time_taken"] = self.time_taken
+        self._write_log(self.log_filenames["main"], self.mainlog_df, update=True)
@@ -0,0 +1,327 @@
+"""Storage engines for the runlog, with run ids that are unique across runs.
+
+Runs never read or rewrite the consolidated runlog files. Each run claims its
+run id and writes its rows to files, or database rows, of its own. The
+compaction command then rolls the per-run files up into the consolidated view.
+
+Contains the following:
+    CsvRunLogStore: Per-run csv files, using any of the platform file systems.
+    SqliteRunLogStore: A local SQLite database, used when write_sql is set.
+    create_runlog_store: Creates the store for the runlog settings in the config.
+    run_compaction: Rolls the per-run files up into the consolidated runlogs.
+"""
+# Standard libraries
+import logging
+import os
+import re
+import sqlite3
+from typing import Callable, Dict, List
+
+# Third party libraries
+import pandas as pd
+
+# Local libraries
+from src.utils.config import config_setup, validate_runlog_config_settings
+from src.utils.storage import get_storage
+
+RunLogStoreLogger = logging.getLogger(__name__)
+
+# The folder, under the logs folder, that holds the per-run files
+RUNS_FOLDERNAME = "runs"
+
+# The number of run ids to try before giving up, if other runs claim them first
+MAX_CLAIM_ATTEMPTS = 100
+
+
+class CsvRunLogStore:
+    """
+    Stores the runlogs of each run in csv files of their own.
+
+    A run id is claimed by creating an empty marker file for it, using a
+    create that fails if the file exists, so two runs starting together cannot
+    share a run id. The markers are never deleted.
+
+    Attributes
+    ==========
+    logs_folder
+        the folder holding the consolidated runlogs
+    runs_folder
+        the folder holding the run id markers and per-run files
+    log_filenames
+        the file name of each runlog, keyed by log
+    """
+
+    def __init__(
+        self,
+        logs_folder: str,
+        log_filenames: Dict[str, str],
+        file_exists_func: Callable,
+        mkdir_func: Callable,
+        read_csv_func: Callable,
+        write_csv_func: Callable,
+        list_files_func: Callable,
+        create_exclusive_func: Callable,
+        delete_file_func: Callable,
+    ):
+        self.logs_folder = logs_folder
+        self.runs_folder = os.path.join(logs_folder, RUNS_FOLDERNAME)
+        self.log_filenames = log_filenames
+        self.file_exists_func = file_exists_func
+        self.mkdir_func = mkdir_func
+        self.read_csv_func = read_csv_func
+        self.write_csv_func = write_csv_func
+        self.list_files_func = list_files_func
+        self.create_exclusive_func = create_exclusive_func
+        self.delete_file_func = delete_file_func
+        # The rows written by this process, for appending within a run
+        self._rows: Dict[tuple, pd.DataFrame] = {}
+
+    def _run_path(self, run_id: int, logfile_name: str) -> str:
+        """The path of the file holding one run's rows of a runlog."""
+        return os.path.join(self.runs_folder, f"run_{run_id:06d}_{logfile_name}")
+
+    def _claimed_run_ids(self) -> List[int]:
+        """The run ids claimed so far, from the names of the marker files."""
+        claimed = []
+        for path in self.list_files_func(self.runs_folder):
+            match = re.match(r"^run_(\d+)\.claim$", os.path.basename(path))
+            if match:
+                claimed.append(int(match.group(1)))
+        return claimed
+
+    def _latest_run_id(self) -> int:
+        """The latest run id, from the markers or else the consolidated main log."""
+        claimed = self._claimed_run_ids()
+        if claimed:
+            return max(claimed)
+
+        # Before any run has claimed an id, continue from the consolidated log
+        mainfile = os.path.join(self.logs_folder, self.log_filenames["main"])
+        if self.file_exists_func(mainfile):
+            mainlog = self.read_csv_func(mainfile)
+            if len(mainlog):
+                return int(mainlog.run_id.max())
+        return 0
+
+    def claim_run_id(self) -> int:
+        """Claim the next unused run id.
+
+        Raises:
+            RuntimeError: Raised if other runs keep claiming the ids first.
+
+        Returns:
+            int: The claimed run id.
+        """
+        if not self.file_exists_func(self.runs_folder):
+            self.mkdir_func(self.runs_folder)
+
+        run_id = self._latest_run_id() + 1
+        for _ in range(MAX_CLAIM_ATTEMPTS):
+            marker = os.path.join(self.runs_folder, f"run_{run_id:06d}.claim")
+            try:
+                self.create_exclusive_func(marker, b"")
+                return run_id
+            except FileExistsError:
+                run_id += 1
+        raise RuntimeError("Could not claim a run id; too many concurrent runs.")
+
+    def write(
+        self,
+        run_id: int,
+        logfile_name: str,
+        logs_df: pd.DataFrame,
+        replace: bool = False,
+    ) -> None:
+        """Write a run's rows of a runlog to the run's own file.
+
+        Args:
+            run_id (int): The run the rows belong to.
+            logfile_name (str): The file name of the runlog.
+            logs_df (pd.DataFrame): The rows to write.
+            replace (bool, optional): Whether to replace the rows this run has
+                already written, rather than append to them.
+        """
+        key = (run_id, logfile_name)
+        if not replace and key in self._rows:
+            logs_df = pd.concat([self._rows[key], logs_df], ignore_index=True)
+        self._rows[key] = logs_df
+        self.write_csv_func(self._run_path(run_id, logfile_name), logs_df)
+
+    def compact(self) -> Dict[str, int]:
+        """Roll the per-run files up into the consolidated runlogs.
+
+        A run's rows replace any rows with the same run id already in the
+        consolidated runlog. Each per-run file is deleted once its rows have
+        been written to the consolidated runlog.
+
+        Returns:
+            Dict[str, int]: The number of runs compacted into each runlog.
+        """
+        run_files = [
+            os.path.basename(path) for path in self.list_files_func(self.runs_folder)
+        ]
+        compacted = {}
+        for logfile_name in self.log_filenames.values():
+            suffix = f"_{logfile_name}"
+            names = sorted(name for name in run_files if name.endswith(suffix))
+            if not names:
+                continue
+
+            paths = [os.path.join(self.runs_folder, name) for name in names]
+            runs_df = pd.concat(
+                [self.read_csv_func(path) for path in paths], ignore_index=True
+            )
+            consolidated_path = os.path.join(self.logs_folder, logfile_name)
+            if self.file_exists_func(consolidated_path):
+                consolidated = self.read_csv_func(consolidated_path)
+                consolidated = consolidated.loc[
+                    ~consolidated["run_id"].isin(runs_df["run_id"])
+                ]
+                runs_df = pd.concat([consolidated, runs_df], ignore_index=True)
+            self.write_csv_func(consolidated_path, runs_df)
+
+            for path in paths:
+                self.delete_file_func(path)
+            compacted[logfile_name] = len(names)
+            RunLogStoreLogger.info(f"Compacted {len(names)} runs into {logfile_name}")
+        return compacted
+
+
+class SqliteRunLogStore:
+    """
+    Stores the runlogs in a local SQLite database, one table per runlog.
+
+    Run ids come from an autoincrementing key, so they are allocated
+    atomically by the database.
+
+    Attributes
+    ==========
+    db_path
+        the path of the SQLite database file
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS run_ids "
+                "(run_id INTEGER PRIMARY KEY AUTOINCREMENT)"
+            )
+
+    @staticmethod
+    def _table(logfile_name: str) -> str:
+        """The name of the table for a runlog file name."""
+        return re.sub(r"\W", "_", os.path.splitext(logfile_name)[0])
+
+    def claim_run_id(self) -> int:
+        """Claim the next unused run id."""
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("INSERT INTO run_ids DEFAULT VALUES").lastrowid
+
+    def write(
+        self,
+        run_id: int,
+        logfile_name: str,
+        logs_df: pd.DataFrame,
+        replace: bool = False,
+    ) -> None:
+        """Write a run's rows to the table for a runlog.
+
+        Args:
+            run_id (int): The run the rows belong to.
+            logfile_name (str): The file name of the runlog.
+            logs_df (pd.DataFrame): The rows to write.
+            replace (bool, optional): Whether to replace the rows this run has
+                already written, rather than append to them.
+        """
+        table = self._table(logfile_name)
+        with sqlite3.connect(self.db_path) as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)
+            ).fetchone()
+            if replace and exists:
+                conn.execute(f'DELETE FROM "{table}" WHERE run_id = ?', (run_id,))
+            logs_df.astype(str).to_sql(table, conn, if_exists="append", index=False)
+
+    def compact(self) -> Dict[str, int]:
+        """The database is already consolidated, so it is only vacuumed."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("VACUUM")
+        return {}
+
+
+def create_runlog_store(
+    config: dict,
+    file_exists_func: Callable,
+    mkdir_func: Callable,
+    read_csv_func: Callable,
+    write_csv_func: Callable,
+    list_files_func: Callable,
+    create_exclusive_func: Callable,
+    delete_file_func: Callable,
+):
+    """Create the runlog store for the runlog settings in the config.
+
+    A SQLite store is used when write_sql is set, otherwise per-run csv files.
+    Setting both write_csv and write_sql is rejected.
+
+    Args:
+        config (dict): The pipeline configuration.
+        file_exists_func (Callable): Checks whether a file exists.
+        mkdir_func (Callable): Creates a directory.
+        read_csv_func (Callable): Reads a csv file.
+        write_csv_func (Callable): Writes a csv file.
+        list_files_func (Callable): Lists the files in a directory.
+        create_exclusive_func (Callable): Creates a file if it does not exist.
+        delete_file_func (Callable): Deletes a file.
+
+    Raises:
+        ValueError: Raised if both write_csv and write_sql are set.
+
+    Returns:
+        CsvRunLogStore or SqliteRunLogStore: The runlog store.
+    """
+    platform = config["global"]["platform"]
+    logs_folder = config[f"{platform}_paths"]["logs_foldername"]
+
+    validate_runlog_config_settings(config)
+    if config["runlog_writer"]["write_sql"]:
+        db_name = config["run_log_sql"]["log_db"]
+        return SqliteRunLogStore(os.path.join(logs_folder, f"{db_name}.sqlite"))
+
+    return CsvRunLogStore(
+        logs_folder,
+        config["log_filenames"],
+        file_exists_func,
+        mkdir_func,
+        read_csv_func,
+        write_csv_func,
+        list_files_func,
+        create_exclusive_func,
+        delete_file_func,
+    )
+
+
+def run_compaction(user_config_path: str, dev_config_path: str) -> Dict[str, int]:
+    """Roll the per-run runlog files up into the consolidated runlogs.
+
+    Args:
+        user_config_path (str): The path to the user config.
+        dev_config_path (str): The path to the developer config.
+
+    Returns:
+        Dict[str, int]: The number of runs compacted into each runlog.
+    """
+    config = config_setup(user_config_path, dev_config_path)
+    storage = get_storage(config)
+    store = create_runlog_store(
+        config,
+        storage.file_exists,
+        storage.mkdir,
+        storage.read_csv,
+        storage.write_csv,
+        storage.list_files,
+        storage.create_exclusive,
+        storage.delete_file,
+    )
+    return store.compact()
@@ -0,0 +1,554 @@
+"""
+Helpers for the s3 file system that work on any boto3 s3 client.
+
+Unlike s3_mods, this module does not create a client on import, so the
+functions take the client and bucket as arguments. This means they can be
+tested against a local s3 stand-in such as moto.
+
+Contains the following:
+    S3MultipartWriter: A stream written to s3 with a multipart upload.
+    write_csv_multipart: Writes a dataframe to csv in s3 with a multipart upload,
+        optionally compressed.
+    S3ObjectCache: Fetches and caches object metadata and headers, with at most
+        one request per object.
+    S3PrefixIndex: Lists and caches the keys under prefixes, with pagination.
+    open_s3_object: Opens an object as a stream for reading or writing.
+    put_object_exclusive: Creates an object only if the key is not already used.
+"""
+
+# Standard libraries
+import fnmatch
+import hashlib
+import io
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator, List
+
+# Third party libraries
+import pandas as pd
+from botocore.exceptions import ClientError
+
+# Local libraries
+from src.utils.csv_blocks import DEFAULT_CHUNK_ROWS, write_csv_blocks
+
+s3_helpers_logger = logging.getLogger(__name__)
+
+# s3 requires every part of a multipart upload but the last to be at least 5MiB
+MIN_PART_SIZE = 5 * 1024**2
+DEFAULT_PART_SIZE = 8 * 1024**2
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """
+    A binary stream that is written to an s3 object with a multipart upload.
+
+    Written bytes are buffered, and each time the buffer reaches part_size it
+    is uploaded as a part on a thread pool while writing continues. At most
+    max_workers parts are held in memory at once. If the whole stream fits in
+    one part, a single put_object is used when the stream is closed.
+
+    The md5 of the stream is computed as it is written. s3 does not use the md5
+    as the ETag of a multipart upload, so it is stored in an "md5" object tag.
+
+    If the stream is left through an exception, the upload is aborted, so no
+    partial object is written.
+
+    Attributes
+    ==========
+    key
+        the key of the object written
+    md5
+        the md5 checksum of the bytes written so far
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        key: str,
+        part_size: int = DEFAULT_PART_SIZE,
+        max_workers: int = 4,
+        on_close: Callable = None,
+    ):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes.")
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self._on_close = on_close
+        self._md5 = hashlib.md5()
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    @property
+    def md5(self) -> str:
+        return self._md5.hexdigest()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        self._md5.update(data)
+        self._buffer += data
+        if len(self._buffer) >= self.part_size:
+            try:
+                self._upload_buffer()
+            except Exception:
+                self.abort()
+                raise
+        return len(data)
+
+    def _upload_part(self, part_number: int, body: bytes) -> dict:
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            PartNumber=part_number,
+            UploadId=self._upload_id,
+            Body=body,
+        )
+        return {"ETag": response["ETag"], "PartNumber": part_number}
+
+    def _upload_buffer(self) -> None:
+        """Upload the buffer as the next part, starting the upload if needed."""
+        if self._upload_id is None:
+            self._upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key
+            )["UploadId"]
+        # Wait for a free slot so that only max_workers parts are in memory
+        if len(self._pending) >= self.max_workers:
+            done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        future = self._executor.submit(
+            self._upload_part, len(self._parts) + 1, bytes(self._buffer)
+        )
+        self._parts.append(future)
+        self._pending.add(future)
+        self._buffer = bytearray()
+
+    def _complete(self) -> None:
+        """Put the object, or upload the last part and complete the upload."""
+        if self._upload_id is None:
+            self.client.put_object(
+                Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer)
+            )
+            return
+        if self._buffer:
+            self._upload_buffer()
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": [part.result() for part in self._parts]},
+        )
+        self.client.put_object_tagging(
+            Bucket=self.bucket,
+            Key=self.key,
+            Tagging={"TagSet": [{"Key": "md5", "Value": self.md5}]},
+        )
+
+    def close(self) -> None:
+        """Write the object to s3, aborting the upload if that fails."""
+        if self.closed:
+            return
+        try:
+            self._complete()
+        except Exception:
+            self.abort()
+            raise
+        self._executor.shutdown(wait=True)
+        super().close()
+        if self._on_close is not None:
+            self._on_close(self.key)
+
+    def abort(self) -> None:
+        """Close the stream without writing the object."""
+        if self.closed:
+            return
+        self._executor.shutdown(wait=True)
+        if self._upload_id is not None:
+            s3_helpers_logger.error(f"Aborting multipart upload of {self.key}")
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
+        self._buffer = bytearray()
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def write_csv_multipart(
+    client,
+    bucket: str,
+    key: str,
+    data: pd.DataFrame,
+    compression: str = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    part_size: int = DEFAULT_PART_SIZE,
+    max_workers: int = 4,
+    workers: int = 1,
+) -> str:
+    """Write a dataframe to csv in an s3 bucket using a multipart upload.
+
+    The csv is serialised and compressed in blocks of rows into an
+    S3MultipartWriter, which uploads each part on a thread pool while
+    serialisation continues. If the whole csv fits in one part, a single
+    put_object is used.
+
+    Args:
+        client: The boto3 s3 client.
+        bucket (str): The bucket to write to.
+        key (str): The key to write the csv to.
+        data (pd.DataFrame): The dataframe to write.
+        compression (str, optional): "gzip", "zstd" or None.
+        chunk_rows (int, optional): The number of rows to serialise at a time.
+        part_size (int, optional): The size in bytes of each uploaded part.
+        max_workers (int, optional): The number of parts to upload at once.
+        workers (int, optional): The number of threads serialising blocks.
+
+    Raises:
+        ValueError: Raised if part_size is smaller than s3 allows.
+
+    Returns:
+        str: The md5 checksum of the bytes written.
+    """
+    with S3MultipartWriter(client, bucket, key, part_size, max_workers) as writer:
+        write_csv_blocks(writer, data, compression, chunk_rows, workers)
+    return writer.md5
+
+
+class S3ObjectCache:
+    """
+    A per-run cache of s3 object metadata.
+
+    Each object costs at most one request: a head_object for its metadata, or
+    a ranged get_object for its header, which also returns the metadata. Any
+    function that changes an object must call invalidate.
+
+    Attributes
+    ==========
+    client
+        the boto3 s3 client
+    bucket
+        the bucket holding the objects
+    header_bytes
+        the number of bytes to request when reading a header
+    """
+
+    def __init__(self, client, bucket: str, header_bytes: int = 64 * 1024):
+        self.client = client
+        self.bucket = bucket
+        self.header_bytes = header_bytes
+        self._stats: dict = {}
+
+    @staticmethod
+    def _missing_stat() -> dict:
+        """The metadata for an object that does not exist."""
+        return {"exists": False, "is_dir": False, "size": 0, "etag": None}
+
+    def _head(self, key: str) -> dict:
+        """Get the metadata of an object with a single head_object."""
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return self._missing_stat()
+            raise
+        return {
+            "exists": True,
+            "is_dir": key.endswith("/"),
+            "size": response["ContentLength"],
+            "etag": response["ETag"].strip('"'),
+        }
+
+    def _get_header(self, key: str) -> dict:
+        """Get the metadata and first line of an object with a ranged get.
+
+        The total size comes from the Content-Range of the response. If the
+        first line is longer than the range, the range is doubled and the get
+        repeated.
+        """
+        n_bytes = self.header_bytes
+        while True:
+            try:
+                response = self.client.get_object(
+                    Bucket=self.bucket, Key=key, Range=f"bytes=0-{n_bytes - 1}"
+                )
+            except ClientError as e:
+                code = e.response["Error"]["Code"]
+                if code in ("404", "NoSuchKey", "NotFound"):
+                    return self._missing_stat()
+                if code == "InvalidRange":
+                    # s3 refuses ranges on empty objects
+                    return {**self._head(key), "header": ""}
+                raise
+            content = response["Body"].read()
+            content_range = response.get("ContentRange")
+            size = int(content_range.split("/")[-1]) if content_range else len(content)
+            if b"\n" in content or len(content) >= size:
+                break
+            n_bytes *= 2
+
+        return {
+            "exists": True,
+            "is_dir": key.endswith("/"),
+            "size": size,
+            "etag": response["ETag"].strip('"'),
+            "header": content.split(b"\n", 1)[0].decode("utf-8"),
+        }
+
+    def stat(self, key: str, with_header: bool = False) -> dict:
+        """Get the metadata of an object, from the cache where possible.
+
+        Args:
+            key (str): The key of the object.
+            with_header (bool, optional): Whether to also read the first line.
+
+        Returns:
+            dict: The exists, is_dir, size and etag of the object, and its
+                header if requested.
+        """
+        cached = self._stats.get(key)
+        needs_header = with_header and cached and cached["exists"]
+        if cached is None or (needs_header and "header" not in cached):
+            cached = self._get_header(key) if with_header else self._head(key)
+            self._stats[key] = cached
+        return cached
+
+    def stat_many(
+        self, keys: List[str], with_header: bool = False, max_workers: int = 8
+    ) -> dict:
+        """Get the metadata of many objects, fetching those not cached in parallel.
+
+        Args:
+            keys (List[str]): The keys of the objects.
+            with_header (bool, optional): Whether to also read the first lines.
+            max_workers (int, optional): The number of requests to make at once.
+
+        Returns:
+            dict: The metadata of each object, keyed by key.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            stats = executor.map(lambda key: self.stat(key, with_header), keys)
+            return dict(zip(keys, stats))
+
+    def read_header(self, key: str) -> str:
+        """Read the first line of an object, without the newline."""
+        stat = self.stat(key, with_header=True)
+        if not stat["exists"]:
+            raise FileNotFoundError(f"File: {key} does not exist")
+        return stat["header"]
+
+    def md5(self, key: str) -> str:
+        """Get the md5 of an object.
+
+        The ETag is the md5 for objects written in one put. For multipart
+        uploads it is not, and the md5 tag added by write_csv_multipart is used.
+        """
+        etag = self.stat(key)["etag"]
+        if etag is not None and "-" in etag:
+            tags = self.client.get_object_tagging(Bucket=self.bucket, Key=key)
+            etag = {t["Key"]: t["Value"] for t in tags["TagSet"]}.get("md5")
+        return etag
+
+    def invalidate(self, key: str = None) -> None:
+        """Forget the cached metadata for a key, or for all keys if none given."""
+        if key is None:
+            self._stats.clear()
+        else:
+            self._stats.pop(key, None)
+
+
+class S3PrefixIndex:
+    """
+    A per-run index of the keys under s3 prefixes.
+
+    Each prefix is listed once, following continuation tokens so that no keys
+    are missed past the first 1000. Later lookups under a listed prefix are
+    served from memory. Any function that adds or removes an object must call
+    invalidate.
+
+    Attributes
+    ==========
+    client
+        the boto3 s3 client
+    bucket
+        the bucket holding the objects
+    """
+
+    def __init__(self, client, bucket: str):
+        self.client = client
+        self.bucket = bucket
+        # Sorted (key, size, last_modified) tuples for each listed prefix
+        self._listings: dict = {}
+
+    @staticmethod
+    def as_dir(path: str) -> str:
+        """Turn a path into a directory prefix, ending with one slash."""
+        path = path.lstrip("/")
+        return path if not path or path.endswith("/") else path + "/"
+
+    def _list_pages(self, prefix: str) -> Iterator[dict]:
+        """Yield every page of list_objects_v2 for a prefix."""
+        kwargs = {"Bucket": self.bucket, "Prefix": prefix}
+        while True:
+            page = self.client.list_objects_v2(**kwargs)
+            yield page
+            if not page.get("IsTruncated"):
+                return
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+    def _listing(self, prefix: str) -> List[tuple]:
+        """Get every object under a prefix, listing it if not already covered."""
+        for listed, objects in self._listings.items():
+            if prefix.startswith(listed):
+                return [obj for obj in objects if obj[0].startswith(prefix)]
+
+        objects = sorted(
+            (obj["Key"], obj["Size"], obj["LastModified"])
+            for page in self._list_pages(prefix)
+            for obj in page.get("Contents", [])
+        )
+        self._listings[prefix] = objects
+        return objects
+
+    def keys(self, prefix: str) -> List[str]:
+        """Get every key under a directory prefix, in order, at any depth."""
+        return [obj[0] for obj in self._listing(self.as_dir(prefix))]
+
+    def isdir(self, prefix: str) -> bool:
+        """Check whether any object exists under a directory prefix."""
+        return bool(self._listing(self.as_dir(prefix)))
+
+    def list_dir(self, prefix: str) -> List[tuple]:
+        """Get the objects directly in a directory, not in its subdirectories.
+
+        Args:
+            prefix (str): The directory prefix.
+
+        Returns:
+            List[tuple]: The (key, size, last_modified) of each object.
+        """
+        prefix = self.as_dir(prefix)
+        # The remainder of a file directly in the directory has no slash, and
+        # the empty remainder is the folder marker object itself
+        return [
+            obj
+            for obj in self._listing(prefix)
+            if obj[0] != prefix and "/" not in obj[0][len(prefix) :]
+        ]
+
+    def search(self, prefix: str, pattern: str) -> List[str]:
+        """Find the keys under a directory prefix whose file name matches.
+
+        A pattern containing glob characters is matched against the whole file
+        name, otherwise it is matched against the end of the file name.
+
+        Args:
+            prefix (str): The directory prefix to search under, at any depth.
+            pattern (str): The file name ending or glob pattern.
+
+        Returns:
+            List[str]: The matching keys, in order.
+        """
+        is_glob = any(char in pattern for char in "*?[")
+        found = []
+        for key in self.keys(prefix):
+            name = key.rsplit("/", 1)[-1]
+            if is_glob:
+                matched = fnmatch.fnmatchcase(name, pattern)
+            else:
+                matched = name.endswith(pattern)
+            if matched:
+                found.append(key)
+        return found
+
+    def invalidate(self, key: str = None) -> None:
+        """Forget the listings that hold a key, or all listings if none given."""
+        if key is None:
+            self._listings.clear()
+            return
+        key = key.lstrip("/")
+        for listed in [p for p in self._listings if key.startswith(p)]:
+            del self._listings[listed]
+
+
+class _S3TextWriter(io.TextIOWrapper):
+    """A text stream over an S3MultipartWriter, aborted on an exception."""
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self.buffer.abort()
+        super().__exit__(exc_type, exc_value, traceback)
+
+
+def open_s3_object(
+    client, bucket: str, key: str, mode: str = "rb", on_close: Callable = None
+):
+    """Open an s3 object as a file-like stream.
+
+    Reads stream the body of a single get_object, so the object is never held
+    in memory as a whole. Writes are uploaded in parts as they are made, see
+    S3MultipartWriter, and are aborted if the stream is left by an exception.
+
+    Args:
+        client: The boto3 s3 client.
+        bucket (str): The bucket holding the object.
+        key (str): The key of the object.
+        mode (str, optional): One of "r", "rb", "w" or "wb".
+        on_close (Callable, optional): Called with the key once a write is put.
+
+    Raises:
+        ValueError: Raised if the mode is not supported.
+
+    Returns:
+        A binary stream, or a utf-8 text stream if the mode has no "b".
+    """
+    if mode.rstrip("bt") == "r":
+        stream = client.get_object(Bucket=bucket, Key=key)["Body"]
+    elif mode.rstrip("bt") == "w":
+        stream = S3MultipartWriter(client, bucket, key, on_close=on_close)
+    else:
+        raise ValueError(f"Unsupported mode for an s3 object: {mode}")
+
+    if "b" in mode:
+        return stream
+    if isinstance(stream, S3MultipartWriter):
+        return _S3TextWriter(stream, encoding="utf-8")
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+
+def put_object_exclusive(client, bucket: str, key: str, body: bytes = b"") -> None:
+    """Create an object, failing if an object already exists at the key.
+
+    Uses a conditional put, so two writers racing for the same key cannot both
+    succeed.
+
+    Args:
+        client: The boto3 s3 client.
+        bucket (str): The bucket to write to.
+        key (str): The key of the object.
+        body (bytes, optional): The content of the object.
+
+    Raises:
+        FileExistsError: Raised if an object already exists at the key.
+    """
+    try:
+        client.put_object(Bucket=bucket, Key=key, Body=body, IfNoneMatch="*")
+    except ClientError as e:
+        code = e.response["Error"]["Code"]
+        if code in ("PreconditionFailed", "ConditionalRequestConflict", "412"):
+            raise FileExistsError(f"File: {key} already exists") from e
+        raise
@@ -7,10 +7,12 @@ These functions will need to be tested separately, using mocking.
 Contains the following functions:
     create_client: Creates a boto3 client and sets raz_client argunents.
     rd_read_csv: Reads a CSV file from s3 to Pandas dataframe.
-    rd_write_csv: Writes a Pandas Dataframe to csv in s3 bucket.
+    rd_write_csv: Writes a Pandas Dataframe to csv in s3 bucket, using a
+        multipart upload for large dataframes.
     rd_load_json: Loads a JSON file from s3 bucket to a Python dictionary.
     rd_file_exists: Checks if file exists in s3 using rdsa_utils.
     rd_mkdir(path: str): Creates a directory in s3 using rdsa_utils.
+    rd_search_file: Finds a file by ending or glob, using a cached listing.
 
 To do:
     Read  feather - possibly, not needed
@@ -19,12 +21,13 @@ To do:
 
 # Standard libraries
 import json
+import os
 import logging
 
 
 # Third party libraries
 import pandas as pd
-from io import StringIO, TextIOWrapper, BytesIO
+from io import StringIO
 
 
 # Local libraries
@@ -32,19 +35,36 @@ from rdsa_utils.cdp.helpers.s3_utils import (
     file_exists,
     create_folder_on_s3,
     delete_file,
-    is_s3_directory,
     copy_file,
     move_file,
     validate_bucket_name,
     validate_s3_file_path,
 )
 from src.utils.singleton_boto import SingletonBoto
+from src.utils.csv_blocks import DEFAULT_WRITE_WORKERS, compression_for, open_text
+from src.utils.s3_helpers import (
+    S3ObjectCache,
+    S3PrefixIndex,
+    open_s3_object,
+    put_object_exclusive,
+    write_csv_multipart,
+)
 # from src.utils.singleton_config import SingletonConfig
 
 # set up logging, boto3 client and s3 bucket
 s3_logger = logging.getLogger(__name__)
 s3_client = SingletonBoto.get_client()
 s3_bucket = SingletonBoto.get_bucket()
+# Object metadata, headers and prefix listings are cached for the run; any
+# change to an object must call _invalidate
+s3_objects = S3ObjectCache(s3_client, s3_bucket)
+s3_index = S3PrefixIndex(s3_client, s3_bucket)
+
+
+def _invalidate(filepath: str) -> None:
+    """Forget the cached metadata and listings that hold a file."""
+    s3_objects.invalidate(filepath)
+    s3_index.invalidate(filepath)
 
 
 # Read a CSV file into a Pandas dataframe
@@ -66,6 +86,9 @@ def rd_read_csv(filepath: str, **kwargs) -> pd.DataFrame:
         # If "thousands" argument is not specified, set it to ","
         if "thousands" not in kwargs:
             kwargs["thousands"] = ","
+        # A stream has no name, so the compression is taken from the filepath
+        if "compression" not in kwargs:
+            kwargs["compression"] = compression_for(filepath)
 
         # Read the csv file using the path and keyword arguments
         try:
@@ -80,6 +103,10 @@ def rd_read_csv(filepath: str, **kwargs) -> pd.DataFrame:
 def rd_write_csv(filepath: str, data: pd.DataFrame) -> None:
     """Write a Pandas Dataframe to csv in an s3 bucket.
 
+    The dataframe is serialised in blocks of rows, so the whole csv is never
+    held in memory, and compressed if the filepath ends in .gz or .zst. Large
+    csvs are uploaded in parts, in parallel.
+
     Args:
         filepath (str): The filepath to save the dataframe to.
         data (pd.DataFrame): THe dataframe to write to the passed path.
@@ -87,22 +114,32 @@ def rd_write_csv(filepath: str, data: pd.DataFrame) -> None:
     Returns:
         None
     """
-    # Create an Input-Output buffer
-    csv_buffer = StringIO()
-
-    # Write the dataframe to the buffer in the CSV format
-    data.to_csv(
-        csv_buffer, header=True, date_format="%Y-%m-%d %H:%M:%S.%f+00", index=False
+    write_csv_multipart(
+        s3_client,
+        s3_bucket,
+        filepath,
+        data,
+        compression_for(filepath),
+        workers=DEFAULT_WRITE_WORKERS,
     )
+    _invalidate(filepath)
+    return None
 
-    # "Rewind" the stream to the start of the buffer
-    csv_buffer.seek(0)
 
-    # Write the buffer into the s3 bucket
-    _ = s3_client.put_object(
-        Bucket=s3_bucket, Body=csv_buffer.getvalue(), Key=filepath
-    )
-    return None
+def rd_open(filepath: str, mode: str = "rb"):
+    """Open a file in s3 bucket as a stream for reading or writing.
+
+    Reads stream the object body; writes are uploaded in parts as they are
+    made, and aborted if the stream is left by an exception.
+
+    Args:
+        filepath (str): The filepath in s3 bucket.
+        mode (str, optional): One of "r", "rb", "w" or "wb".
+
+    Returns:
+        A file-like object, to be used as a context manager.
+    """
+    return open_s3_object(s3_client, s3_bucket, filepath, mode, on_close=_invalidate)
 
 
 def rd_load_json(filepath: str) -> dict:
@@ -162,6 +199,7 @@ def rd_mkdir(path: str) -> None:
         bucket_name=s3_bucket,
         folder_path=path,
     )
+    _invalidate(S3PrefixIndex.as_dir(path))
 
     return None
 
@@ -187,10 +225,11 @@ def rd_file_size(filepath: str) -> int:
         of the file in bytes
     """
 
-    _response = s3_client.head_object(Bucket=s3_bucket, Key=filepath)
-    file_size = _response['ContentLength']
+    stat = s3_objects.stat(filepath)
+    if not stat["exists"]:
+        raise FileNotFoundError(f"File: {filepath} does not exist")
 
-    return file_size
+    return stat["size"]
 
 
 def rd_delete_file(filepath: str) -> bool:
@@ -202,6 +241,7 @@ def rd_delete_file(filepath: str) -> bool:
         status (bool): True for successfully completed deletion. Else False.
     """
     status = delete_file(s3_client, s3_bucket, filepath)
+    _invalidate(filepath)
     return status
 
 
@@ -215,10 +255,8 @@ def rd_md5sum(filepath: str) -> str:
     """
 
     try:
-        md5result = s3_client.head_object(
-            Bucket=s3_bucket,
-            Key=filepath
-        )['ETag'][1:-1]
+        # Uses the cached ETag, or the md5 tag for multipart uploads
+        md5result = s3_objects.md5(filepath)
     except s3_client.exceptions.ClientError as e:
         s3_logger.error(f"Failed to compute the md5 checksum: {str(e)}")
         md5result = None
@@ -227,7 +265,8 @@ def rd_md5sum(filepath: str) -> str:
 
 def rd_isdir(dirpath: str) -> bool:
     """
-    Test if directory exists in s3 bucket.
+    Test if directory exists in s3 bucket, meaning at least one object has the
+    directory as its prefix. The prefix is listed once per run and cached.
 
     Args:
         dirpath (string): The "directory" path in s3 bucket.
@@ -235,27 +274,13 @@ def rd_isdir(dirpath: str) -> bool:
         status (bool): True if the dirpath is a directory, false otherwise.
 
     """
-    # The directory name must end with forward slash
-    if not dirpath.endswith('/'):
-        dirpath = dirpath + '/'
-
-    # Any slashes at the beginning should be removed
-    while dirpath.startswith('/'):
-        dirpath = dirpath[1:]
-
-    # Use the function from rdsa_utils
-    response = is_s3_directory(
-        client=s3_client,
-        bucket_name=s3_bucket,
-        object_name=dirpath
-    )
-    return response
+    return s3_index.isdir(dirpath)
 
 
 def rd_isfile(filepath: str) -> bool:
     """
     Test if given path is a file in s3 bucket. Check that it exists, not a
-    directory and the size is greater than 0.
+    directory and the size is greater than 0, using one cached head_object.
 
     Args:
         filepath (string): The "directory" path in s3 bucket.
@@ -264,15 +289,10 @@ def rd_isfile(filepath: str) -> bool:
 
     """
     if filepath is None:
-        response = False
+        return False
 
-    if rd_file_exists(filepath):
-        isdir = rd_isdir(filepath)
-        size = rd_file_size(filepath)
-        response = (not isdir) and (size > 0)
-    else:
-        response = False
-    return response
+    stat = s3_objects.stat(filepath)
+    return stat["exists"] and not stat["is_dir"] and stat["size"] > 0
 
 
 def rd_stat_size(path: str) -> int:
@@ -286,26 +306,43 @@ def rd_stat_size(path: str) -> int:
 
 def rd_read_header(path: str) -> str:
     """
-    Reads the first line of a file on s3. Gets the entire file using boto3 get_objects,
-    converts its body into an input stream, reads the first line and remove the carriage
-    return character (backslash-n) from the end.
+    Reads the first line of a file on s3, without the new line character.
+    Only the first bytes of the file are requested, using a ranged get, and the
+    size and ETag from the same request are cached. .gz and .zst files are
+    streamed and decompressed up to the end of the first line.
 
     Args:
-        filepath (string): The "directory" path in s3 bucket.
+        path (string): The file path in s3 bucket.
 
     Returns:
-        status (bool): True if the dirpath is a directory, false otherwise.
+        str: The first line of the file.
     """
-    # Create an input/output stream pointer, same as open
-    stream = TextIOWrapper(s3_client.get_object(Bucket=s3_bucket, Key=path)['Body'])
+    if compression_for(path):
+        with open_s3_object(s3_client, s3_bucket, path, "rb") as file:
+            return open_text(file, path).readline().rstrip("\n")
+    return s3_objects.read_header(path)
 
-    # Read the first line from the stream
-    response = stream.readline()
 
-    # Remove the last character (carriage return, or new line)
-    response = response[:-1]
+def rd_stat_many(paths: list) -> dict:
+    """
+    Gets the metadata of many files on s3, with one head request per file made
+    in parallel. The results are cached, so later calls to rd_isfile,
+    rd_stat_size and rd_md5sum for these files make no requests.
 
-    return response
+    Args:
+        paths (list): The file paths in s3 bucket.
+
+    Returns:
+        dict: For each path, whether it is a file and its size in bytes.
+    """
+    stats = s3_objects.stat_many(paths, with_header=False)
+    return {
+        path: {
+            "isfile": stat["exists"] and not stat["is_dir"] and stat["size"] > 0,
+            "size": stat["size"],
+        }
+        for path, stat in stats.items()
+    }
 
 
 def rd_write_string_to_file(content: bytes, filepath: str):
@@ -323,6 +360,7 @@ def rd_write_string_to_file(content: bytes, filepath: str):
     _ = s3_client.put_object(
         Bucket=s3_bucket, Body=str_buffer.getvalue(), Key=filepath
     )
+    _invalidate(filepath)
     return None
 
 
@@ -351,6 +389,22 @@ def _remove_end_slashes(path: "str") -> str:
     return path
 
 
+def rd_create_exclusive(filepath: str, content: bytes = b"") -> None:
+    """
+    Creates a file in s3 bucket, failing if it already exists. Used to claim
+    names, such as run ids, that must be unique across concurrent runs.
+
+    Args:
+        filepath (str): The filepath in s3 bucket.
+        content (bytes, optional): The content of the file.
+
+    Raises:
+        FileExistsError: Raised if the file already exists.
+    """
+    put_object_exclusive(s3_client, s3_bucket, filepath, content)
+    _invalidate(filepath)
+
+
 def rd_copy_file(src_path: str, dst_path: str) -> bool:
     """
     Copy a file from one location to another. Uses rdsa_utils.
@@ -393,6 +447,7 @@ def rd_copy_file(src_path: str, dst_path: str) -> bool:
         destination_bucket_name=s3_bucket,
         destination_object_name=dst_path,
     )
+    _invalidate(dst_path)
     return success
 
 
@@ -410,76 +465,52 @@ def rd_move_file(src_path: str, dst_path: str) -> bool:
         destination_bucket_name=s3_bucket,
         destination_object_name=dst_path
     )
+    _invalidate(src_path)
+    _invalidate(dst_path)
     return success
 
 
-def s3walk(locations: list, prefix: str) -> tuple:
+def rd_list_files(path: str, ext: str = None, order: str = None) -> list:
     """
-    Mimics the functionality of os.walk in s3 bucket using long filenames with slashes.
-    Recursively goes through the long filenames and splits it into "locations" -
-    subdirectories, and "files" - short file names.
+    Lists the files directly in an s3 "directory", not in its subdirectories.
 
     Args:
-        locations (list): a list of s3 locations that can be "directories"
-        prefix (str): Name of "subdirectory" of root where further locations
-        will be found.
-
+        path (str): s3 "directory" to list.
+        ext (str, optional): Only list files with this extension.
+        order (str, optional): "newest" or "oldest" to sort by last modified
+            time, otherwise the files are in key order.
     Returns:
-        A tuple of (root, (subdir, files)).
-    """
-    # recursively add location to roots starting from prefix
-    def processLocation(root, prefixLocal, location):
-        # add new root location if not available
-        if prefixLocal not in root:
-            root[prefixLocal] = (set(), set())
-        # check how many folders are available after prefix
-        remainder = location[len(prefixLocal):]
-        structure = remainder.split('/')
-
-        # If we are not yet in the folder of the file we need to continue with
-        # a larger prefix
-        if len(structure) > 1:
-            # add folder dir
-            root[prefixLocal][0].add(structure[0])
-            # make sure file is added allong the way
-            processLocation(root, prefixLocal + '/' + structure[0], location)
-        else:
-            # add to file
-            root[prefixLocal][1].add(structure[0])
-
-    root = {}
-    for location in locations:
-        processLocation(root, prefix, location)
-
-    return root.items()
+        list: The full paths of the files.
+    """
+    files = s3_index.list_dir(path)
+
+    if ext:
+        if not ext.startswith("."):
+            ext = "." + ext
+        files = [file for file in files if os.path.splitext(file[0])[1] == ext]
+
+    if order:
+        ord_dict = {"newest": True, "oldest": False}
+        files = sorted(files, key=lambda file: file[2], reverse=ord_dict[order])
+
+    return [file[0] for file in files]
 
 
 def rd_search_file(dir_path: str, ending: str) -> str:
-    """Find a file in a directory with a specific ending.
+    """Find a file in a directory, or its subdirectories, with a specific ending.
+
+    The ending can also be a glob pattern such as "*_manifest.json". If several
+    files match, the last in key order is returned.
 
     Args:
         dir_path (str): s3 "directory" where to search for files
-        ending (str): File name ending to search for.
+        ending (str): File name ending or glob pattern to search for.
     Returns:
-        Full file name that ends with the given string.
+        File name, without the directory, that ends with the given string, or
+        None if there is no such file.
 
     """
-    target_file = None
-
-    # Remove preceding forward slashes if needed
-    while dir_path.startswith("/"):
-        dir_path = dir_path[1:]
-
-    # get list of objects with prefix
-    response = s3_client.list_objects_v2(Bucket=s3_bucket, Prefix=dir_path)
-
-    # retrieve key values
-    locations = [object['Key'] for object in response['Contents']]
-
-    for _, (__, files) in s3walk(locations, dir_path):
-        for file in files:
-
-            # Check for ending
-            if file.endswith(ending):
-                target_file = str(file)
-    return target_file
+    found = s3_index.search(dir_path, ending)
+    if not found:
+        return None
+    return found[-1].rsplit("/", 1)[-1]
@@ -0,0 +1,454 @@
+"""
+A single storage interface over the s3, network and hdfs file systems.
+
+Each platform module (s3_mods, local_file_mods, hdfs_mods) provides the same
+rd_ functions. A Storage object wraps one of them, so the pipeline holds one
+object rather than choosing a module and passing its functions separately.
+Every operation goes through Storage.call, so middleware such as caching or
+metrics can wrap any backend in one place.
+
+Contains the following:
+    Storage: The interface, with the operations every backend supports.
+    ModsStorage: A Storage backed by one of the platform modules.
+    StorageMiddleware: A Storage that wraps another and passes calls on.
+    MetricsMiddleware: Records the number and duration of calls.
+    CachingMiddleware: Caches metadata lookups until something is written.
+    BackgroundWriteMiddleware: Writes csv files on a background thread.
+    get_storage: Creates the Storage for the platform in the config.
+"""
+
+# Standard libraries
+import io
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from importlib import import_module
+from typing import Iterable, List
+
+# Third party libraries
+import pandas as pd
+import pyarrow.parquet as pq
+
+storage_logger = logging.getLogger(__name__)
+
+# The platform module providing the rd_ functions for each platform
+PLATFORM_MODULES = {
+    "s3": "src.utils.s3_mods",
+    "network": "src.utils.local_file_mods",
+    "hdfs": "src.utils.hdfs_mods",
+}
+
+# Operations that only read metadata, and those that change the file system
+METADATA_OPERATIONS = {
+    "file_exists",
+    "file_size",
+    "isfile",
+    "isdir",
+    "stat_size",
+    "stat_many",
+    "md5sum",
+    "read_header",
+}
+WRITE_OPERATIONS = {
+    "write_csv",
+    "write_feather",
+    "write_string_to_file",
+    "create_exclusive",
+    "delete_file",
+    "copy_file",
+    "move_file",
+    "mkdir",
+}
+
+
+class Storage:
+    """
+    The operations that every storage backend supports.
+
+    Subclasses implement call, which runs a named operation. The methods here
+    are thin wrappers over call, plus Parquet reads and writes built on open,
+    so they work the same way for every backend and middleware.
+
+    Attributes
+    ==========
+    platform
+        the platform the storage reads from and writes to
+    """
+
+    platform: str = None
+
+    def call(self, operation: str, *args, **kwargs):
+        """Run a named storage operation."""
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Wait for any pending writes, raising the first error if one failed."""
+        return None
+
+    def read_csv(self, filepath: str, **kwargs) -> pd.DataFrame:
+        return self.call("read_csv", filepath, **kwargs)
+
+    def write_csv(self, filepath: str, data: pd.DataFrame):
+        return self.call("write_csv", filepath, data)
+
+    def load_json(self, filepath: str) -> dict:
+        return self.call("load_json", filepath)
+
+    def read_feather(self, filepath: str) -> pd.DataFrame:
+        return self.call("read_feather", filepath)
+
+    def write_feather(self, filepath: str, df: pd.DataFrame):
+        return self.call("write_feather", filepath, df)
+
+    def open(self, filepath: str, mode: str = "rb"):
+        """Open a file as a stream, to be used as a context manager."""
+        return self.call("open", filepath, mode)
+
+    def file_exists(self, filepath: str, raise_error: bool = False) -> bool:
+        return self.call("file_exists", filepath, raise_error=raise_error)
+
+    def file_size(self, filepath: str) -> int:
+        return self.call("file_size", filepath)
+
+    def isfile(self, path: str) -> bool:
+        return self.call("isfile", path)
+
+    def isdir(self, path: str) -> bool:
+        return self.call("isdir", path)
+
+    def stat_size(self, path: str) -> int:
+        return self.call("stat_size", path)
+
+    def stat_many(self, paths: List[str]) -> dict:
+        """Get whether each path is a file and its size, in one batch."""
+        return self.call("stat_many", list(paths))
+
+    def exists_many(self, paths: Iterable[str]) -> dict:
+        """Check whether each of many paths is a file, in one batch."""
+        return {path: stat["isfile"] for path, stat in self.stat_many(paths).items()}
+
+    def md5sum(self, path: str) -> str:
+        return self.call("md5sum", path)
+
+    def read_header(self, path: str) -> str:
+        return self.call("read_header", path)
+
+    def mkdir(self, path: str):
+        return self.call("mkdir", path)
+
+    def delete_file(self, path: str):
+        return self.call("delete_file", path)
+
+    def write_string_to_file(self, content: bytes, path: str):
+        return self.call("write_string_to_file", content, path)
+
+    def create_exclusive(self, path: str, content: bytes = b""):
+        """Create a file, raising FileExistsError if it already exists."""
+        return self.call("create_exclusive", path, content)
+
+    def copy_file(self, src_path: str, dst_path: str):
+        return self.call("copy_file", src_path, dst_path)
+
+    def move_file(self, src_path: str, dst_path: str):
+        return self.call("move_file", src_path, dst_path)
+
+    def list_files(self, path: str, ext: str = None, order: str = None) -> list:
+        return self.call("list_files", path, ext=ext, order=order)
+
+    def search_file(self, dir_path: str, ending: str) -> str:
+        return self.call("search_file", dir_path, ending)
+
+    def read_parquet(self, filepath: str, columns: List[str] = None) -> pd.DataFrame:
+        """Read a Parquet file into a dataframe, optionally only some columns.
+
+        Parquet needs random access, so the file is read into memory once
+        rather than through a forward-only stream.
+        """
+        with self.open(filepath, "rb") as file:
+            buffer = io.BytesIO(file.read())
+        return pd.read_parquet(buffer, columns=columns)
+
+    def read_parquet_columns(self, filepath: str) -> List[str]:
+        """Read the column names of a Parquet file from its footer metadata.
+
+        Only the footer is read when the file can be seeked, so this is cheap
+        even for large files.
+        """
+        with self.open(filepath, "rb") as file:
+            if not file.seekable():
+                file = io.BytesIO(file.read())
+            return pq.read_schema(file).names
+
+    def write_parquet(self, filepath: str, df: pd.DataFrame) -> None:
+        """Write a dataframe to a Parquet file."""
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        with self.open(filepath, "wb") as file:
+            file.write(buffer.getvalue())
+
+
+class ModsStorage(Storage):
+    """
+    A Storage backed by one of the platform modules.
+
+    Attributes
+    ==========
+    platform
+        the platform the storage reads from and writes to
+    mods
+        the module providing the rd_ functions for the platform
+    """
+
+    def __init__(self, platform: str, mods):
+        self.platform = platform
+        self.mods = mods
+
+    def call(self, operation: str, *args, **kwargs):
+        return getattr(self.mods, f"rd_{operation}")(*args, **kwargs)
+
+
+class StorageMiddleware(Storage):
+    """
+    A Storage that wraps another and passes every call on to it.
+
+    Subclasses override call to add behaviour before or after the inner call.
+
+    Attributes
+    ==========
+    inner
+        the storage being wrapped
+    """
+
+    def __init__(self, inner: Storage):
+        self.inner = inner
+        self.platform = inner.platform
+
+    def call(self, operation: str, *args, **kwargs):
+        return self.inner.call(operation, *args, **kwargs)
+
+    def flush(self) -> None:
+        self.inner.flush()
+
+
+class MetricsMiddleware(StorageMiddleware):
+    """
+    Records the number of calls and the total seconds taken by each operation.
+
+    Calls may be made from several threads, such as the outputs, so the
+    metrics are updated under a lock.
+
+    Attributes
+    ==========
+    metrics
+        the calls and seconds of each operation, keyed by operation
+    """
+
+    def __init__(self, inner: Storage):
+        super().__init__(inner)
+        self.metrics: dict = {}
+        self._lock = threading.Lock()
+
+    def call(self, operation: str, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().call(operation, *args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                record = self.metrics.setdefault(
+                    operation, {"calls": 0, "seconds": 0.0}
+                )
+                record["calls"] += 1
+                record["seconds"] += seconds
+
+    def log_metrics(self) -> None:
+        """Log the calls and seconds of each operation, slowest first."""
+        with self._lock:
+            records = sorted(
+                self.metrics.items(), key=lambda item: item[1]["seconds"], reverse=True
+            )
+        for operation, record in records:
+            storage_logger.info(
+                f"Storage {operation}: {record['calls']} calls taking "
+                f"{record['seconds']:.2f} seconds"
+            )
+
+
+class CachingMiddleware(StorageMiddleware):
+    """
+    Caches the results of metadata lookups, such as isfile and md5sum.
+
+    The whole cache is cleared by any operation that changes the file system,
+    including opening a file for writing. Calls may be made from several
+    threads, so a result is only cached if nothing was written while it was
+    looked up. Files changed other than through the storage are not seen, so
+    it should only wrap the storage the whole run reads and writes through.
+
+    Attributes
+    ==========
+    cache
+        the cached results, keyed by operation and arguments
+    """
+
+    def __init__(self, inner: Storage):
+        super().__init__(inner)
+        self.cache: dict = {}
+        # Counts the times the cache was cleared, to spot writes during a lookup
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def call(self, operation: str, *args, **kwargs):
+        if operation in WRITE_OPERATIONS or (
+            operation == "open" and "r" not in _mode(args, kwargs)
+        ):
+            with self._lock:
+                self.cache.clear()
+                self._generation += 1
+        if operation not in METADATA_OPERATIONS:
+            return super().call(operation, *args, **kwargs)
+
+        key = (operation, repr(args), repr(sorted(kwargs.items())))
+        with self._lock:
+            if key in self.cache:
+                return self.cache[key]
+            generation = self._generation
+        result = super().call(operation, *args, **kwargs)
+        with self._lock:
+            if self._generation == generation:
+                self.cache[key] = result
+        return result
+
+
+class BackgroundWriteMiddleware(StorageMiddleware):
+    """
+    Writes csv files on a background thread while the pipeline continues.
+
+    Each write_csv takes a copy of the dataframe, so the caller may change or
+    drop its frame straight away, and queues it for serialising and writing.
+    Memory is bounded: a write waits while the pending copies would exceed
+    max_pending_bytes. Any other operation waits first for the pending writes
+    to each path it is given, or into each folder it is given, such as the
+    destination of a copy. Errors are raised by the next write_csv or by
+    flush, which must be called before the run is marked as passed.
+
+    Attributes
+    ==========
+    max_workers
+        the number of files written at once
+    max_pending_bytes
+        the memory that pending copies may use, unless only one is pending
+    """
+
+    def __init__(
+        self, inner: Storage, max_workers: int = 2, max_pending_bytes: int = 2**30
+    ):
+        super().__init__(inner)
+        self.max_workers = max_workers
+        self.max_pending_bytes = max_pending_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending: dict = {}
+        self._pending_bytes = 0
+        self._errors: list = []
+        self._condition = threading.Condition()
+
+    def call(self, operation: str, *args, **kwargs):
+        if operation == "write_csv":
+            return self._submit_write(*args, **kwargs)
+        paths = [arg for arg in [*args, *kwargs.values()] if isinstance(arg, str)]
+        if paths:
+            self._wait_for(*paths)
+        return super().call(operation, *args, **kwargs)
+
+    def _is_pending(self, path: str) -> bool:
+        """Check for a pending write to a path, or into it as a folder."""
+        folder = path.rstrip("/\\")
+        in_folder = (folder + "/", folder + "\\") if folder else ()
+        return any(
+            pending == path or pending.startswith(in_folder)
+            for pending in self._pending
+        )
+
+    def _wait_for(self, *paths: str) -> None:
+        """Wait for any pending write to the paths, raising if a write failed."""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: not any(self._is_pending(path) for path in paths)
+            )
+        self._raise_errors()
+
+    def _submit_write(self, filepath: str, data: pd.DataFrame) -> None:
+        """Copy a dataframe and queue it to be written."""
+        self._wait_for(filepath)
+
+        snapshot = data.copy()
+        size = int(snapshot.memory_usage(index=True, deep=True).sum())
+        with self._condition:
+            self._condition.wait_for(
+                lambda: not self._pending
+                or self._pending_bytes + size <= self.max_pending_bytes
+            )
+            self._pending_bytes += size
+            future = self._executor.submit(
+                super().call, "write_csv", filepath, snapshot
+            )
+            self._pending[filepath] = future
+        future.add_done_callback(lambda f: self._write_done(filepath, f, size))
+
+    def _write_done(self, filepath: str, future: Future, size: int) -> None:
+        """Release the memory of a finished write and record any error."""
+        with self._condition:
+            if self._pending.get(filepath) is future:
+                del self._pending[filepath]
+            self._pending_bytes -= size
+            if future.exception() is not None:
+                storage_logger.error(f"Background write of {filepath} failed")
+                self._errors.append(future.exception())
+            self._condition.notify_all()
+
+    def _raise_errors(self) -> None:
+        """Raise the first error from a background write, if any failed."""
+        if self._errors:
+            raise self._errors.pop(0)
+
+    def flush(self) -> None:
+        with self._condition:
+            self._condition.wait_for(lambda: not self._pending)
+        self._raise_errors()
+        super().flush()
+
+
+def _mode(args: tuple, kwargs: dict) -> str:
+    """Get the mode from the arguments of an open call."""
+    return kwargs.get("mode", args[1] if len(args) > 1 else "rb")
+
+
+def get_storage(config: dict, middleware: Iterable[type] = ()) -> Storage:
+    """Create the Storage for the platform in the config.
+
+    Args:
+        config (dict): The pipeline configuration.
+        middleware (Iterable[type], optional): Middleware classes to wrap the
+            storage in, innermost first.
+
+    Raises:
+        ImportError: Raised if the platform is not recognised.
+
+    Returns:
+        Storage: The storage for the platform.
+    """
+    platform = config["global"]["platform"]
+    if platform not in PLATFORM_MODULES:
+        storage_logger.error(f"The selected platform {platform} is wrong")
+        raise ImportError(f"Cannot import {platform}_mods")
+
+    if platform == "s3":
+        # create singletion boto3 client object & pass in bucket string
+        from src.utils.singleton_boto import SingletonBoto
+
+        SingletonBoto.get_client(config)
+
+    storage = ModsStorage(platform, import_module(PLATFORM_MODULES[platform]))
+    for layer in middleware:
+        storage = layer(storage)
+    return storage
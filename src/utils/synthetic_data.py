@@ -0,0 +1,787 @@
+"""
+Generate a synthetic BERD snapshot, with its backdata, mappers and manual files.
+
+The only inputs that can be used in tests are small hand-built fixtures, so
+this builds inputs of any size, from thousands to millions of responses, for
+testing and benchmarking the pipeline locally. Every column of the snapshot is
+generated from the staging schemas: categorical columns are drawn from their
+possible values and numeric columns from their range. The columns the pipeline
+depends on are then given realistic distributions:
+    - contributor statuses and formtypes in roughly the shares seen in a survey,
+    - a skewed mix of SIC codes, and so of product groups and imputation classes,
+    - one product group instance for short forms, and one or more for long forms,
+    - civil and defence expenditure and employment on the short forms,
+    - expenditure and employment from long-tailed distributions, with the
+      breakdowns adding up to their totals.
+The mappers cover every reference, SIC code, product group and postcode in the
+snapshot, so it stages and maps without unmatched keys.
+
+The data is reproducible: the same size and seed give the same files.
+
+Contains the following:
+    synthetic_snapshot: Generates the contributors and long form responses.
+    synthetic_mappers: Generates the mappers for a snapshot.
+    synthetic_backdata: Generates last year's imputed data for a snapshot.
+    synthetic_manual_files: Generates manual trimming and outlier files.
+    write_synthetic_data: Generates and writes all the files for a run.
+"""
+
+# Standard libraries
+import logging
+import os
+import string
+from typing import Dict, Tuple
+
+# Third party libraries
+import numpy as np
+import pandas as pd
+import toml
+
+# Local libraries
+from src.staging.postcode_validation import format_postcodes
+from src.utils.storage import Storage
+
+SyntheticDataLogger = logging.getLogger(__name__)
+
+CONTRIBUTORS_SCHEMA = "./config/contributors_schema.toml"
+RESPONSES_SCHEMA = "./config/long_response.toml"
+WIDE_RESPONSES_SCHEMA = "./config/wide_responses.toml"
+BACKDATA_SCHEMA = "./config/backdata_schema.toml"
+
+DEFAULT_SEED = 2023
+
+# Each status with its statusencoded and share of the contributors
+STATUSES = {
+    "Clear": (210, 0.55),
+    "Clear - overridden": (211, 0.10),
+    "Form saved": (201, 0.02),
+    "Check needed": (200, 0.07),
+    "Form sent out": (100, 0.16),
+    "Combined child (NIL2)": (302, 0.02),
+    "Out of scope (NIL3)": (303, 0.02),
+    "Ceased trading (NIL4)": (304, 0.02),
+    "Dormant (NIL5)": (305, 0.01),
+    "Part year return (NIL8)": (308, 0.01),
+    "No UK activity (NIL9)": (309, 0.02),
+}
+
+# The statuses of the contributors that have responses
+RESPONDED_STATUSES = ["Clear", "Clear - overridden", "Form saved", "Check needed"]
+
+# Each formtype, long form 0001 and short form 0006, with its formid and share
+FORMTYPES = {"0001": (20, 0.3), "0006": (21, 0.7)}
+
+# The share of the short forms sent to census cells, rather than sampled PRN cells
+SHORT_FORM_CENSUS_SHARE = 0.6
+
+# The questions answered at instance 0, for the business as a whole
+BUSINESS_QUESTIONS = ["405", "406", "407", "408", "409", "410", "411", "412"]
+
+# The questions answered at instance 0 on short forms
+SHORT_FORM_QUESTIONS = ["701", "702", "703", "704", "705", "706", "707"]
+
+# The questions answered at each instance from 1, one per product group
+PRODUCT_QUESTIONS = [
+    "200",
+    "201",
+    "202",
+    "203",
+    "204",
+    "205",
+    "206",
+    "207",
+    "209",
+    "210",
+    "211",
+    "212",
+    "214",
+    "216",
+    "218",
+    "601",
+    "602",
+]
+
+# The share of long forms answering each of the other questions in the schema
+OTHER_ANSWER_SHARE = 0.05
+
+# The mean number of product group instances of a long form
+MEAN_LONG_FORM_INSTANCES = 1.6
+MAX_INSTANCES = 10
+
+# The share of product group instances that are for defence
+DEFENCE_SHARE = 0.1
+
+# The SIC divisions the SIC output combines, with the label of each combination
+SIC_DIVISION_COMBOS = pd.Series(
+    {
+        " 01-03": ["01", "02", "03"],
+        " 05-09": ["05", "06", "07", "08", "09"],
+        " 11-12": ["11", "12"],
+        "37-39": ["37", "38", "39"],
+        "41-43": ["41", "42", "43"],
+        "45-47": ["45", "46", "47"],
+        "52-53": ["52", "53"],
+        "55-56": ["55", "56"],
+        "64-66": ["64", "65", "66"],
+        "84-85": ["84", "85"],
+        "86-88": ["86", "87", "88"],
+        "90-93": ["90", "91", "92", "93"],
+        "94-99": ["94", "95", "96", "97", "98", "99"],
+    }
+)
+
+N_PRODUCT_GROUPS = 40
+N_SIC_CODES = 200
+N_CELLS = 817
+N_POSTCODES_PER_CONTRIBUTOR = 1.5
+
+# The ITL1 regions of Great Britain, which the synthetic ITL2 and ITL3 are in
+ITL1_REGIONS = {
+    "TLC": "North East",
+    "TLD": "North West",
+    "TLE": "Yorkshire and The Humber",
+    "TLF": "East Midlands",
+    "TLG": "West Midlands",
+    "TLH": "East",
+    "TLI": "London",
+    "TLJ": "South East",
+    "TLK": "South West",
+    "TLL": "Wales",
+    "TLM": "Scotland",
+}
+
+# The foreign ownership of the references not owned in GB, and its share
+FOREIGN_OWNERS = ["US", "DE", "FR", "JP", "NL", "IE", "CH", "SE"]
+FOREIGN_SHARE = 0.15
+
+
+def _load_schema(schema_path: str) -> Dict[str, dict]:
+    return toml.load(schema_path)
+
+
+def _dates(rng: np.random.Generator, n: int, year: int) -> np.ndarray:
+    """Random times in a year, as strings in the format of the snapshot."""
+    seconds = rng.integers(0, 365 * 24 * 3600, n)
+    times = pd.Timestamp(f"{year}-01-01") + pd.to_timedelta(seconds, unit="s")
+    return times.strftime("%Y-%m-%d %H:%M:%S").to_numpy()
+
+
+def _from_schema(spec: dict, rng: np.random.Generator, n: int, year: int):
+    """Generate the values of a column from its schema entry.
+
+    Columns with possible values are drawn from them, numeric columns with a
+    range are drawn uniformly from it, and dates from the year. Other columns
+    are left blank.
+    """
+    values = spec.get("Possible_Categorical_Values")
+    if values and values != ["nan"]:
+        return rng.choice(np.array(values, dtype=object), n)
+
+    dtype = str(spec.get("Deduced_Data_Type"))
+    if "datetime" in dtype:
+        return _dates(rng, n, year)
+
+    low, high = spec.get("Min_values"), spec.get("Max_values")
+    if isinstance(low, (int, float)) and isinstance(high, (int, float)):
+        if dtype.lower() == "int64":
+            return rng.integers(low, high, n, endpoint=True)
+        return rng.uniform(low, high, n).round(1)
+    return np.full(n, "", dtype=object)
+
+
+def _choice(rng: np.random.Generator, options: dict, n: int) -> np.ndarray:
+    """Draw n keys of a dict of (value, share) pairs, by their shares."""
+    keys = np.array(list(options), dtype=object)
+    shares = np.array([share for _, share in options.values()])
+    return rng.choice(keys, n, p=shares / shares.sum())
+
+
+def _skewed_choice(rng: np.random.Generator, values: np.ndarray, n: int):
+    """Draw n values, with the first values the most common, as in Zipf's law."""
+    weights = 1 / np.arange(1, len(values) + 1)
+    return rng.choice(values, n, p=weights / weights.sum())
+
+
+def _split(rng: np.random.Generator, total: np.ndarray, low: float, high: float):
+    """Split integer totals in two, with the first part a share of the total."""
+    first = np.floor(total * rng.uniform(low, high, len(total))).astype("int64")
+    return first, total - first
+
+
+def _postcodes(rng: np.random.Generator, n: int) -> np.ndarray:
+    """Generate n distinct postcodes in the usual form, e.g. "AB12 3CD"."""
+    letters = np.array(list(string.ascii_uppercase))
+    postcodes = set()
+    while len(postcodes) < n:
+        size = n - len(postcodes)
+        area = rng.choice(letters, size).astype(object) + rng.choice(letters, size)
+        district = rng.integers(1, 100, size).astype(str).astype(object)
+        sector = rng.integers(0, 10, size).astype(str).astype(object)
+        unit = rng.choice(letters, size).astype(object) + rng.choice(letters, size)
+        postcodes.update(area + district + " " + sector + unit)
+    return np.array(sorted(postcodes), dtype=object)[rng.permutation(n)]
+
+
+def _reference_data(rng: np.random.Generator, n_contributors: int) -> dict:
+    """The SIC codes, product groups and postcodes the snapshot is drawn from."""
+    pg_numeric = np.arange(1, N_PRODUCT_GROUPS + 1)
+    sic_codes = np.sort(rng.choice(np.arange(1300, 96091), N_SIC_CODES, False))
+    return {
+        "pg_numeric": pg_numeric,
+        "pg_alpha": np.array([_pg_alpha(pg) for pg in pg_numeric], dtype=object),
+        # Most SIC codes are in the product groups most often drawn
+        "sic_codes": rng.permutation(sic_codes),
+        "sic_pg": _skewed_choice(rng, pg_numeric, N_SIC_CODES),
+        "postcodes": _postcodes(
+            rng, max(int(n_contributors * N_POSTCODES_PER_CONTRIBUTOR), 10)
+        ),
+    }
+
+
+def _pg_alpha(pg_numeric: int) -> str:
+    """The alphabetic code of a product group: A to Z, then AA, AB and so on."""
+    letters = string.ascii_uppercase
+    if pg_numeric <= len(letters):
+        return letters[pg_numeric - 1]
+    return "A" + letters[pg_numeric - len(letters) - 1]
+
+
+def _contributors(
+    rng: np.random.Generator, n: int, period: int, refdata: dict
+) -> pd.DataFrame:
+    """Generate the contributors, from their schema and realistic distributions."""
+    year = period // 100
+    schema = _load_schema(CONTRIBUTORS_SCHEMA)
+    df = pd.DataFrame(
+        {col: _from_schema(spec, rng, n, year) for col, spec in schema.items()}
+    )
+
+    df["reference"] = 11001603625 + np.sort(rng.choice(8889705541, n, False))
+    df["period"] = period
+    df["status"] = _choice(rng, STATUSES, n)
+    df["statusencoded"] = df["status"].map({s: c for s, (c, _) in STATUSES.items()})
+    df["formtype"] = _choice(rng, FORMTYPES, n)
+    df["formid"] = df["formtype"].map({f: i for f, (i, _) in FORMTYPES.items()})
+    # Short forms are sent to census cells, or sampled from the PRN cells
+    census = rng.random(n) < SHORT_FORM_CENSUS_SHARE
+    df["selectiontype"] = np.where(
+        df["formtype"] == "0001", "L", np.where(census, "C", "P")
+    )
+
+    sic = _skewed_choice(rng, refdata["sic_codes"], n)
+    for col in ["rusic", "frozensic", "rusicoutdated", "frozensicoutdated"]:
+        df[col] = sic
+
+    employment = np.minimum(np.ceil(rng.lognormal(np.log(30), 1.5, n)), 272527)
+    employment = employment.astype("int64")
+    for col in ["employees", "employment", "frozenemployees", "frozenemployment"]:
+        df[col] = employment
+    fte = (employment * rng.uniform(0.8, 1.0, n)).round(1)
+    df["fteemployment"] = df["frozenfteemployment"] = fte
+    turnover = employment * rng.lognormal(np.log(150), 0.7, n)
+    df["turnover"] = df["frozenturnover"] = np.minimum(turnover, 55277352).astype(
+        "int64"
+    )
+
+    df["enterprisereference"] = df["wowenterprisereference"] = (
+        df["reference"] - 10000000000
+    )
+    df["cellnumber"] = rng.integers(1, N_CELLS, n, endpoint=True)
+    df["currency"] = "S"
+    df["referencename"] = "SYNTHETIC BUSINESS " + df.index.astype(str)
+    df["referencepostcode"] = rng.choice(refdata["postcodes"], n)
+    df["birthdate"] = _dates(rng, n, year - 20)
+    df["lockedby"] = df["lockeddate"] = df["inclusionexclusion"] = ""
+    return df
+
+
+def _instances(rng: np.random.Generator, contributors: pd.DataFrame) -> pd.DataFrame:
+    """One row per product group instance of each contributor that responded."""
+    responded = contributors[contributors["status"].isin(RESPONDED_STATUSES)]
+    long_form = (responded["formtype"] == "0001").to_numpy()
+    counts = np.where(
+        long_form,
+        1 + rng.poisson(MEAN_LONG_FORM_INSTANCES - 1, len(responded)),
+        1,
+    ).clip(1, MAX_INSTANCES)
+
+    rows = np.repeat(np.arange(len(responded)), counts)
+    # Number the instances of each contributor from 1
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    return pd.DataFrame(
+        {
+            "reference": responded["reference"].to_numpy()[rows],
+            "instance": np.arange(len(rows)) - starts + 1,
+            "formtype": responded["formtype"].to_numpy()[rows],
+            "rusic": responded["rusic"].to_numpy()[rows],
+            "employment": responded["employment"].to_numpy()[rows],
+            "referencepostcode": responded["referencepostcode"].to_numpy()[rows],
+        }
+    )
+
+
+def _product_answers(
+    rng: np.random.Generator, instances: pd.DataFrame, refdata: dict
+) -> pd.DataFrame:
+    """The answers to the product group questions, with breakdowns that add up."""
+    n = len(instances)
+    answers = instances[["reference", "instance"]].copy()
+    answers["200"] = np.where(rng.random(n) < DEFENCE_SHARE, "D", "C")
+
+    # The first instance is for the product group of the SIC code
+    sic_pg = pd.Series(refdata["sic_pg"], index=refdata["sic_codes"])
+    other_pg = _skewed_choice(rng, refdata["pg_numeric"], n)
+    first = (instances["instance"] == 1).to_numpy()
+    answers["201"] = np.where(
+        first, sic_pg.reindex(instances["rusic"]).to_numpy(), other_pg
+    )
+
+    total = np.ceil(rng.lognormal(np.log(200), 1.8, n)).astype("int64")
+    current, capex = _split(rng, total, 0.7, 1.0)
+    answers["202"], answers["203"] = _split(rng, current, 0.4, 0.7)
+    answers["204"] = current
+    answers["205"], applied = _split(rng, current, 0.0, 0.2)
+    answers["206"], answers["207"] = _split(rng, applied, 0.3, 0.6)
+    answers["209"] = answers["210"] = capex
+    answers["211"] = answers["218"] = total
+    answers["212"], external = _split(rng, total, 0.5, 1.0)
+    answers["214"], answers["216"] = _split(rng, external, 0.0, 0.5)
+
+    # Most instances are at the contributor's own postcode
+    own_site = rng.random(n) < 0.8
+    answers["601"] = np.where(
+        own_site,
+        instances["referencepostcode"].to_numpy(),
+        rng.choice(refdata["postcodes"], n),
+    )
+    answers["602"] = 100
+    return answers[["reference", "instance"] + PRODUCT_QUESTIONS]
+
+
+def _business_answers(
+    rng: np.random.Generator, instances: pd.DataFrame
+) -> pd.DataFrame:
+    """The answers to the employment questions at instance 0."""
+    first = instances[instances["instance"] == 1]
+    n = len(first)
+    answers = first[["reference"]].assign(instance=0)
+
+    staff = np.ceil(first["employment"].to_numpy() * rng.uniform(0.02, 0.3, n))
+    defence = np.floor(staff * (rng.random(n) < DEFENCE_SHARE)).astype("int64")
+    civil = staff.astype("int64") - defence
+    answers["406"], rest = _split(rng, civil, 0.4, 0.7)
+    answers["407"], answers["409"] = _split(rng, rest, 0.3, 0.7)
+    answers["405"], rest = _split(rng, defence, 0.4, 0.7)
+    answers["408"], answers["410"] = _split(rng, rest, 0.3, 0.7)
+    answers["411"], answers["412"] = civil, defence
+    return answers[["reference", "instance"] + BUSINESS_QUESTIONS]
+
+
+def _short_form_answers(
+    rng: np.random.Generator, instances: pd.DataFrame
+) -> pd.DataFrame:
+    """The civil and defence expenditure and employment of short forms."""
+    short = instances[instances["formtype"] == "0006"]
+    n = len(short)
+    answers = short[["reference"]].assign(instance=0)
+
+    total = np.ceil(rng.lognormal(np.log(100), 1.5, n)).astype("int64")
+    defence = np.floor(total * (rng.random(n) < DEFENCE_SHARE)).astype("int64")
+    answers["701"], answers["702"] = total - defence, defence
+    answers["703"] = np.floor(answers["701"] * rng.uniform(0.0, 0.3, n))
+    answers["704"] = np.floor(answers["702"] * rng.uniform(0.0, 0.3, n))
+
+    staff = np.ceil(short["employment"].to_numpy() * rng.uniform(0.02, 0.3, n))
+    answers["705"] = staff.astype("int64")
+    defence_staff = np.floor(staff * (defence > 0) * rng.uniform(0.2, 1.0, n))
+    answers["706"] = (staff - defence_staff).astype("int64")
+    answers["707"] = defence_staff.astype("int64")
+    return answers[["reference", "instance"] + SHORT_FORM_QUESTIONS]
+
+
+def _other_answers(rng: np.random.Generator, instances: pd.DataFrame) -> pd.DataFrame:
+    """Answers to the other questions in the wide schema, on a few long forms.
+
+    Numeric questions are given small values and the others are left blank.
+    The first long form answers every question, so each is in the snapshot.
+    """
+    schema = _load_schema(WIDE_RESPONSES_SCHEMA)
+    generated = set(
+        BUSINESS_QUESTIONS + PRODUCT_QUESTIONS + SHORT_FORM_QUESTIONS + ["instance"]
+    )
+    questions = np.array([q for q in schema if q not in generated], dtype=object)
+    numeric = np.array(
+        [schema[q]["Deduced_Data_Type"] in ("float64", "Int64") for q in questions]
+    )
+
+    long_forms = instances[
+        (instances["instance"] == 1) & (instances["formtype"] == "0001")
+    ]
+    answered = rng.random((len(long_forms), len(questions))) < OTHER_ANSWER_SHARE
+    answered[:1] = True
+    rows, cols = np.nonzero(answered)
+    values = np.ceil(rng.lognormal(np.log(20), 1.0, len(rows))).astype("int64")
+    return pd.DataFrame(
+        {
+            "reference": long_forms["reference"].to_numpy()[rows],
+            "instance": 0,
+            "questioncode": questions[cols],
+            "response": np.where(numeric[cols], values.astype(str), ""),
+        }
+    )
+
+
+def _to_long(answers: pd.DataFrame) -> pd.DataFrame:
+    """Reshape wide answers to one response per row, as strings."""
+    long = answers.melt(
+        id_vars=["reference", "instance"],
+        var_name="questioncode",
+        value_name="response",
+    )
+    long["response"] = long["response"].astype(str)
+    return long
+
+
+def synthetic_snapshot(
+    n_responses: int, period: int = 202312, seed: int = DEFAULT_SEED
+) -> Tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """Generate the contributors and responses of a synthetic snapshot.
+
+    The number of contributors is chosen so that the number of responses is
+    close to n_responses.
+
+    Args:
+        n_responses (int): The number of responses to generate, approximately.
+        period (int, optional): The period of the snapshot, e.g. 202312.
+        seed (int, optional): The seed for the random generator.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame, dict]: The contributors, the long
+            form responses, and the reference data they were drawn from, which
+            synthetic_mappers needs.
+    """
+    rng = np.random.default_rng(seed)
+
+    responded = sum(STATUSES[status][1] for status in RESPONDED_STATUSES)
+    long_share = FORMTYPES["0001"][1]
+    mean_instances = long_share * MEAN_LONG_FORM_INSTANCES + (1 - long_share)
+    n_other = len(_load_schema(WIDE_RESPONSES_SCHEMA)) - 1
+    n_other -= len(BUSINESS_QUESTIONS + PRODUCT_QUESTIONS + SHORT_FORM_QUESTIONS)
+    per_contributor = responded * (
+        len(BUSINESS_QUESTIONS)
+        + mean_instances * len(PRODUCT_QUESTIONS)
+        + (1 - long_share) * len(SHORT_FORM_QUESTIONS)
+        + long_share * n_other * OTHER_ANSWER_SHARE
+    )
+    n_contributors = max(int(round(n_responses / per_contributor)), 1)
+
+    refdata = _reference_data(rng, n_contributors)
+    contributors = _contributors(rng, n_contributors, period, refdata)
+    instances = _instances(rng, contributors)
+    responses = pd.concat(
+        [
+            _to_long(_business_answers(rng, instances)),
+            _to_long(_product_answers(rng, instances, refdata)),
+            _to_long(_short_form_answers(rng, instances)),
+            _other_answers(rng, instances),
+        ],
+        ignore_index=True,
+    ).sort_values(["reference", "instance"], kind="stable", ignore_index=True)
+
+    schema = _load_schema(RESPONSES_SCHEMA)
+    for col, spec in schema.items():
+        if col not in responses.columns:
+            responses[col] = _from_schema(spec, rng, len(responses), period // 100)
+    responses["period"] = period
+    responses["adjustedresponse"] = ""
+    responses = responses[list(schema)]
+
+    SyntheticDataLogger.info(
+        f"Generated {len(contributors)} contributors with {len(responses)} responses"
+    )
+    return contributors, responses, refdata
+
+
+def synthetic_mappers(
+    contributors: pd.DataFrame, refdata: dict, seed: int = DEFAULT_SEED
+) -> Dict[str, pd.DataFrame]:
+    """Generate the mappers for a synthetic snapshot.
+
+    Args:
+        contributors (pd.DataFrame): The contributors of the snapshot.
+        refdata (dict): The reference data the snapshot was drawn from.
+        seed (int, optional): The seed for the random generator.
+
+    Returns:
+        Dict[str, pd.DataFrame]: The mappers, keyed by the config key of their
+            path: cellno_path, ultfoc_mapper_path, postcode_mapper,
+            itl_mapper_path, sic_pg_num_mapper_path, pg_num_alpha_mapper_path
+            and the detailed mappers the outputs are laid out by.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(contributors)
+
+    # Each cell's universe is its sampled contributors, plus the unsampled
+    sampled = contributors.groupby("cellnumber")["employment"].agg(["size", "sum"])
+    cells = sampled.reindex(np.arange(1, N_CELLS + 1), fill_value=0)
+    uni_count = cells["size"] + rng.integers(0, 50, N_CELLS)
+    cellno = pd.DataFrame(
+        {
+            "cell_no": cells.index.to_numpy(),
+            "UNI_Count": uni_count,
+            "uni_employment": cells["sum"] + uni_count * 10,
+            "uni_turnover": (cells["sum"] + uni_count * 10) * 150,
+        }
+    ).reset_index(drop=True)
+
+    foreign = rng.random(n) < FOREIGN_SHARE
+    ultfoc = pd.DataFrame(
+        {
+            "ruref": contributors["reference"],
+            "ultfoc": np.where(foreign, rng.choice(FOREIGN_OWNERS, n), "GB"),
+        }
+    )
+
+    itl = _itl_mapper(rng, max(len(refdata["postcodes"]) // 100, 20))
+    postcodes = pd.DataFrame(
+        {
+            "pcd2": [format_postcodes(pc) for pc in refdata["postcodes"]],
+            "itl": rng.choice(itl["LAU121CD"].to_numpy(), len(refdata["postcodes"])),
+        }
+    )
+
+    return {
+        "cellno_path": cellno,
+        "ultfoc_mapper_path": ultfoc,
+        "postcode_mapper": postcodes,
+        "itl_mapper_path": itl,
+        "sic_pg_num_mapper_path": pd.DataFrame(
+            {"SIC 2007_CODE": refdata["sic_codes"], "2016 > Form PG": refdata["sic_pg"]}
+        ),
+        "pg_num_alpha_mapper_path": pd.DataFrame(
+            {"pg_numeric": refdata["pg_numeric"], "pg_alpha": refdata["pg_alpha"]}
+        ),
+        **_detailed_mappers(refdata),
+    }
+
+
+def _detailed_mappers(refdata: dict) -> Dict[str, pd.DataFrame]:
+    """Generate the mappers the product group, SIC and civil or defence outputs
+    are laid out by, with a row for each group and for the total."""
+    pg_alpha = list(pd.unique(refdata["pg_alpha"])) + ["total"]
+    pg_detailed = pd.DataFrame(
+        {
+            "ranking": np.arange(1, len(pg_alpha) + 1),
+            "pg_alpha": pg_alpha,
+            "Detailed product groups (Alphabetical product groups A-AH)": [
+                f"Product group {pg}" for pg in pg_alpha
+            ],
+            "Notes": "",
+        }
+    )
+
+    # The divisions are output singly, apart from those the output combines
+    combined = set(SIC_DIVISION_COMBOS.explode())
+    divisions = [f"{div:02d}" for div in range(1, 100) if f"{div:02d}" not in combined]
+    divisions = sorted(divisions + list(SIC_DIVISION_COMBOS.index)) + ["All"]
+    sic_division_detailed = pd.DataFrame(
+        {
+            "ranking": np.arange(1, len(divisions) + 1),
+            "SIC": divisions,
+            "Industry description": [f"Division {div}" for div in divisions],
+            "Notes": "",
+        }
+    )
+
+    # The first row is the header of the output
+    civil_defence_detailed = pd.DataFrame(
+        {
+            "A": ["Civil or defence", "Civil", "Defence"],
+            "B": ["period", "", ""],
+            "C": ["Notes", "", ""],
+            "CD": ["", "C", "D"],
+        }
+    )
+
+    return {
+        "pg_detailed_mapper_path": pg_detailed,
+        "sic_division_detailed_mapper_path": sic_division_detailed,
+        "civil_defence_detailed_mapper_path": civil_defence_detailed,
+    }
+
+
+def _itl_mapper(rng: np.random.Generator, n_areas: int) -> pd.DataFrame:
+    """Generate local areas, each in an ITL3, ITL2 and ITL1 region of GB."""
+    itl1 = rng.choice(np.array(list(ITL1_REGIONS), dtype=object), n_areas)
+    itl2 = itl1 + rng.integers(1, 5, n_areas).astype(str)
+    itl3 = itl2 + rng.integers(1, 5, n_areas).astype(str)
+    area = pd.Series(np.arange(n_areas)).map("{:06d}".format).to_numpy(dtype=object)
+    return pd.DataFrame(
+        {
+            "LAD20CD": "E06" + area,
+            "LAD20NM": "Synthetic district " + area,
+            "LAU121CD": "E05" + area,
+            "LAU121NM": "Synthetic area " + area,
+            "ITL321CD": itl3,
+            "ITL321NM": "Synthetic ITL3 " + itl3,
+            "ITL221CD": itl2,
+            "ITL221NM": "Synthetic ITL2 " + itl2,
+            "ITL121CD": itl1,
+            "ITL121NM": pd.Series(itl1).map(ITL1_REGIONS).to_numpy(),
+        }
+    )
+
+
+def synthetic_backdata(
+    contributors: pd.DataFrame,
+    responses: pd.DataFrame,
+    seed: int = DEFAULT_SEED,
+    share: float = 0.8,
+) -> pd.DataFrame:
+    """Generate last year's imputed data, for a share of the references.
+
+    Each reference's answers last year are its answers this year, scaled by a
+    random growth factor, with its imputation class and marker.
+
+    Args:
+        contributors (pd.DataFrame): The contributors of the snapshot.
+        responses (pd.DataFrame): The responses of the snapshot.
+        seed (int, optional): The seed for the random generator.
+        share (float, optional): The share of the references in the backdata.
+
+    Returns:
+        pd.DataFrame: The backdata, with the columns of its schema.
+    """
+    rng = np.random.default_rng(seed)
+    schema = _load_schema(BACKDATA_SCHEMA)
+    questions = [col for col in schema if col.isdigit()]
+
+    wide = responses[responses["questioncode"].isin(questions)].pivot_table(
+        index=["reference", "instance"],
+        columns="questioncode",
+        values="response",
+        aggfunc="first",
+    )
+    wide = wide.reset_index()
+    refs = wide["reference"].unique()
+    wide = wide[wide["reference"].isin(rng.choice(refs, int(len(refs) * share), False))]
+
+    numeric = [col for col in questions if col in wide and col not in ("200", "601")]
+    growth = rng.lognormal(0, 0.2, len(wide))
+    for col in numeric:
+        values = pd.to_numeric(wide[col], errors="coerce")
+        wide[col] = (values * growth).round() if col != "201" else values
+
+    contributor_cols = ["reference", "status", "formid", "formtype", "cellnumber"]
+    backdata = wide.merge(contributors[contributor_cols], on="reference", how="left")
+    backdata["period"] = contributors["period"].iloc[0] - 100
+    backdata["survey"] = "002"
+    # Last year's product groups were mapped to their alphabetic codes
+    backdata["pg_numeric"] = backdata["201"]
+    pg_numeric = backdata["pg_numeric"].astype("Int64")
+    backdata["201"] = pg_numeric.map(_pg_alpha, na_action="ignore")
+    # Only the product group instances are in an imputation class
+    backdata["imp_class"] = (backdata["200"] + "_" + backdata["201"]).where(
+        backdata["200"].notna()
+    )
+    clear = backdata["status"].isin(["Clear", "Clear - overridden"])
+    imputed = rng.choice(["TMI", "CF"], len(backdata))
+    backdata["imp_marker"] = np.where(clear, "R", imputed)
+    # Last year's references were all R&D performers
+    backdata["604"] = "Yes"
+    return backdata.reindex(columns=list(schema))
+
+
+def synthetic_manual_files(
+    responses: pd.DataFrame, seed: int = DEFAULT_SEED, share: float = 0.01
+) -> Dict[str, pd.DataFrame]:
+    """Generate manual trimming and outlier files, for a share of the references.
+
+    Args:
+        responses (pd.DataFrame): The responses of the snapshot.
+        seed (int, optional): The seed for the random generator.
+        share (float, optional): The share of the references in each file.
+
+    Returns:
+        Dict[str, pd.DataFrame]: The files, keyed by the config key of their
+            path: manual_imp_trim_path and manual_outliers_path.
+    """
+    rng = np.random.default_rng(seed)
+    instances = responses[["reference", "instance"]].drop_duplicates()
+    instances = instances[instances["instance"] > 0]
+
+    trim = instances.sample(frac=share, random_state=rng).sort_values(
+        ["reference", "instance"]
+    )
+    trim["manual_trim"] = rng.random(len(trim)) < 0.5
+
+    refs = instances["reference"].drop_duplicates()
+    outliers = refs.sample(frac=share, random_state=rng).sort_values().to_frame()
+    outliers["manual_outlier"] = rng.random(len(outliers)) < 0.5
+    outliers["auto_override_outlier_status"] = ~outliers["manual_outlier"]
+
+    return {
+        "manual_imp_trim_path": trim.reset_index(drop=True),
+        "manual_outliers_path": outliers.reset_index(drop=True),
+    }
+
+
+def _snapshot_json(contributors: pd.DataFrame, responses: pd.DataFrame) -> bytes:
+    """Serialise a snapshot in the SPP format, with each value as a string."""
+    return (
+        '{"snapshot_id": "synthetic", "contributors": '
+        + contributors.astype(str).to_json(orient="records")
+        + ', "responses": '
+        + responses.astype(str).to_json(orient="records")
+        + "}"
+    ).encode("utf-8")
+
+
+def write_synthetic_data(
+    storage: Storage,
+    folder: str,
+    n_responses: int,
+    period: int = 202312,
+    seed: int = DEFAULT_SEED,
+    paths: Dict[str, str] = None,
+) -> Dict[str, str]:
+    """Generate and write a synthetic snapshot, backdata, mappers and manual files.
+
+    Args:
+        storage (Storage): The storage to write the files with.
+        folder (str): The folder to write the files to. It must exist.
+        n_responses (int): The number of responses to generate, approximately.
+        period (int, optional): The period of the snapshot, e.g. 202312.
+        seed (int, optional): The seed for the random generator.
+        paths (Dict[str, str], optional): The path to write each file to, keyed
+            by the config key of its path, such as the staging and mapping
+            paths of a config. Files without a path are written to folder.
+
+    Returns:
+        Dict[str, str]: The path of each file, keyed by the config key of its
+            path, e.g. "snapshot_path" or "cellno_path".
+    """
+    contributors, responses, refdata = synthetic_snapshot(n_responses, period, seed)
+    frames = {
+        "backdata_path": synthetic_backdata(contributors, responses, seed),
+        **synthetic_mappers(contributors, refdata, seed),
+        **synthetic_manual_files(responses, seed),
+    }
+
+    given = paths or {}
+    paths = {
+        "snapshot_path": given.get(
+            "snapshot_path",
+            os.path.join(folder, f"snapshot_{period}_synthetic_{n_responses}.json"),
+        )
+    }
+    storage.write_string_to_file(
+        _snapshot_json(contributors, responses), paths["snapshot_path"]
+    )
+    for key, df in frames.items():
+        name = key.replace("_mapper", "").replace("_path", "")
+        paths[key] = given.get(key, os.path.join(folder, f"synthetic_{name}.csv"))
+        storage.write_csv(paths[key], df)
+
+    SyntheticDataLogger.info(f"Synthetic data written to {folder}")
+    return paths
@@ -1,30 +1,123 @@
 import logging
+from collections import deque
+from datetime import datetime
 from functools import wraps
-from time import perf_counter
+from time import perf_counter, process_time
+from typing import Tuple
 import traceback
+import tracemalloc
 import pandas as pd
 import logging.config
 
+try:
+    import resource
+except ImportError:  # resource is not available on Windows
+    resource = None
+
 
 logger = logging.getLogger(__name__)
 
+# The most log records kept for the runlog; the oldest are dropped beyond this
+LOG_BUFFER_SIZE = 100_000
+
+LOG_RECORD_COLUMNS = [
+    "timestamp",
+    "module",
+    "function",
+    "level",
+    "stage",
+    "elapsed_seconds",
+    "message",
+]
+
+# The pipeline stage being run by run_stage, recorded against each log record
+_current_stage = None
+
+
+class LogCaptureHandler(logging.Handler):
+    """
+    Keeps the log records of the current run in memory, for the runlog.
+
+    Each record is stored as a tuple of the LOG_RECORD_COLUMNS fields, in a
+    ring buffer, so a very chatty run cannot use unbounded memory.
+
+    Attributes
+    ==========
+    records
+        the captured records, oldest first
+    dropped
+        the number of records dropped because the buffer was full
+    start_time
+        the time the capture was last cleared, for the elapsed seconds
+    """
+
+    def __init__(self, max_records: int = LOG_BUFFER_SIZE):
+        super().__init__()
+        self.records = deque(maxlen=max_records)
+        self.dropped = 0
+        self.start_time = datetime.now().timestamp()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Store the structured fields of a log record."""
+        try:
+            fields = (
+                datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S"),
+                record.name,
+                record.funcName,
+                record.levelname,
+                _current_stage,
+                round(record.created - self.start_time, 3),
+                record.getMessage(),
+            )
+            if len(self.records) == self.records.maxlen:
+                self.dropped += 1
+            self.records.append(fields)
+        except Exception:
+            self.handleError(record)
+
+    def clear(self) -> None:
+        """Clear the captured records, ready for a new run."""
+        self.records.clear()
+        self.dropped = 0
+        self.start_time = datetime.now().timestamp()
+
+
+# The handler logger_creator attaches, capturing the logs of the current run
+LOG_CAPTURE = LogCaptureHandler()
+
+
+def get_log_records() -> pd.DataFrame:
+    """Get the log records captured so far in this run, one row per record."""
+    return pd.DataFrame(list(LOG_CAPTURE.records), columns=LOG_RECORD_COLUMNS)
+
+
+def clear_log_records() -> None:
+    """Clear the captured log records, ready for a new run."""
+    LOG_CAPTURE.clear()
+
 
 def logger_creator(global_config):
     """Set up config for logging. This method overwrites
-    the previously saved logs after moving them to csv format.
+    the previously saved logs, and starts capturing the logs of this run
+    in memory for the runlog. The logs are written to logs/main.log as well
+    as the console unless log_to_file is False.
     This function returns a custom logger that is called
     in the main script before running the pipeline"""
+    handlers = [logging.StreamHandler()]
+    if global_config.get("log_to_file", True):
+        handlers.insert(0, logging.FileHandler("logs/main.log", mode="w"))
     logging.basicConfig(
         # logging level is obtained from user configs
         level=global_config["logging_level"],
         # Define the detail and order of the written logs
         format="%(asctime)s - %(name)s - %(funcName)s - %(levelname)s:%(message)s",
-        # Log to both console and file
-        handlers=[
-            logging.FileHandler("logs/main.log", mode="w"),
-            logging.StreamHandler(),
-        ],
+        handlers=handlers,
     )
+    # Attach the capture handler even if logging was already configured
+    root_logger = logging.getLogger()
+    if LOG_CAPTURE not in root_logger.handlers:
+        root_logger.addHandler(LOG_CAPTURE)
+    clear_log_records()
     logger = logging.getLogger(__name__)
 
     return logger
@@ -133,114 +226,274 @@ def exception_wrap(func):
     return wrapper
 
 
-def df_change_func_wrap(func):
+# Metrics recorded by track_df_changes during the current run
+DF_METRICS = []
+
+DF_METRICS_COLUMNS = [
+    "function",
+    "rows_before",
+    "rows_after",
+    "cols_before",
+    "cols_after",
+    "cols_added",
+    "cols_removed",
+    "memory_before",
+    "memory_after",
+    "seconds",
+    "keys_before",
+    "keys_after",
+]
+
+
+def _first_dataframe(args: tuple) -> pd.DataFrame:
+    """Return the first dataframe in the positional arguments, or None."""
+    return next((arg for arg in args if isinstance(arg, pd.DataFrame)), None)
+
+
+def _frame_summary(df: pd.DataFrame, key_cols: list = None) -> dict:
+    """Summarise a dataframe without copying it.
+
+    Memory is the shallow memory_usage, which only reads array sizes. If key
+    columns are given, an order-independent fingerprint of the row keys is
+    taken, so it is possible to tell whether the set of rows changed. Every
+    value is None if there is no dataframe.
+    """
+    if df is None:
+        return {"rows": None, "columns": None, "memory": None, "keys": None}
+    summary = {
+        "rows": df.shape[0],
+        "columns": df.columns,
+        "memory": int(df.memory_usage(deep=False).sum()),
+        "keys": None,
+    }
+    if key_cols and set(key_cols).issubset(df.columns):
+        hashes = pd.util.hash_pandas_object(df[key_cols], index=False)
+        summary["keys"] = format(int(hashes.sum()) % 2**64, "016x")
+    return summary
+
+
+def _combine_summaries(summaries: list) -> dict:
+    """Add up the rows and memory of summaries, keeping the first's columns."""
+    if not summaries:
+        return _frame_summary(None)
+    return {
+        **summaries[0],
+        "rows": sum(summary["rows"] for summary in summaries),
+        "memory": sum(summary["memory"] for summary in summaries),
+    }
+
+
+def _count_columns(columns: pd.Index) -> int:
+    """The number of columns, or None if the frame is missing."""
+    return None if columns is None else len(columns)
+
+
+def _column_changes(before: pd.Index, after: pd.Index) -> Tuple[str, str]:
+    """The columns added and removed, or None if either frame is missing."""
+    if before is None or after is None:
+        return None, None
+    added = after.difference(before, sort=False)
+    removed = before.difference(after, sort=False)
+    return ";".join(map(str, added)), ";".join(map(str, removed))
+
+
+def _log_df_change(metrics: dict) -> None:
+    """Log the change in rows and columns, as recorded in the metrics."""
+    if metrics["rows_before"] is None or metrics["rows_after"] is None:
+        logger.info(f"No dataframe to compare for {metrics['function']}")
+        return
+
+    def _change_direction(before, after):
+        """Get the direction of the change."""
+        # Evalutate the direction of change
+        change = ["gained", "removed"][after < before]
+
+        return change
+
+    rows_diff = metrics["rows_after"] - metrics["rows_before"]
+    cols_diff = metrics["cols_after"] - metrics["cols_before"]
+    row_change = _change_direction(metrics["rows_before"], metrics["rows_after"])
+    col_change = _change_direction(metrics["cols_before"], metrics["cols_after"])
+
+    if rows_diff == 0 and cols_diff == 0:
+        logger.info("There has been no change in the dataframe")
+    else:
+        logger.info("Changes to the dataframe are as follows")
+        logger.info(f"{abs(rows_diff)} rows were {row_change}")
+        logger.info(f"{abs(cols_diff)} columns were {col_change}")
+
+
+def track_df_changes(func=None, *, key_cols: list = None):
+    """Define a decorator to record how a function changes a dataframe.
+
+    The first dataframe argument is compared with the result. If the function
+    returns a tuple of dataframes (e.g. a split into filtered and excluded
+    records), their rows are added together and the columns of the first are
+    used. If there is no dataframe argument or none is returned, None is
+    recorded for that side. Nothing is copied: only shapes, column names,
+    shallow memory usage, wall time and, if key_cols is given, a fingerprint
+    of the row keys are recorded. The metrics for the run are kept in
+    DF_METRICS, see get_df_metrics.
+
+    Can be used bare, @track_df_changes, or with key columns to fingerprint,
+    @track_df_changes(key_cols=["reference", "instance"]).
+    """
+    if func is None:
+        return lambda f: track_df_changes(f, key_cols=key_cols)
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        # Extract the dataframe arg
-        df_arg = None
-        for arg in args:
-            if isinstance(arg, pd.DataFrame):
-                df_arg = arg
-                break
+        """Define the decorator itself."""
+        before = _frame_summary(_first_dataframe(args), key_cols)
 
-        if df_arg is None:
-            raise ValueError("No dataframe found in arguments")
+        enter_time = starting_time()
+        result = func(*args, **kwargs)
+        seconds = perf_counter() - enter_time
+
+        frames = result if isinstance(result, tuple) else (result,)
+        frames = [frame for frame in frames if isinstance(frame, pd.DataFrame)]
+        after = _combine_summaries([_frame_summary(f, key_cols) for f in frames])
+        added, removed = _column_changes(before["columns"], after["columns"])
+
+        metrics = {
+            "function": func.__qualname__,
+            "rows_before": before["rows"],
+            "rows_after": after["rows"],
+            "cols_before": _count_columns(before["columns"]),
+            "cols_after": _count_columns(after["columns"]),
+            "cols_added": added,
+            "cols_removed": removed,
+            "memory_before": before["memory"],
+            "memory_after": after["memory"],
+            "seconds": round(seconds, 4),
+            "keys_before": before["keys"],
+            "keys_after": after["keys"],
+        }
+        DF_METRICS.append(metrics)
+        _log_df_change(metrics)
 
-        # Get shape
-        before_shape = df_arg.shape
+        return result
 
-        # Apply the function
-        result = func(*args, **kwargs)
+    return wrapper
 
-        # Get shape after function
-        after_shape = result.shape
 
-        # Extract rows and col
-        rows_before = before_shape[0]
-        rows_after = after_shape[0]
+def get_df_metrics() -> pd.DataFrame:
+    """Get the dataframe metrics recorded so far in this run, one row per call."""
+    return pd.DataFrame(DF_METRICS, columns=DF_METRICS_COLUMNS)
 
-        cols_before = before_shape[1]
-        cols_after = after_shape[1]
 
-        rows_diff = rows_after - rows_before
-        cols_diff = cols_after - cols_before
+def clear_df_metrics() -> None:
+    """Clear the recorded dataframe metrics, ready for a new run."""
+    DF_METRICS.clear()
 
-        def _change_direction(before, after):
-            """Get the direction of the change."""
-            # Evalutate the direction of change
-            change = ["gained", "removed"][after < before]
 
-            return change
+# The shape-logging wrappers are now both handled by track_df_changes
+df_change_func_wrap = track_df_changes
+count_split_records_wrap = track_df_changes
 
-        # Get direction of change
-        row_change = _change_direction(rows_before, rows_after)
-        col_change = _change_direction(cols_before, cols_after)
 
-        if rows_diff == 0 and cols_diff == 0:
-            logger.info("There has been no change in the dataframe")
-        else:
-            logger.info("Changes to the dataframe are as follows")
-            logger.info(f"{abs(rows_diff)} rows were {row_change}")
-            logger.info(f"{abs(cols_diff)} columns were {col_change}")
+# Metrics recorded by run_stage for each pipeline stage in the current run
+STAGE_METRICS = []
 
-        return result
+STAGE_METRICS_COLUMNS = [
+    "stage",
+    "wall_seconds",
+    "cpu_seconds",
+    "peak_rss_delta_mb",
+    "peak_traced_mb",
+    "rows_in",
+    "rows_out",
+]
 
-    return wrapper
 
+def _peak_rss_mb() -> float:
+    """Get the peak resident set size of the process so far, in MB.
 
-def count_split_records_wrap(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        # Extract the dataframe arg
-        df_arg = None
-        for arg in args:
-            if isinstance(arg, pd.DataFrame):
-                df_arg = arg
-                break
+    Returns None where the resource module is not available (Windows).
+    ru_maxrss is in kilobytes on Linux.
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
-        if df_arg is None:
-            raise ValueError("No dataframe found in arguments")
 
-        # Get shape
-        before_shape = df_arg.shape
+def _count_rows(obj) -> int:
+    """Count the rows of a dataframe, or of the first dataframe in a tuple."""
+    frames = obj if isinstance(obj, tuple) else (obj,)
+    for frame in frames:
+        if isinstance(frame, pd.DataFrame):
+            return frame.shape[0]
+    return None
 
-        # Apply the function
-        filtered_df, excluded_df = func(*args, **kwargs)
 
-        # Get shape after function
-        after_shape = filtered_df.shape
+def run_stage(stage: str, func, *args, **kwargs):
+    """Run one pipeline stage and record its timings and row counts.
 
-        # Extract rows and col
-        rows_before = before_shape[0]
-        rows_after = filtered_df.shape[0] + excluded_df.shape[0]
+    Records the wall time, CPU time, growth in peak RSS and the rows in the
+    first dataframe argument and in the (first) dataframe returned. The peak
+    RSS can only grow, so the delta is how far the stage raised the peak.
+    When tracemalloc is tracing, the most memory the stage allocated at once
+    is also recorded, which does not depend on the stages run before it.
+    Log records made while the stage runs are captured against the stage.
 
-        cols_before = before_shape[1]
-        cols_after = after_shape[1]
+    Args:
+        stage (str): The name of the stage, e.g. "imputation".
+        func (Callable): The stage function to run, e.g. run_imputation.
+        *args: The positional arguments for func.
+        **kwargs: The keyword arguments for func.
 
-        rows_diff = rows_after - rows_before
-        cols_diff = cols_after - cols_before
+    Returns:
+        The result of func.
+    """
+    rows_in = _count_rows(next((a for a in args if isinstance(a, pd.DataFrame)), None))
+    peak_before = _peak_rss_mb()
+    traced = tracemalloc.is_tracing()
+    if traced:
+        tracemalloc.reset_peak()
+        traced_before = tracemalloc.get_traced_memory()[0]
+    wall_start = perf_counter()
+    cpu_start = process_time()
 
-        def _change_direction(before, after):
-            """Get the direction of the change."""
-            # Evalutate the direction of change
-            change = ["gained", "removed"][after < before]
+    global _current_stage
+    _current_stage = stage
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        _current_stage = None
+
+    wall_seconds = perf_counter() - wall_start
+    cpu_seconds = process_time() - cpu_start
+    peak_after = _peak_rss_mb()
+    peak_delta = None if peak_after is None else round(peak_after - peak_before, 1)
+    peak_traced = None
+    if traced:
+        peak_traced = (tracemalloc.get_traced_memory()[1] - traced_before) / 1024**2
+        peak_traced = round(peak_traced, 1)
+
+    STAGE_METRICS.append(
+        {
+            "stage": stage,
+            "wall_seconds": round(wall_seconds, 2),
+            "cpu_seconds": round(cpu_seconds, 2),
+            "peak_rss_delta_mb": peak_delta,
+            "peak_traced_mb": peak_traced,
+            "rows_in": rows_in,
+            "rows_out": _count_rows(result),
+        }
+    )
+    logger.info(f"Stage {stage} took {round(wall_seconds, 2)} seconds")
 
-            return change
+    return result
 
-        # Get direction of change
-        row_change = _change_direction(rows_before, rows_after)
-        col_change = _change_direction(cols_before, cols_after)
 
-        if rows_diff == 0 and cols_diff == 0:
-            logger.info("There has been no change in the dataframe")
-        else:
-            logger.info("Changes to the dataframe are as follows")
-            logger.info(f"{abs(rows_diff)} rows were {row_change}")
-            logger.info(f"{abs(cols_diff)} columns were {col_change}")
+def get_stage_metrics() -> pd.DataFrame:
+    """Get the stage metrics recorded so far in this run, one row per stage."""
+    return pd.DataFrame(STAGE_METRICS, columns=STAGE_METRICS_COLUMNS)
 
-        return filtered_df, excluded_df
 
-    return wrapper
+def clear_stage_metrics() -> None:
+    """Clear the recorded stage metrics, ready for a new run."""
+    STAGE_METRICS.clear()
 
 
 def validate_dataframe_not_empty(func):
@@ -0,0 +1,32 @@
+"""Main file for generating a synthetic snapshot, with its backdata, mappers and
+manual files, for testing and benchmarking the pipeline locally.
+
+Usage: python synthetic_data_main.py <folder> [--responses N] [--seed SEED]
+"""
+import argparse
+import logging
+import os
+
+from src.utils import local_file_mods
+from src.utils.storage import ModsStorage
+from src.utils.synthetic_data import DEFAULT_SEED, write_synthetic_data
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("folder", help="The folder to write the files to.")
+    parser.add_argument("--responses", type=int, default=100000)
+    parser.add_argument("--period", type=int, default=202312)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    os.makedirs(args.folder, exist_ok=True)
+    paths = write_synthetic_data(
+        ModsStorage("network", local_file_mods),
+        args.folder,
+        args.responses,
+        period=args.period,
+        seed=args.seed,
+    )
+    for key, path in paths.items():
+        print(f"{key}: {path}")
@@ -14,6 +14,8 @@ from src.construction.construction_helpers import (
     remove_short_to_long_0,
     prep_new_rows,
     replace_values_in_construction,
+    apply_construction_values,
+    build_construction_position_index,
 )
 
 class TestPrepareFormGB:
@@ -442,7 +444,7 @@ class TestReplaceValuesInConstruction:
         expected_snapshot_output = self.create_expected_snapshot_output()
 
         # Run the function
-        snapshot_output, _ = replace_values_in_construction(
+        snapshot_output, _, _ = replace_values_in_construction(
             input_snapshot_df, input_construction_df
         )
 
@@ -453,5 +455,78 @@ class TestReplaceValuesInConstruction:
             check_dtype=False
         )
 
+    def test_replace_values_with_position_index(self):
+        """Test a position index built up front gives the same update."""
+        input_snapshot_df = self.create_test_snapshot_df()
+        position_index = build_construction_position_index(input_snapshot_df)
+
+        snapshot_output, _, change_log = replace_values_in_construction(
+            input_snapshot_df, self.create_test_construction_df(), position_index
+        )
+
+        assert_frame_equal(
+            snapshot_output, self.create_expected_snapshot_output(), check_dtype=False
+        )
+        assert change_log["reference"].tolist() == [1, 2]
 
 
+
+
+
+class TestApplyConstructionValues:
+    """Tests for apply_construction_values()."""
+
+    def create_test_snapshot_df(self) -> pd.DataFrame:
+        """Create a test snapshot df."""
+        input_cols = ["reference", "instance", "period_year", "value", "num"]
+        data = [
+            [1, 0, 2024, "A", 1.0],
+            [2, 0, 2024, "B", np.nan],
+            [3, 0, 2024, "C", 3.0],
+            [3, 1, 2024, "D", 4.0],
+        ]
+        return pd.DataFrame(data=data, columns=input_cols)
+
+    def create_test_construction_df(self) -> pd.DataFrame:
+        """Create a test construction df."""
+        input_cols = ["reference", "instance", "period_year", "value", "num"]
+        data = [
+            [3, 1, 2024, "X", np.nan],
+            [2, 0, 2024, "B", 20.0],
+            [5, 0, 2024, "Z", 50.0],
+        ]
+        return pd.DataFrame(data=data, columns=input_cols)
+
+    def test_apply_construction_values(self):
+        """General tests for apply_construction_values()."""
+        snapshot_df = self.create_test_snapshot_df()
+        construction_df = self.create_test_construction_df()
+
+        change_log = apply_construction_values(snapshot_df, construction_df)
+
+        # null constructed values and unmatched rows are left alone
+        assert list(snapshot_df["value"]) == ["A", "B", "C", "X"]
+        assert list(snapshot_df["num"]) == [1.0, 20.0, 3.0, 4.0]
+
+        # only cells whose value changed are logged
+        expected_log = pd.DataFrame(
+            {
+                "reference": [3, 2],
+                "instance": [1, 0],
+                "period_year": [2024, 2024],
+                "column": ["value", "num"],
+                "old_value": ["D", np.nan],
+                "new_value": ["X", 20.0],
+            }
+        )
+        assert_frame_equal(
+            change_log, expected_log, check_dtype=False, check_index_type=False
+        )
+
+    def test_apply_construction_values_duplicate_keys(self):
+        """Test a ValueError is raised for duplicated construction keys."""
+        snapshot_df = self.create_test_snapshot_df()
+        construction_df = self.create_test_construction_df()
+        construction_df.loc[2, "reference"] = 2
+        with pytest.raises(ValueError, match="Construction keys must be unique"):
+            apply_construction_values(snapshot_df, construction_df)
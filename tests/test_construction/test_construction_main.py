@@ -0,0 +1,35 @@
+"""Tests for construction_main.py."""
+import pandas as pd
+
+from src.construction.construction_main import write_change_log
+
+
+def test_write_change_log():
+    """Test the change log is written to the construction QA folder."""
+    config = {
+        "construction_paths": {"qa_path": "04_construction/construction_qa"},
+        "years": {"survey_year": 2023},
+    }
+    change_log = pd.DataFrame(
+        {
+            "reference": [1],
+            "instance": [0],
+            "period_year": [2023],
+            "column": ["211"],
+            "old_value": [10.0],
+            "new_value": [20.0],
+        }
+    )
+    written = {}
+
+    def write_csv(path, df):
+        written[path] = df
+
+    write_change_log(change_log, config, write_csv, 7, "postcode_construction")
+
+    [(path, df)] = written.items()
+    assert path.startswith(
+        "04_construction/construction_qa/2023_postcode_construction_changes_"
+    )
+    assert path.endswith("_v7.csv")
+    pd.testing.assert_frame_equal(df, change_log)
@@ -0,0 +1,84 @@
+"""Tests for mapper_registry.py."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.mapping.mapper_registry import MapperLookup, MapperRegistry
+from src.utils import local_file_mods as mods
+from src.utils.storage import ModsStorage
+
+
+@pytest.fixture
+def registry(tmp_path):
+    """A registry with a PG mapper and a cache folder in tmp_path."""
+    mapper_path = os.path.join(tmp_path, "pg_num_alpha_2023.csv")
+    pd.DataFrame({"pg_numeric": [1, 2, 3], "pg_alpha": ["A", "B", "B"]}).to_csv(
+        mapper_path, index=False
+    )
+    config = {
+        "mapping_paths": {
+            "pg_num_alpha_mapper_path": mapper_path,
+            "mapper_cache_path": os.path.join(tmp_path, "cache"),
+        }
+    }
+    storage = ModsStorage("network", mods)
+    return MapperRegistry(
+        config,
+        storage.file_exists,
+        storage.mkdir,
+        storage.read_csv,
+        storage.md5sum,
+        storage.read_parquet,
+        storage.write_parquet,
+    )
+
+
+class TestMapperRegistry(object):
+    """Tests for MapperRegistry."""
+
+    def test_get_validates_and_caches(self, registry, tmp_path, monkeypatch):
+        """Test a mapper is validated once, then read from the parquet cache."""
+        mapper = registry.get("pg_num_alpha_mapper_path")
+        assert mapper["pg_numeric"].dtype == "Int64"
+        assert mapper["pg_alpha"].dtype == "string"
+        assert len(os.listdir(tmp_path / "cache")) == 1
+
+        # A new run reads the cached copy without validating it again
+        def fail(*args):
+            raise AssertionError("mapper validated again")
+
+        monkeypatch.setattr("src.staging.staging_helpers.load_validate_mapper", fail)
+        registry._mappers.clear()
+        cached = registry.get("pg_num_alpha_mapper_path")
+        pd.testing.assert_frame_equal(cached, mapper)
+
+    def test_changed_mapper_is_validated(self, registry, tmp_path):
+        """Test a changed mapper gets a new cache entry, and is validated."""
+        registry.get("pg_num_alpha_mapper_path")
+        pd.DataFrame({"pg_numeric": [1, 1], "pg_alpha": ["A", "B"]}).to_csv(
+            tmp_path / "pg_num_alpha_2023.csv", index=False
+        )
+        registry._mappers.clear()
+        with pytest.raises(ValueError, match="many to many"):
+            registry.get("pg_num_alpha_mapper_path")
+
+    def test_lookup(self, registry):
+        """Test a lookup maps keys like Series.map, with missing for no match."""
+        lookup = registry.lookup("pg_num_alpha_mapper_path", "pg_numeric", ["pg_alpha"])
+        assert registry.lookup(
+            "pg_num_alpha_mapper_path", "pg_numeric", ["pg_alpha"]
+        ) is lookup
+
+        keys = pd.Series([3, 9, 1, np.nan], index=[10, 11, 12, 13])
+        mapped = lookup.map(keys, "pg_alpha")
+        assert mapped.index.tolist() == [10, 11, 12, 13]
+        assert mapped.tolist() == ["B", pd.NA, "A", pd.NA]
+
+
+def test_lookup_not_unique():
+    """Test a key mapping to two different values is rejected."""
+    mapper = pd.DataFrame({"key": [1, 1, 2], "value": ["a", "b", "c"]})
+    with pytest.raises(ValueError, match="not unique"):
+        MapperLookup.from_mapper(mapper, "key", ["value"])
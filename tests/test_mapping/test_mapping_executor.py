@@ -0,0 +1,147 @@
+"""Tests for mapping_executor.py."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.mapping.cellno_mapping import validate_join_cellno_mapper
+from src.mapping.itl_mapping import join_itl_regions
+from src.mapping.mapper_registry import MapperLookup
+from src.mapping.mapping_executor import (
+    build_postcode_regions,
+    check_unmatched,
+    map_gb_responses,
+    map_ni_responses,
+)
+from src.mapping.pg_conversion import run_pg_conversion
+from src.mapping.ultfoc_mapping import join_fgn_ownership
+
+CONFIG = {"mappers": {"gb_itl": "LAU121CD", "geo_cols": ["ITL121CD", "ITL121NM"]}}
+
+
+class InMemoryRegistry(object):
+    """A registry of mappers held in memory, with the MapperRegistry interface."""
+
+    def __init__(self, mappers: dict):
+        self.mappers = mappers
+
+    def get(self, mapper_path_key):
+        return self.mappers[mapper_path_key].copy(deep=False)
+
+    def lookup(self, mapper_path_key, key_col, value_cols):
+        return MapperLookup.from_mapper(
+            self.mappers[mapper_path_key], key_col, value_cols
+        )
+
+
+@pytest.fixture
+def mappers():
+    """The mappers used in the mapping pass."""
+    return InMemoryRegistry(
+        {
+            "sic_pg_num_mapper_path": pd.DataFrame(
+                {"SIC 2007_CODE": [1110, 2511], "2016 > Form PG": [1, 2]}
+            ),
+            "pg_num_alpha_mapper_path": pd.DataFrame(
+                {"pg_numeric": [1, 2, 3], "pg_alpha": ["A", "B", "C"]}
+            ),
+            "ultfoc_mapper_path": pd.DataFrame(
+                {"ruref": [11, 12, 13], "ultfoc": ["US", None, "FR"]}
+            ),
+            "cellno_path": pd.DataFrame(
+                {"cell_no": [1, 2, 817], "UNI_Count": [10, 20, 30]}
+            ),
+            "itl_mapper_path": pd.DataFrame(
+                {
+                    "LAU121CD": ["E1", "E2"],
+                    "ITL121CD": ["TLC", "TLK"],
+                    "ITL121NM": ["North East", "South West"],
+                }
+            ),
+        }
+    )
+
+
+@pytest.fixture
+def postcode_mapper():
+    """Mapper from postcode to itl."""
+    return pd.DataFrame({"pcd2": ["NP10 8XG", "CF10 1AA"], "itl": ["E1", "E2"]})
+
+
+def gb_responses() -> pd.DataFrame:
+    """GB responses, with a missing PG and unmatched keys."""
+    return pd.DataFrame(
+        {
+            "reference": [11, 12, 13, 14],
+            "201": [3, np.nan, 1, 3],
+            "rusic": [1110, 2511, 1110, 9999],
+            "cellnumber": [1, 2, 817, 2],
+            "postcodes_harmonised": ["NP10 8XG", "CF10 1AA", "NP10 8XG", np.nan],
+        },
+        index=[5, 6, 7, 8],
+    )
+
+
+def test_map_gb_responses_matches_sequential_joins(mappers, postcode_mapper):
+    """Test the single pass gives the same result as the separate joins."""
+    responses = (gb_responses(), pd.DataFrame())
+    responses = run_pg_conversion(
+        responses,
+        mappers.get("pg_num_alpha_mapper_path"),
+        mappers.get("sic_pg_num_mapper_path"),
+    )
+    responses = join_fgn_ownership(responses, mappers.get("ultfoc_mapper_path"))
+    responses = validate_join_cellno_mapper(
+        responses, mappers.get("cellno_path"), CONFIG
+    )
+    expected = join_itl_regions(
+        responses[0], postcode_mapper, mappers.get("itl_mapper_path"), CONFIG
+    )
+
+    mapped, unmatched = map_gb_responses(
+        gb_responses(), mappers, postcode_mapper, CONFIG
+    )
+
+    pd.testing.assert_frame_equal(mapped, expected)
+    assert unmatched[["mapper", "key", "count"]].values.tolist() == [
+        ["ultfoc", 12, 1],
+        ["ultfoc", 14, 1],
+    ]
+    check_unmatched(unmatched)
+
+
+def test_unmatched_keys_reported_together(mappers, postcode_mapper):
+    """Test every unmatched key is in the QA table, and errors are raised."""
+    df = gb_responses()
+    df.loc[5, "cellnumber"] = 99
+    df.loc[6, "postcodes_harmonised"] = "ZZ1 1ZZ"
+
+    _, unmatched = map_gb_responses(df, mappers, postcode_mapper, CONFIG)
+
+    assert unmatched["mapper"].tolist() == [
+        "ultfoc",
+        "ultfoc",
+        "cellno",
+        "postcode mapper",
+    ]
+    with pytest.raises(ValueError, match=r"(?s)cellnumber.*\[99\].*ZZ1 1ZZ"):
+        check_unmatched(unmatched)
+
+
+def test_map_ni_responses(mappers):
+    """Test NI gets PG mapped and its ultfoc from foc."""
+    ni_df = pd.DataFrame({"201": [np.nan, 2], "rusic": [1110, 1110], "foc": ["", "IE"]})
+
+    mapped = map_ni_responses(ni_df, mappers)
+
+    assert mapped["201"].tolist() == ["A", "B"]
+    assert mapped["pg_numeric"].tolist() == [1, 2]
+    assert mapped["ultfoc"].tolist() == ["GB", "IE"]
+
+
+def test_build_postcode_regions(mappers, postcode_mapper):
+    """Test the composed lookup maps a postcode straight to its regions."""
+    lookup = build_postcode_regions(postcode_mapper, mappers, CONFIG)
+
+    postcodes = pd.Series(["CF10 1AA", "XX1 1XX"])
+    assert lookup.map(postcodes, "itl").tolist() == ["E2", np.nan]
+    assert lookup.map(postcodes, "ITL121NM").tolist() == ["South West", np.nan]
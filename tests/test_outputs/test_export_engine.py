@@ -0,0 +1,148 @@
+"""Tests for export_engine.py, using the local file system backend."""
+import gzip
+import hashlib
+import json
+import shutil
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from src.outputs.export_engine import export_outputs, read_file_metadata
+from src.outputs.manifest_output import Manifest
+from src.utils import local_file_mods
+from src.utils.storage import ModsStorage
+
+
+@pytest.fixture
+def storage():
+    return ModsStorage("network", local_file_mods)
+
+
+@pytest.fixture
+def folders(tmp_path):
+    """An outputs folder with a csv and a gzipped csv output, and an export folder."""
+    outputs = tmp_path / "outputs"
+    outputs.mkdir()
+    (tmp_path / "export").mkdir()
+    (outputs / "tau.csv").write_bytes(b"ref,value\n1,2\n3,4\n")
+    (outputs / "gb_sas.csv.gz").write_bytes(gzip.compress(b"ref,sic\n1,1234\n"))
+    return tmp_path
+
+
+def make_manifest(storage, folders):
+    return Manifest(
+        outgoing_directory=str(folders),
+        export_directory=str(folders / "export"),
+        pipeline_run_datetime=datetime(2024, 10, 14),
+        delete_file_func=storage.delete_file,
+        md5sum_func=storage.md5sum,
+        stat_size_func=storage.stat_size,
+        isdir_func=storage.isdir,
+        isfile_func=storage.isfile,
+        read_header_func=storage.read_header,
+        string_to_file_func=storage.write_string_to_file,
+        read_parquet_columns_func=storage.read_parquet_columns,
+    )
+
+
+def test_read_file_metadata(storage, folders):
+    """Test the header, size and md5 are those of the file."""
+    src = folders / "outputs" / "gb_sas.csv.gz"
+
+    result = read_file_metadata(storage, str(src))
+
+    assert result == {
+        "header": "ref,sic",
+        "sizeBytes": src.stat().st_size,
+        "md5": hashlib.md5(src.read_bytes()).hexdigest(),
+    }
+
+
+@pytest.mark.parametrize("method", ["copy", "move"])
+def test_export_outputs(storage, folders, method):
+    """Test the outputs and manifest are exported, and moved files deleted."""
+    selection = {
+        "tau": folders / "outputs" / "tau.csv",
+        "gb_sas": folders / "outputs" / "gb_sas.csv.gz",
+    }
+    headers = {"tau_schema": "ref,value", "gb_sas_schema": "ref,sic"}
+    manifest = make_manifest(storage, folders)
+
+    export_outputs(storage, manifest, selection, headers, method=method)
+
+    manifest_path = folders / "export" / "20241014_0000metadata_manifest.json"
+    files = json.loads(manifest_path.read_text())["files"]
+    assert [f["file"] for f in files] == ["tau.csv", "gb_sas.csv.gz"]
+    assert files[0]["md5sum"] == storage.md5sum(str(folders / "export" / "tau.csv"))
+    gz_path = folders / "export" / "gb_sas.csv.gz"
+    assert files[1]["sizeBytes"] == gz_path.stat().st_size
+    assert (folders / "outputs" / "tau.csv").exists() == (method == "copy")
+
+
+def test_export_outputs_failure_leaves_export_empty(storage, folders):
+    """Test a failed export deletes the copies and writes no manifest."""
+    selection = {
+        "tau": folders / "outputs" / "tau.csv",
+        "gb_sas": folders / "outputs" / "missing.csv",
+    }
+    headers = {"tau_schema": "ref,value", "gb_sas_schema": "ref,sic"}
+
+    with pytest.raises(FileNotFoundError):
+        export_outputs(storage, make_manifest(storage, folders), selection, headers)
+
+    assert list((folders / "export").iterdir()) == []
+    assert (folders / "outputs" / "tau.csv").exists()
+
+
+def test_export_outputs_failure_keeps_earlier_exports(storage, folders):
+    """Test a failed export only deletes the files it copied."""
+    earlier = folders / "export" / "missing.csv"
+    earlier.write_bytes(b"ref,sic\n")
+    selection = {
+        "tau": folders / "outputs" / "tau.csv",
+        "gb_sas": folders / "outputs" / "missing.csv",
+    }
+    headers = {"tau_schema": "ref,value", "gb_sas_schema": "ref,sic"}
+
+    with pytest.raises(FileNotFoundError):
+        export_outputs(storage, make_manifest(storage, folders), selection, headers)
+
+    assert list((folders / "export").iterdir()) == [earlier]
+
+
+def test_export_outputs_uses_backend_copy(storage, folders, monkeypatch):
+    """Test the files are copied by the backend, not streamed through open."""
+    calls = []
+    monkeypatch.setattr(
+        local_file_mods,
+        "rd_copy_file",
+        lambda src, dst: calls.append((src, dst)) or shutil.copy(src, dst),
+    )
+    monkeypatch.setattr(storage, "open", None)
+    selection = {"tau": folders / "outputs" / "tau.csv"}
+
+    export_outputs(
+        storage, make_manifest(storage, folders), selection, {"tau_schema": "ref,value"}
+    )
+
+    assert calls == [(str(selection["tau"]), str(folders / "export"))]
+    assert (folders / "export" / "tau.csv").read_bytes() == b"ref,value\n1,2\n3,4\n"
+
+
+def test_export_outputs_parquet(storage, folders):
+    """Test the header of a Parquet output is read from its footer."""
+    storage.write_parquet(
+        str(folders / "outputs" / "tau.parquet"), pd.DataFrame({"ref": [1]})
+    )
+    manifest = make_manifest(storage, folders)
+
+    export_outputs(
+        storage,
+        manifest,
+        {"tau": folders / "outputs" / "tau.parquet"},
+        {"tau_schema": "ref,value"},
+    )
+
+    assert len(manifest.invalid_headers) == 1
+    assert (folders / "export" / "tau.parquet").exists()
@@ -7,7 +7,8 @@ import pandas as pd
 import numpy as np
 
 # Local Imports
-from src.outputs.form_output_prep import form_output_prep
+import src.outputs.map_output_cols as map_o
+from src.outputs.form_output_prep import OutputColumns, form_output_prep
 
 
 class TestFormOutputPrep(object):
@@ -144,3 +145,86 @@ class TestFormOutputPrep(object):
 
         full_outputs = pd.DataFrame(data=data, columns=columns)
         return full_outputs
+
+
+class TestOutputColumns(object):
+    """Tests for OutputColumns."""
+
+    def data(self) -> pd.DataFrame:
+        columns = ["statusencoded", "employment", "713", "714", "219", "220"]
+        data = [
+            ["210", 5, "Yes", "No", 1.0, np.nan],
+            ["211", 300, "", np.nan, np.nan, np.nan],
+            ["302", 25, "No", "Yes", 2.0, 3.0],
+        ]
+        return pd.DataFrame(columns=columns, data=data)
+
+    def test_matches_map_output_cols(self):
+        """Test the derived columns are those the mapping functions add."""
+        df = self.data()
+        result = OutputColumns().attach(
+            df, ["form_status", "sizeband", "713", "714", "C_lnd_bl"]
+        )
+
+        expected = map_o.map_to_numeric(
+            map_o.map_sizebands(map_o.create_cora_status_col(self.data()))
+        )
+        expected["C_lnd_bl"] = expected[["219", "220"]].fillna(0).sum(axis=1)
+        pd.testing.assert_frame_equal(result, expected)
+
+        # The source frame is unchanged
+        pd.testing.assert_frame_equal(df, self.data())
+
+    def test_computed_once_per_frame(self):
+        """Test copies of a registered frame's rows share its columns."""
+        calls = []
+
+        def double(df):
+            calls.append(len(df))
+            return df["employment"] * 2
+
+        columns = OutputColumns({"double": double})
+        df = self.data()
+        df["reference"] = [1, 2, 3]
+        columns.add_frame(df)
+        columns.attach(df.copy(deep=False), ["double"])
+        result = columns.attach(df.copy(), ["double"])
+        assert result["double"].tolist() == [10, 600, 50]
+        assert calls == [3]
+
+        # Rows filtered from the frame are aligned to the cached column
+        subset = df.loc[df["employment"] > 10].reset_index(drop=True)
+        assert columns.get(df.loc[df["employment"] > 10], "double").tolist() == [
+            600,
+            50,
+        ]
+        assert calls == [3]
+
+        # Rows not in the frame as registered, and frames that were never
+        # registered, are derived from the frame itself
+        assert columns.get(subset, "double").tolist() == [600, 50]
+        assert columns.get(self.data(), "double").tolist() == [10, 600, 50]
+        assert calls == [3, 2, 3]
+
+        columns.clear()
+        columns.get(df, "double")
+        assert calls == [3, 2, 3, 3]
+
+    def test_changed_references_not_shared(self):
+        """Test rows whose references changed do not use the cached column."""
+        calls = []
+
+        def double(df):
+            calls.append(len(df))
+            return df["employment"] * 2
+
+        columns = OutputColumns({"double": double})
+        df = self.data()
+        df["reference"] = [1, 2, 3]
+        columns.add_frame(df)
+        columns.get(df, "double")
+
+        moved = df.copy()
+        moved["reference"] = [3, 2, 1]
+        columns.get(moved, "double")
+        assert calls == [3, 3]
@@ -0,0 +1,59 @@
+"""Tests for intram_cube.py."""
+import numpy as np
+import pandas as pd
+
+from src.outputs.intram_cube import build_intram_cube, roll_up, sic_division
+
+
+class TestIntramCube(object):
+    """Tests for build_intram_cube and roll_up."""
+
+    def gb_data(self) -> pd.DataFrame:
+        columns = ["ITL1", "201", "rusic", "200", "formtype", "211"]
+        data = [
+            ["TLE", "A", 1234, "C", "0001", 10.0],
+            ["TLE", "A", 1234, "C", "0001", 5.0],
+            ["TLK", "B", 72110, "D", "0006", 20.0],
+            [np.nan, "B", 72110, "C", "0006", 1.0],
+            ["TLK", np.nan, 26110, "C", "0001", np.nan],
+        ]
+        return pd.DataFrame(columns=columns, data=data)
+
+    def ni_data(self) -> pd.DataFrame:
+        columns = ["201", "formtype", "211"]
+        data = [["A", "0003", 100.0], ["C", "0003", 7.0]]
+        return pd.DataFrame(columns=columns, data=data)
+
+    def test_roll_up_matches_groupby(self):
+        """Test rolling up the cube gives the same sums as the microdata."""
+        gb_df = self.gb_data()
+        cube = build_intram_cube(gb_df, self.ni_data(), ["ITL1"])
+
+        for dims in [["ITL1"], ["201"], ["200"], ["ITL1", "formtype"]]:
+            expected = gb_df.groupby(dims).agg({"211": "sum"}).reset_index()
+            pd.testing.assert_frame_equal(roll_up(cube, dims), expected)
+
+    def test_roll_up_uk(self):
+        """Test NI is included for UK outputs, and dropped from ITL regions."""
+        cube = build_intram_cube(self.gb_data(), self.ni_data(), ["ITL1"])
+
+        by_pg = roll_up(cube, ["201"], include_ni=True)
+        assert by_pg.set_index("201")["211"].to_dict() == {
+            "A": 115.0,
+            "B": 21.0,
+            "C": 7.0,
+        }
+        by_itl = roll_up(cube, ["ITL1"], include_ni=True)
+        assert by_itl["211"].sum() == 35.0
+
+    def test_sic_division(self):
+        """Test the SIC division is the first two digits of the padded code."""
+        cube = build_intram_cube(self.gb_data())
+
+        by_sic = roll_up(cube, ["sic_division"])
+        assert by_sic.set_index("sic_division")["211"].to_dict() == {
+            "01": 15.0,
+            "26": 0.0,
+            "72": 21.0,
+        }
+        assert sic_division(pd.Series([1234, 72110])).tolist() == ["01", "72"]
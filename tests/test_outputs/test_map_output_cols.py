@@ -9,12 +9,34 @@ import numpy as np
 
 # Local Imports
 from src.outputs.map_output_cols import (
+    SIZEBANDS,
+    YES_NO_CODES,
+    band_codes,
+    lookup_codes,
     map_sizebands,
     create_cora_status_col,
     map_to_numeric,
 )
 
 
+class TestKernels(object):
+    """Tests for band_codes and lookup_codes."""
+
+    def test_band_codes_edges(self):
+        """Test values on, between and outside the band edges."""
+        values = pd.Series([np.nan, -1, 0, 9, 9.5, 10, 249, 250, 1e9])
+        result = band_codes(values, SIZEBANDS)
+        expected = pd.array([None, None, 1, 1, None, 2, 5, 6, 6], dtype="Int64")
+        pd.testing.assert_extension_array_equal(result, expected)
+
+    def test_lookup_codes_categorical(self):
+        """Test categorical input, with missing and unknown values defaulted."""
+        values = pd.Series(["Yes", "No", "", np.nan, "Maybe"], dtype="category")
+        result = lookup_codes(values, YES_NO_CODES, 3)
+        expected = pd.array([1, 2, 3, 3, 3], dtype="Int64")
+        pd.testing.assert_extension_array_equal(result, expected)
+
+
 class TestMapSizebands(object):
     """Tests for map_sizebands."""
 
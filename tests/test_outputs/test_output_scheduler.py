@@ -0,0 +1,78 @@
+"""Tests for output_scheduler.py."""
+import time
+
+import pandas as pd
+import pytest
+
+from src.outputs.form_output_prep import OutputColumns
+from src.outputs.output_scheduler import INTRAM_TOTALS, OutputTask, run_output_tasks
+
+
+def slow_total(df, intram_tot_dict, key, delay):
+    """Add a column to the input and a total to the dictionary after a delay."""
+    time.sleep(delay)
+    df["added"] = 1
+    intram_tot_dict[key] = df["value"].sum()
+    return intram_tot_dict
+
+
+def attach_total(df, intram_tot_dict, key, columns):
+    """Add the shared doubled column to the input and total it."""
+    df = columns.attach(df, ["double"])
+    intram_tot_dict[key] = df["double"].sum()
+    return intram_tot_dict
+
+
+def test_run_output_tasks_merges_in_declared_order():
+    """Test totals are merged in task order, whichever finishes first."""
+    df = pd.DataFrame({"value": [1, 2, 3]})
+    tasks = [
+        OutputTask("a", slow_total, (df, INTRAM_TOTALS, "a", 0.05), totals_keys=("a",)),
+        OutputTask("b", slow_total, (df, INTRAM_TOTALS, "b", 0), totals_keys=("b",)),
+    ]
+
+    result = run_output_tasks(tasks, {"earlier": 10})
+
+    assert list(result.items()) == [("earlier", 10), ("a", 6), ("b", 6)]
+    assert "added" not in df.columns
+
+
+def test_run_output_tasks_derives_shared_columns_once():
+    """Test tasks given the same frame share each derived column."""
+    calls = []
+
+    def double(df):
+        calls.append(len(df))
+        return df["value"] * 2
+
+    columns = OutputColumns({"double": double})
+    df = pd.DataFrame({"value": [1, 2, 3]})
+    columns.add_frame(df)
+    tasks = [
+        OutputTask(
+            key,
+            attach_total,
+            (df, INTRAM_TOTALS, key),
+            kwargs={"columns": columns},
+            totals_keys=(key,),
+        )
+        for key in ["a", "b", "c", "d", "e"]
+    ]
+
+    result = run_output_tasks(tasks, {})
+
+    assert result == {key: 12 for key in ["a", "b", "c", "d", "e"]}
+    assert calls == [3]
+    assert "double" not in df.columns
+
+
+def test_run_output_tasks_undeclared_total():
+    """Test an output adding a key it did not declare raises an error."""
+    df = pd.DataFrame({"value": [1]})
+    tasks = [OutputTask("a", slow_total, (df, INTRAM_TOTALS, "gb_itl1", 0))]
+
+    with pytest.raises(ValueError, match="undeclared totals"):
+        run_output_tasks(tasks, {})
+
+    tasks[0].totals_keys = ("gb_itl*",)
+    assert run_output_tasks(tasks, {}) == {"gb_itl1": 1}
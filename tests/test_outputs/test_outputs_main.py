@@ -0,0 +1,79 @@
+"""Tests for outputs_main.py."""
+# Standard Library Imports
+import copy
+
+# Third Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+import src.outputs.form_output_prep as form_output_prep
+import src.outputs.map_output_cols as map_o
+import src.outputs.outputs_main as outputs_main
+from tests.test_outputs.conftest import CONFIG
+
+
+def weighted_df() -> pd.DataFrame:
+    """The weighted data, with the columns the weights are applied to."""
+    columns = ["reference", "instance", "period", "statusencoded", "604", "a_weight"]
+    data = [
+        [1, 0, 202212, "210", np.nan, 1.0],
+        [1, 1, 202212, "210", "Yes", 1.0],
+        [2, 1, 202212, "211", "No", 2.0],
+        [3, 1, 202212, "302", "Yes", 3.0],
+        [3, 2, 202212, "302", "Yes", 3.0],
+    ]
+    df = pd.DataFrame(columns=columns, data=data)
+    for col in ["211", "305", "emp_total", "headcount_total"]:
+        df[col] = 0.0
+    for col in ["headcount_tot_m", "headcount_tot_f"]:
+        df[col] = 0.0
+    return df
+
+
+def test_run_outputs_derives_shared_columns_once(monkeypatch):
+    """Test the outputs share the derived columns of each prepared frame."""
+    calls = []
+    derive_form_status = form_output_prep.DERIVED_COLUMNS["form_status"]
+
+    def form_status(df):
+        calls.append(len(df))
+        return derive_form_status(df)
+
+    monkeypatch.setattr(
+        form_output_prep,
+        "DERIVED_COLUMNS",
+        {**form_output_prep.DERIVED_COLUMNS, "form_status": form_status},
+    )
+
+    results = {}
+
+    def attach_status(name):
+        def output(df, *args, columns):
+            results[name] = columns.attach(df, ["form_status"])
+
+        return output
+
+    outputs = ["short_form", "long_form", "tau", "gb_sas", "frozen_group"]
+    for output in outputs:
+        monkeypatch.setattr(outputs_main, f"output_{output}", attach_status(output))
+
+    config = copy.deepcopy(CONFIG)
+    config["estimation"]["numeric_cols"] = []
+    config["breakdowns"] = {}
+    for key in config["global"]:
+        if key.startswith("output_"):
+            config["global"][key] = key[len("output_"):] in outputs
+    config["global"]["load_ni_data"] = False
+
+    outputs_main.run_outputs(
+        weighted_df(), None, config, {}, None, 1, None, None, None
+    )
+
+    # Short form, long form, GB SAS and frozen group use rows of the estimated
+    # data, and TAU uses the unestimated data
+    assert calls == [5, 4]
+    assert [len(results[output]) for output in outputs] == [5, 4, 3, 3, 3]
+    for result in results.values():
+        expected = map_o.create_cora_status_col(result[["statusencoded"]].copy())
+        assert result["form_status"].tolist() == expected["form_status"].tolist()
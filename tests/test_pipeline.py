@@ -0,0 +1,24 @@
+"""Tests for pipeline.py."""
+import pytest
+
+import src.pipeline as pipeline
+from src.utils.benchmark import setup_benchmark_run
+from src.utils.storage import BackgroundWriteMiddleware
+
+
+def test_stage_error_not_replaced_by_flush_error(tmp_path, monkeypatch, caplog):
+    """Test a failed background write does not hide the error of a failed stage."""
+    user_config_path, dev_config_path = setup_benchmark_run(str(tmp_path), 50)
+
+    def failed_stage(*args):
+        raise ValueError("stage failed")
+
+    def failed_flush(self):
+        raise OSError("write failed")
+
+    monkeypatch.setattr(pipeline, "_run_stages", failed_stage)
+    monkeypatch.setattr(BackgroundWriteMiddleware, "flush", failed_flush)
+
+    with pytest.raises(ValueError, match="stage failed"):
+        pipeline.run_pipeline(user_config_path, dev_config_path)
+    assert "Could not write the metrics of the failed run" in caplog.text
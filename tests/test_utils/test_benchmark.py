@@ -0,0 +1,69 @@
+"""Tests for benchmark.py."""
+import pandas as pd
+import pytest
+
+from src.utils.benchmark import (
+    append_results,
+    baseline_results,
+    find_regressions,
+    run_benchmark,
+)
+
+
+def make_results(revision, run_time, wall_seconds, peak_traced_mb):
+    """Results of a run at one size, for the staging and imputation stages."""
+    return pd.DataFrame(
+        {
+            "revision": revision,
+            "run_time": run_time,
+            "responses": 5000,
+            "stage": ["staging", "imputation"],
+            "wall_seconds": wall_seconds,
+            "peak_traced_mb": peak_traced_mb,
+        }
+    )
+
+
+def test_baseline_results(tmp_path):
+    """Test the baseline is the latest run of the revision before the current."""
+    results_path = str(tmp_path / "results.csv")
+    assert baseline_results(results_path, "c").empty
+
+    append_results(results_path, make_results("0123", "2024-01-01", [1, 2], [5, 6]))
+    append_results(results_path, make_results("b", "2024-01-02", [3, 4], [5, 6]))
+    append_results(results_path, make_results("b", "2024-01-03", [7, 8], [5, 6]))
+    append_results(results_path, make_results("c", "2024-01-04", [9, 9], [5, 6]))
+
+    baseline = baseline_results(results_path, "c")
+    assert baseline["wall_seconds"].tolist() == [7, 8]
+    baseline = baseline_results(results_path, "c", baseline="0123")
+    assert baseline["wall_seconds"].tolist() == [1, 2]
+    assert baseline_results(results_path, "a", baseline="d").empty
+
+
+def test_find_regressions():
+    """Test only changes beyond both the threshold and minimum are regressions."""
+    baseline = make_results("a", "2024-01-01", [2.0, 40.0], [100.0, 100.0])
+    # Staging is 50% slower, but by under the minimum of a second
+    results = make_results("b", "2024-01-02", [3.0, 60.0], [110.0, 200.0])
+
+    regressions = find_regressions(results, baseline, threshold=0.25)
+
+    assert regressions[["stage", "metric"]].values.tolist() == [
+        ["imputation", "wall_seconds"],
+        ["imputation", "peak_traced_mb"],
+    ]
+    assert regressions["change"].tolist() == [0.5, 1.0]
+    assert find_regressions(results, pd.DataFrame()).empty
+
+
+@pytest.mark.runbenchmark
+def test_run_benchmark():
+    """Test the whole pipeline runs on synthetic data, recording every stage."""
+    results = run_benchmark([5000])
+
+    stages = results["stage"].tolist()
+    for stage in ["staging", "imputation", "outliers", "estimation", "outputs"]:
+        assert stage in stages
+    assert results["peak_traced_mb"].notna().all()
+    assert (results["responses"] == 5000).all()
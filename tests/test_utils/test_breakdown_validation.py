@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import pytest
 import logging
@@ -10,6 +11,11 @@ from src.utils.breakdown_validation import (
     remove_all_nulls_rows,
     equal_validation,
     greater_than_validation,
+    get_equality_errors,
+    get_greater_than_errors,
+    get_breakdown_errors,
+    get_check_plan,
+    BreakdownCheckPlan,
 )
 
 @pytest.fixture(scope="module")
@@ -425,3 +431,133 @@ class TestGreaterThanValidation:
             assert "Doing checks for values that should be greater than..." in caplog.text
             assert result_msg == msg
             assert result_count == count
+
+
+class TestGetEqualityErrors:
+    """Unit tests for get_equality_errors function."""
+
+    def create_input_df(self):
+        """Create an input dataframe for the test."""
+        input_cols = ["reference", "instance", "202", "203", "204", "302", "303"]
+        data = [
+            ["A", 1, 10, 30, 40, 5, 5],
+            ["B", 1, 1, 30, 40, 5, 6],
+            ["C", 1, None, None, None, 0, 0],
+            ["D", 2, 5, 5, None, 1, 1],
+        ]
+        return pd.DataFrame(data=data, columns=input_cols)
+
+    def test_get_equality_errors(self):
+        """Test the error table is in row order, then check order."""
+        input_df = self.create_input_df()
+        checks = {"sal_oth_expend": ["202", "203", "204"], "purch": ["302", "303"]}
+        expected_df = pd.DataFrame(
+            {
+                "reference": ["B", "B", "D"],
+                "instance": [1, 1, 2],
+                "check": ["sal_oth_expend", "purch", "sal_oth_expend"],
+                "diff": [-9.0, -1.0, None],
+            },
+            index=[1, 1, 3],
+        )
+        result_df = get_equality_errors(input_df, checks)
+        pd.testing.assert_frame_equal(result_df, expected_df)
+
+    def test_get_equality_errors_no_errors(self):
+        """Test an empty error table is returned when all checks pass."""
+        input_df = self.create_input_df().loc[[0, 2]]
+        result_df = get_equality_errors(input_df, {"purch": ["302", "303"]})
+        assert result_df.empty
+        assert list(result_df.columns) == ["reference", "instance", "check", "diff"]
+
+
+def test_get_greater_than_errors():
+    """Test for get_greater_than_errors function."""
+    input_df = pd.DataFrame(
+        {
+            "reference": ["A", "B", "C"],
+            "instance": [1, 1, 1],
+            "209": [10, 10, None],
+            "221": [5, 15, 20],
+            "211": [100, 100, 100],
+            "202": [50, 150, 50],
+        }
+    )
+    expected_df = pd.DataFrame(
+        {
+            "reference": ["B", "B"],
+            "instance": [1, 1],
+            "check": ["check14", "check15"],
+            "diff": [5.0, 50],
+        },
+        index=[1, 1],
+    )
+    result_df = get_greater_than_errors(input_df)
+    pd.testing.assert_frame_equal(result_df, expected_df, check_dtype=False)
+
+
+class TestBreakdownCheckPlan:
+    """Unit tests for the BreakdownCheckPlan class."""
+
+    def test_plan_incidence(self):
+        """Test the incidence matrix has +1 for breakdowns and -1 for totals."""
+        plan = BreakdownCheckPlan({"a": ["1", "2", "3"], "b": ["3", "4"]})
+        assert plan.columns == ["1", "2", "3", "4"]
+        expected = np.array([[1, 0], [1, 0], [-1, 1], [0, -1]])
+        np.testing.assert_array_equal(plan.incidence, expected)
+        np.testing.assert_array_equal(plan.total_index, [2, 3])
+
+    def test_get_check_plan_is_shared(self):
+        """Test the same checks give the same compiled plan."""
+        checks = {"a": ["1", "2", "3"]}
+        assert get_check_plan(checks) is get_check_plan(dict(checks))
+
+    def test_evaluate(self):
+        """Test the diffs and failures from evaluating a plan."""
+        df = pd.DataFrame(
+            {
+                "reference": [1, 2, 3, 4],
+                "instance": [1, 1, 1, 1],
+                "1": [1.0, 1.0, None, 0.0],
+                "2": [2.0, 2.4, None, 0.0],
+                "3": [3.0, 4.0, None, None],
+            }
+        )
+        result = BreakdownCheckPlan({"a": ["1", "2", "3"]}).evaluate(df)
+        np.testing.assert_array_almost_equal(
+            result.diffs[:, 0], [0.0, -0.6, np.nan, np.nan]
+        )
+        # rows 3 is all null, row 4 has a null total with non-null breakdowns
+        assert result.equality_failures()[:, 0].tolist() == [False, True, False, True]
+        assert result.tolerance_failures()[:, 0].tolist() == [False, True, False, False]
+
+
+def test_get_breakdown_errors():
+    """Test for get_breakdown_errors function."""
+    df = pd.DataFrame(
+        {
+            "reference": [1, 1, 2],
+            "instance": [1, 2, 1],
+            "imp_class": ["A", "A", "B"],
+            "imp_marker": ["R", "TMI", "R"],
+            "1": [1.0, 1.0, 5.0],
+            "2": [2.0, 1.0, 5.0],
+            "3": [3.0, 4.0, 10.0],
+        }
+    )
+    checks = {"a": ["1", "2", "3"], "b": ["1", "3"]}
+    check_results_dict, qa_df = get_breakdown_errors(df, checks)
+
+    expected_a = df.loc[[1], ["reference", "instance", "imp_class", "imp_marker"]]
+    expected_a[["1", "2", "3"]] = df.loc[[1], ["1", "2", "3"]]
+    expected_a["a_diff"] = [-2.0]
+    pd.testing.assert_frame_equal(check_results_dict["a"], expected_a)
+    assert len(check_results_dict["b"]) == 3
+
+    # the qa df has every row for the failing references, and one diff per check
+    assert qa_df.index.tolist() == [0, 1, 2]
+    assert list(qa_df.columns) == [
+        "reference", "instance", "imp_class", "imp_marker", "1", "2", "3",
+        "a_diff", "b_diff",
+    ]
+    assert qa_df["a_diff"].isnull().tolist() == [True, False, True]
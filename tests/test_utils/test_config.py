@@ -17,6 +17,7 @@ from src.utils.config import (
     _nulltype_conversion,
     validate_freezing_config_settings,
     validate_construction_config_settings,
+    validate_runlog_config_settings,
     validate_freezing_run_config
 )
 
@@ -609,3 +610,17 @@ class TestValidateFreezingRunConfig(object):
         msg = "Only one type of pipeline run is allowed.*"
         with pytest.raises(ValueError, match=msg):
             validate_freezing_run_config(config)
+
+
+@pytest.mark.parametrize(
+    "write_csv, write_sql, raises",
+    [(True, False, False), (False, True, False), (True, True, True)],
+)
+def test_validate_runlog_config_settings(write_csv, write_sql, raises):
+    """Test the runlog cannot be written to both csv and SQL."""
+    config = {"runlog_writer": {"write_csv": write_csv, "write_sql": write_sql}}
+    if raises:
+        with pytest.raises(ValueError, match="csv or to SQL, not both"):
+            validate_runlog_config_settings(config)
+    else:
+        validate_runlog_config_settings(config)
@@ -0,0 +1,58 @@
+"""Tests for csv_blocks.py, and the local csv writes that use it."""
+import gzip
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils import local_file_mods
+from src.utils.csv_blocks import iter_csv_blocks, write_csv_blocks
+
+
+@pytest.fixture
+def wide_df():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.random((1000, 30)), columns=[str(c) for c in range(30)])
+    df["name"] = "a"
+    df.loc[::7, "0"] = np.nan
+    return df
+
+
+def test_blocks_in_order_on_workers(wide_df):
+    """Test blocks serialised on threads join to the same csv as to_csv."""
+    expected = wide_df.to_csv(index=False).encode("utf-8")
+
+    for workers in [1, 3]:
+        blocks = list(iter_csv_blocks(wide_df, chunk_rows=64, workers=workers))
+        assert len(blocks) == 16
+        assert b"".join(blocks) == expected
+
+
+def test_write_gzip(wide_df, tmp_path):
+    """Test a gzip write decompresses to the same csv as to_csv."""
+    path = tmp_path / "out.csv.gz"
+    with open(path, "wb") as file:
+        write_csv_blocks(file, wide_df, "gzip", chunk_rows=100, workers=2)
+
+    content = path.read_bytes()
+    assert gzip.decompress(content) == wide_df.to_csv(index=False).encode("utf-8")
+
+
+def test_local_write_compressed(wide_df, tmp_path):
+    """Test the local write compresses, and the md5sum always reads the file."""
+    path = str(tmp_path / "out.csv.gz")
+    local_file_mods.rd_write_csv(path, wide_df)
+
+    content = open(path, "rb").read()
+    expected = hashlib.md5(content).hexdigest()
+    assert local_file_mods.rd_md5sum(path) == expected
+    assert local_file_mods.rd_read_header(path).startswith("0,1,2,")
+    pd.testing.assert_frame_equal(pd.read_csv(path), wide_df)
+    assert [p.name for p in tmp_path.iterdir()] == ["out.csv.gz"]
+
+    # A file changed at the same size gets a new md5
+    with open(path, "r+b") as file:
+        file.seek(-1, 2)
+        file.write(bytes([content[-1] ^ 1]))
+    assert local_file_mods.rd_md5sum(path) != expected
@@ -14,6 +14,8 @@ from src.utils.hdfs_mods import (
     rd_file_exists,
     rd_file_size,
     check_file_exists,
+    rd_copy_file,
+    rd_move_file,
 )
 
 # mark tests in file
@@ -174,4 +176,30 @@ class TestCheckFileExists:
             check_file_exists("file/truepath/filename.csv")
 
 
+class TestCopyMove:
+    """Tests for rd_copy_file and rd_move_file."""
+
+    @mock.patch("src.utils.hdfs_mods.hdfs")
+    def test_rd_copy_file(self, mock_hdfs):
+        """Test a copy into a directory keeps the name, and failures give False."""
+        mock_hdfs.path.isdir.return_value = True
+        assert rd_copy_file("outputs/tau.csv", "export")
+        mock_hdfs.cp.assert_called_once_with("outputs/tau.csv", "export/tau.csv")
+
+        mock_hdfs.cp.side_effect = IOError("no such file")
+        assert rd_copy_file("outputs/tau.csv", "export") is False
+
+    @mock.patch("src.utils.hdfs_mods.hdfs")
+    def test_rd_move_file(self, mock_hdfs):
+        """Test a move to a file path, and failures give False."""
+        mock_hdfs.path.isdir.return_value = False
+        assert rd_move_file("outputs/tau.csv", "export/tau_v1.csv")
+        mock_hdfs.rename.assert_called_once_with(
+            "outputs/tau.csv", "export/tau_v1.csv"
+        )
+
+        mock_hdfs.rename.side_effect = IOError("no such file")
+        assert rd_move_file("outputs/tau.csv", "export/tau_v1.csv") is False
+
+
 # TODO: test safeload_yaml
@@ -1,10 +1,12 @@
 """Tests for utils.helpers."""
 
+import numpy as np
 import pytest
 import pandas as pd
 
+from src.mapping.mapper_registry import MapperLookup
 from src.utils.helpers import (
-    convert_formtype, values_in_column, tree_to_list
+    convert_formtype, values_in_column, tree_to_list, validate_updated_postcodes
 )
 
 
@@ -159,3 +161,36 @@ class TestTreeToList:
                 str(excinfo.value) ==
                 "Input must be a dictionary, but <class 'list'> is given"
             )
+
+
+def test_validate_updated_postcodes():
+    """Test only the imputed records with changed postcodes are re-mapped."""
+    postcode_regions = MapperLookup.from_mapper(
+        pd.DataFrame(
+            {
+                "postcodes_harmonised": ["NP10 8XG", "CF10 1AA"],
+                "itl": ["W1", "W2"],
+                "ITL121CD": ["TLL", "TLL"],
+            }
+        ),
+        "postcodes_harmonised",
+        ["itl", "ITL121CD"],
+    )
+    df = pd.DataFrame(
+        {
+            "imp_marker": ["R", "MoR", "CF", "constructed"],
+            # the R record is not re-mapped, even though its itl is out of date
+            "postcodes_harmonised": ["CF10 1AA", "CF10 1AA", "NP10 8XG", "XX1 1XX"],
+            "itl": ["W1", "W1", "W1", "W2"],
+            "ITL121CD": ["old", "old", "TLL", "TLL"],
+        },
+        index=[3, 2, 1, 0],
+    )
+    config = {"mappers": {"geo_cols": ["ITL121CD"]}}
+
+    result = validate_updated_postcodes(df, postcode_regions, config)
+
+    assert result is df
+    assert result.index.tolist() == [3, 2, 1, 0]
+    assert result["itl"].tolist() == ["W1", "W2", "W1", np.nan]
+    assert result["ITL121CD"].tolist() == ["old", "TLL", "TLL", np.nan]
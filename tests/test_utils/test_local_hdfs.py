@@ -0,0 +1,74 @@
+"""Tests for the hdfs_mods functions, using the local_hdfs stand-in for pydoop."""
+import hashlib
+
+import pytest
+
+from src.utils import hdfs_mods, local_hdfs
+
+
+@pytest.fixture
+def hdfs_dir(tmp_path, monkeypatch):
+    """Replace the pydoop hdfs module and create a directory of files."""
+    monkeypatch.setattr(hdfs_mods, "hdfs", local_hdfs, raising=False)
+    (tmp_path / "a.csv").write_bytes(b"col1,col2\n1,2\n")
+    (tmp_path / "b_manifest.json").write_bytes(b"{}")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "c.csv").write_bytes(b"x\n")
+    return tmp_path
+
+
+def test_metadata(hdfs_dir):
+    """Test the file and directory checks, sizes and stat_many."""
+    a_csv = str(hdfs_dir / "a.csv")
+
+    assert hdfs_mods.rd_isfile(a_csv) and not hdfs_mods.rd_isdir(a_csv)
+    assert hdfs_mods.rd_isdir(str(hdfs_dir / "sub"))
+    assert not hdfs_mods.rd_isfile(str(hdfs_dir / "missing.csv"))
+    assert hdfs_mods.rd_stat_size(a_csv) == 14
+    assert hdfs_mods.rd_stat_size(str(hdfs_dir)) == 14 + 2 + 2
+    assert hdfs_mods.rd_stat_many([a_csv]) == {a_csv: {"isfile": True, "size": 14}}
+
+
+def test_md5_and_header(hdfs_dir, monkeypatch):
+    """Test the md5 is streamed in blocks and the header has no new line."""
+    monkeypatch.setattr(hdfs_mods, "MD5_BLOCK_SIZE", 4)
+    a_csv = str(hdfs_dir / "a.csv")
+
+    assert hdfs_mods.rd_md5sum(a_csv) == hashlib.md5(b"col1,col2\n1,2\n").hexdigest()
+    assert hdfs_mods.rd_read_header(a_csv) == "col1,col2"
+
+
+def test_copy_move_and_delete(hdfs_dir):
+    """Test files are copied and moved into directories, then deleted."""
+    a_csv = str(hdfs_dir / "a.csv")
+    sub = str(hdfs_dir / "sub")
+
+    assert hdfs_mods.rd_copy_file(a_csv, sub)
+    assert (hdfs_dir / "sub" / "a.csv").read_bytes() == b"col1,col2\n1,2\n"
+    assert hdfs_mods.rd_move_file(a_csv, str(hdfs_dir / "d.csv"))
+    assert not (hdfs_dir / "a.csv").exists()
+
+    assert hdfs_mods.rd_delete_file(str(hdfs_dir / "d.csv"))
+    assert not hdfs_mods.rd_delete_file(str(hdfs_dir / "d.csv"))
+
+
+def test_list_and_search(hdfs_dir):
+    """Test listing by extension and searching by file name ending."""
+    files = hdfs_mods.rd_list_files(str(hdfs_dir), ext="csv")
+
+    assert files == [str(hdfs_dir / "a.csv")]
+    found = hdfs_mods.rd_search_file(str(hdfs_dir), "_manifest.json")
+    assert found == str(hdfs_dir / "b_manifest.json")
+    with pytest.raises(FileNotFoundError):
+        hdfs_mods.rd_search_file(str(hdfs_dir), "missing.json")
+
+
+def test_create_exclusive(hdfs_dir):
+    """Test a file is created once, and the temporary file is removed."""
+    claim = str(hdfs_dir / "run_000001.claim")
+
+    hdfs_mods.rd_create_exclusive(claim, b"1")
+    with pytest.raises(FileExistsError):
+        hdfs_mods.rd_create_exclusive(claim, b"2")
+    assert (hdfs_dir / "run_000001.claim").read_bytes() == b"1"
+    assert not list(hdfs_dir.glob("*.tmp"))
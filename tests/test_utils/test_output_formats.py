@@ -0,0 +1,115 @@
+"""Tests for output_formats.py, using the local file system backend."""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src.outputs.manifest_output import Manifest
+from src.utils import local_file_mods
+from src.utils.output_formats import (
+    OutputFormatMiddleware,
+    arrow_types,
+    output_name,
+    to_arrow_table,
+)
+from src.utils.storage import ModsStorage
+
+
+def test_output_name():
+    """Test the output is found from output and QA file names only."""
+    assert output_name("out/output_tau/2023_output_tau_24-10-14_v3.csv") == "tau"
+    assert output_name("2023_long_form_24-10-14_v3.csv") == "long_form"
+    assert output_name("2023_output_intram_by_sic24-10-14_v3.csv") == "intram_by_sic"
+    assert output_name("logs/runs/run_000003_main_runlog.csv") is None
+
+
+def test_to_arrow_table_uses_schema_types():
+    """Test columns are cast to the schema types, and others are inferred."""
+    schema_dict = {
+        "ref": {"old_name": "reference", "Deduced_Data_Type": "Int64"},
+        "sic": {"old_name": "rusic", "Deduced_Data_Type": "str"},
+        "flag": {"old_name": "flag", "Deduced_Data_Type": "unknown"},
+    }
+    df = pd.DataFrame(
+        {
+            "ref": [1.0, np.nan],
+            "sic": [1234, "A"],
+            "flag": [True, False],
+            "other": [1.5, 2.5],
+        }
+    )
+    table = to_arrow_table(df, arrow_types(schema_dict))
+
+    assert table.schema.types == [pa.int64(), pa.string(), pa.bool_(), pa.float64()]
+    assert table.column("ref").to_pylist() == [1, None]
+    assert table.column("sic").to_pylist() == ["1234", "A"]
+
+
+def test_middleware_writes_parquet_outputs(tmp_path):
+    """Test outputs set to Parquet are written as Parquet, and others as csv."""
+    schema_path = tmp_path / "tau_schema.toml"
+    schema_path.write_text(
+        '[ref]\nold_name = "reference"\nDeduced_Data_Type = "Int64"\n'
+    )
+    storage = OutputFormatMiddleware(
+        ModsStorage("network", local_file_mods),
+        formats={"tau": "parquet", "gb_sas": "csv", "ni_sas": None},
+        schema_paths={"tau_schema": str(schema_path)},
+    )
+    df = pd.DataFrame({"ref": [1.0, 2.0], "name": ["a", "b"]})
+
+    storage.write_csv(str(tmp_path / "2023_output_tau_24-10-14_v3.csv"), df)
+    storage.write_csv(str(tmp_path / "2023_output_gb_sas_24-10-14_v3.csv"), df)
+
+    parquet_path = str(tmp_path / "2023_output_tau_24-10-14_v3.parquet")
+    assert pq.read_schema(parquet_path).types == [pa.int64(), pa.string()]
+    assert storage.read_parquet_columns(parquet_path) == ["ref", "name"]
+    assert not (tmp_path / "2023_output_tau_24-10-14_v3.csv").exists()
+    assert (tmp_path / "2023_output_gb_sas_24-10-14_v3.csv").exists()
+
+    with pytest.raises(ValueError):
+        OutputFormatMiddleware(storage, formats={"tau": "feather"})
+
+
+def test_manifest_reads_parquet_header(tmp_path):
+    """Test the manifest validates the header of a Parquet file."""
+    storage = ModsStorage("network", local_file_mods)
+    (tmp_path / "outputs").mkdir()
+    storage.write_parquet(
+        str(tmp_path / "outputs" / "tau.parquet"), pd.DataFrame({"a": [1], "b": [2]})
+    )
+    manifest = Manifest(
+        outgoing_directory=str(tmp_path),
+        export_directory=str(tmp_path),
+        pipeline_run_datetime=datetime(2024, 10, 14),
+        delete_file_func=storage.delete_file,
+        md5sum_func=storage.md5sum,
+        stat_size_func=storage.stat_size,
+        isdir_func=storage.isdir,
+        isfile_func=storage.isfile,
+        read_header_func=storage.read_header,
+        string_to_file_func=storage.write_string_to_file,
+        read_parquet_columns_func=storage.read_parquet_columns,
+    )
+
+    manifest.add_file("outputs/tau.parquet", column_header="a,b")
+    manifest.add_file("outputs/tau.parquet", column_header="a,c")
+
+    assert manifest.manifest["files"][0]["header"] == "a,b"
+    assert len(manifest.invalid_headers) == 1
+
+
+def test_middleware_compresses_csv_outputs(tmp_path):
+    """Test csv outputs set to be compressed get the suffix of the compression."""
+    storage = OutputFormatMiddleware(
+        ModsStorage("network", local_file_mods), compression={"tau": "gzip"}
+    )
+    df = pd.DataFrame({"ref": [1, 2]})
+
+    storage.write_csv(str(tmp_path / "2023_output_tau_24-10-14_v3.csv"), df)
+
+    path = str(tmp_path / "2023_output_tau_24-10-14_v3.csv.gz")
+    pd.testing.assert_frame_equal(pd.read_csv(path), df)
@@ -0,0 +1,84 @@
+"""Tests for runlog_store.py."""
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from src.utils import local_file_mods as mods
+from src.utils.runlog_store import CsvRunLogStore, SqliteRunLogStore
+
+LOG_FILENAMES = {"main": "main_runlog.csv", "logs": "logs_runlog.csv"}
+
+
+@pytest.fixture
+def csv_store(tmp_path):
+    """A csv runlog store on the local file system."""
+    return CsvRunLogStore(
+        str(tmp_path),
+        LOG_FILENAMES,
+        mods.rd_file_exists,
+        mods.rd_mkdir,
+        mods.rd_read_csv,
+        mods.rd_write_csv,
+        mods.rd_list_files,
+        mods.rd_create_exclusive,
+        mods.rd_delete_file,
+    )
+
+
+class TestCsvRunLogStore(object):
+    """Tests for CsvRunLogStore."""
+
+    def test_claim_run_id(self, csv_store, tmp_path):
+        """Test run ids continue from the main log and skip ids already claimed."""
+        pd.DataFrame({"run_id": [1, 4]}).to_csv(
+            tmp_path / "main_runlog.csv", index=False
+        )
+        assert csv_store.claim_run_id() == 5
+
+        # Another run claims the next id between listing and creating
+        mods.rd_create_exclusive(str(tmp_path / "runs" / "run_000006.claim"))
+        assert csv_store.claim_run_id() == 7
+        assert csv_store.claim_run_id() == 8
+
+    def test_write_and_compact(self, csv_store, tmp_path):
+        """Test per-run rows append, replace and are compacted into the runlog."""
+        pd.DataFrame({"run_id": [1], "status": ["PASSED"]}).to_csv(
+            tmp_path / "main_runlog.csv", index=False
+        )
+        run_id = csv_store.claim_run_id()
+        main_row = pd.DataFrame({"run_id": [run_id], "status": ["FAILED"]})
+        csv_store.write(run_id, "main_runlog.csv", main_row)
+        main_row["status"] = "PASSED"
+        csv_store.write(run_id, "main_runlog.csv", main_row, replace=True)
+        for message in ["a", "b"]:
+            logs = pd.DataFrame({"run_id": [run_id], "message": [message]})
+            csv_store.write(run_id, "logs_runlog.csv", logs)
+
+        run_logs = pd.read_csv(tmp_path / "runs" / "run_000002_logs_runlog.csv")
+        assert run_logs["message"].tolist() == ["a", "b"]
+
+        assert csv_store.compact() == {"main_runlog.csv": 1, "logs_runlog.csv": 1}
+        main = pd.read_csv(tmp_path / "main_runlog.csv")
+        assert main.values.tolist() == [[1, "PASSED"], [2, "PASSED"]]
+        assert len(pd.read_csv(tmp_path / "logs_runlog.csv")) == 2
+        assert sorted(os.listdir(tmp_path / "runs")) == ["run_000002.claim"]
+
+
+def test_sqlite_store(tmp_path):
+    """Test the SQLite store claims ids and replaces a run's rows."""
+    db_path = str(tmp_path / "runlog.sqlite")
+    store = SqliteRunLogStore(db_path)
+    assert [store.claim_run_id(), store.claim_run_id()] == [1, 2]
+
+    store.write(2, "main_runlog.csv", pd.DataFrame({"run_id": [2], "status": ["F"]}))
+    store.write(
+        2,
+        "main_runlog.csv",
+        pd.DataFrame({"run_id": [2], "status": ["P"]}),
+        replace=True,
+    )
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT run_id, status FROM main_runlog").fetchall()
+    assert rows == [("2", "P")]
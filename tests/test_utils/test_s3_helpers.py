@@ -0,0 +1,284 @@
+"""Tests for s3_helpers.py, using moto as a local s3 stand-in."""
+import gzip
+import hashlib
+
+import pandas as pd
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from src.utils.csv_blocks import iter_csv_chunks  # noqa: E402
+from src.utils.s3_helpers import (  # noqa: E402
+    MIN_PART_SIZE,
+    S3MultipartWriter,
+    S3ObjectCache,
+    S3PrefixIndex,
+    open_s3_object,
+    put_object_exclusive,
+    write_csv_multipart,
+)
+
+BUCKET = "test-bucket"
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    """Create a moto s3 client with an empty test bucket."""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def create_test_df(rows: int) -> pd.DataFrame:
+    """Create a test dataframe including a date column."""
+    return pd.DataFrame(
+        {
+            "reference": range(rows),
+            "text": ["some text to pad the csv out a little"] * rows,
+            "date": pd.Timestamp("2024-01-02 03:04:05"),
+        }
+    )
+
+
+def test_iter_csv_chunks():
+    """Test the joined chunks equal a single to_csv call."""
+    df = create_test_df(25)
+    expected = df.to_csv(date_format="%Y-%m-%d %H:%M:%S.%f+00", index=False)
+    chunks = list(iter_csv_chunks(df, chunk_rows=10))
+    assert len(chunks) == 3
+    assert b"".join(chunks).decode("utf-8") == expected
+
+
+def test_iter_csv_chunks_empty():
+    """Test an empty dataframe gives just the header."""
+    df = pd.DataFrame(columns=["a", "b"])
+    assert list(iter_csv_chunks(df)) == [b"a,b\n"]
+
+
+class TestWriteCsvMultipart:
+    """Tests for write_csv_multipart()."""
+
+    def read_back(self, client, key) -> bytes:
+        """Read an object back from the bucket."""
+        return client.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+    def test_small_write_uses_put(self, s3_client):
+        """Test a csv smaller than one part is written with one put."""
+        df = create_test_df(10)
+        md5 = write_csv_multipart(s3_client, BUCKET, "small.csv", df)
+
+        body = self.read_back(s3_client, "small.csv")
+        expected = df.to_csv(date_format="%Y-%m-%d %H:%M:%S.%f+00", index=False)
+        assert body == expected.encode("utf-8")
+        assert md5 == hashlib.md5(body).hexdigest()
+        etag = s3_client.head_object(Bucket=BUCKET, Key="small.csv")["ETag"]
+        assert etag.strip('"') == md5
+
+    def test_large_write_uses_multipart(self, s3_client):
+        """Test a csv larger than one part is uploaded in parts, in order."""
+        df = create_test_df(400000)
+        md5 = write_csv_multipart(
+            s3_client,
+            BUCKET,
+            "large.csv",
+            df,
+            chunk_rows=20000,
+            part_size=MIN_PART_SIZE,
+            max_workers=2,
+        )
+
+        body = self.read_back(s3_client, "large.csv")
+        assert len(body) > 2 * MIN_PART_SIZE
+        assert body.startswith(b"reference,text,date\n0,")
+        assert body.count(b"reference") == 1
+        assert hashlib.md5(body).hexdigest() == md5
+
+        etag = s3_client.head_object(Bucket=BUCKET, Key="large.csv")["ETag"]
+        assert "-" in etag
+        tags = s3_client.get_object_tagging(Bucket=BUCKET, Key="large.csv")
+        assert tags["TagSet"] == [{"Key": "md5", "Value": md5}]
+
+    def test_compressed_write(self, s3_client):
+        """Test a gzip csv is compressed, and its md5 is of the stored bytes."""
+        df = create_test_df(10)
+        md5 = write_csv_multipart(s3_client, BUCKET, "small.csv.gz", df, "gzip")
+
+        body = self.read_back(s3_client, "small.csv.gz")
+        expected = df.to_csv(date_format="%Y-%m-%d %H:%M:%S.%f+00", index=False)
+        assert gzip.decompress(body) == expected.encode("utf-8")
+        assert md5 == hashlib.md5(body).hexdigest()
+
+    def test_part_size_too_small(self, s3_client):
+        """Test a ValueError is raised for parts smaller than s3 allows."""
+        with pytest.raises(ValueError, match="part_size must be at least"):
+            write_csv_multipart(
+                s3_client, BUCKET, "x.csv", create_test_df(1), part_size=1024
+            )
+
+
+class TestS3ObjectCache:
+    """Tests for the S3ObjectCache class."""
+
+    def put(self, s3_client, key, body):
+        s3_client.put_object(Bucket=BUCKET, Key=key, Body=body)
+
+    def test_stat(self, s3_client):
+        """Test the metadata of an existing and a missing object."""
+        self.put(s3_client, "a.csv", b"col1,col2\n1,2\n")
+        cache = S3ObjectCache(s3_client, BUCKET)
+
+        stat = cache.stat("a.csv")
+        assert stat["exists"] and not stat["is_dir"]
+        assert stat["size"] == 14
+        assert stat["etag"] == hashlib.md5(b"col1,col2\n1,2\n").hexdigest()
+        assert cache.stat("missing.csv")["exists"] is False
+
+    def test_read_header_uses_range(self, s3_client):
+        """Test the header is read with a small range that grows as needed."""
+        body = b"a" * 50 + b"\n" + b"1" * 1000
+        self.put(s3_client, "wide.csv", body)
+        cache = S3ObjectCache(s3_client, BUCKET, header_bytes=16)
+
+        assert cache.read_header("wide.csv") == "a" * 50
+        assert cache.stat("wide.csv")["size"] == len(body)
+
+    def test_read_header_empty_and_missing(self, s3_client):
+        """Test an empty object has an empty header and a missing one raises."""
+        self.put(s3_client, "empty.csv", b"")
+        cache = S3ObjectCache(s3_client, BUCKET)
+
+        assert cache.read_header("empty.csv") == ""
+        with pytest.raises(FileNotFoundError):
+            cache.read_header("missing.csv")
+
+    def test_stat_many_is_cached(self, s3_client):
+        """Test stat_many caches results until invalidated."""
+        self.put(s3_client, "a.csv", b"x\n1\n")
+        self.put(s3_client, "b.csv", b"y\n22\n")
+        cache = S3ObjectCache(s3_client, BUCKET)
+
+        stats = cache.stat_many(["a.csv", "b.csv", "c.csv"], with_header=True)
+        assert [s["exists"] for s in stats.values()] == [True, True, False]
+        assert stats["b.csv"]["header"] == "y"
+
+        self.put(s3_client, "a.csv", b"z\n")
+        assert cache.read_header("a.csv") == "x"
+        cache.invalidate("a.csv")
+        assert cache.read_header("a.csv") == "z"
+        assert cache.stat("a.csv")["size"] == 2
+
+
+class TestS3PrefixIndex:
+    """Tests for the S3PrefixIndex class."""
+
+    def put(self, s3_client, *keys):
+        for key in keys:
+            s3_client.put_object(Bucket=BUCKET, Key=key, Body=b"x")
+
+    def test_listing_is_paginated(self, s3_client):
+        """Test every key is found past the first page of 1000."""
+        keys = [f"outputs/run_{i:04d}.csv" for i in range(1005)]
+        self.put(s3_client, *keys)
+        index = S3PrefixIndex(s3_client, BUCKET)
+
+        assert index.keys("outputs") == keys
+        assert index.search("/outputs/", "run_1004.csv") == ["outputs/run_1004.csv"]
+
+    def test_isdir_and_list_dir(self, s3_client):
+        """Test directories are found and only direct files are listed."""
+        self.put(s3_client, "out/", "out/a.csv", "out/sub/b.csv", "outer/c.csv")
+        index = S3PrefixIndex(s3_client, BUCKET)
+
+        assert index.isdir("out") and index.isdir("out/sub/")
+        assert not index.isdir("out/missing")
+        assert [obj[0] for obj in index.list_dir("out")] == ["out/a.csv"]
+
+    def test_search_suffix_and_glob(self, s3_client):
+        """Test searching by file name ending and by glob pattern."""
+        self.put(
+            s3_client,
+            "out/a_manifest.json",
+            "out/sub/b_manifest.json",
+            "out/b.csv",
+            "manifest.json",
+        )
+        index = S3PrefixIndex(s3_client, BUCKET)
+
+        assert index.search("out", "_manifest.json") == [
+            "out/a_manifest.json",
+            "out/sub/b_manifest.json",
+        ]
+        assert index.search("out", "b*") == ["out/b.csv", "out/sub/b_manifest.json"]
+        assert index.search("out", "missing") == []
+
+    def test_invalidate(self, s3_client):
+        """Test a listing is refreshed once a key under it is invalidated."""
+        self.put(s3_client, "out/a.csv")
+        index = S3PrefixIndex(s3_client, BUCKET)
+        assert index.keys("out") == ["out/a.csv"]
+
+        self.put(s3_client, "out/sub/b.csv")
+        assert index.keys("out/sub") == []
+        index.invalidate("out/sub/b.csv")
+        assert index.keys("out/sub") == ["out/sub/b.csv"]
+        assert index.keys("out") == ["out/a.csv", "out/sub/b.csv"]
+
+
+def test_open_s3_object(s3_client):
+    """Test writing and reading an object as binary and text streams."""
+    closed = []
+    with open_s3_object(s3_client, BUCKET, "a.txt", "w", closed.append) as f:
+        f.write("line 1\nline 2\n")
+    assert closed == ["a.txt"]
+
+    with open_s3_object(s3_client, BUCKET, "a.txt", "r") as f:
+        assert f.readline() == "line 1\n"
+    with open_s3_object(s3_client, BUCKET, "a.txt", "rb") as f:
+        assert f.read() == b"line 1\nline 2\n"
+    with pytest.raises(ValueError):
+        open_s3_object(s3_client, BUCKET, "a.txt", "a")
+
+
+def test_multipart_writer_streams_parts(s3_client):
+    """Test a stream larger than one part is uploaded in parts as it is written."""
+    block = b"x" * (MIN_PART_SIZE // 2 + 1)
+    with S3MultipartWriter(s3_client, BUCKET, "big.bin", MIN_PART_SIZE) as f:
+        for _ in range(5):
+            f.write(block)
+        # Two full parts have been started before the stream is closed
+        assert len(f._parts) == 2
+
+    body = s3_client.get_object(Bucket=BUCKET, Key="big.bin")["Body"].read()
+    assert body == block * 5
+    tags = s3_client.get_object_tagging(Bucket=BUCKET, Key="big.bin")
+    assert tags["TagSet"] == [{"Key": "md5", "Value": hashlib.md5(body).hexdigest()}]
+
+
+@pytest.mark.parametrize("mode, block", [("wb", b"x"), ("w", "x")])
+def test_open_s3_object_aborts_on_error(s3_client, mode, block):
+    """Test a write left by an exception puts nothing and aborts its upload."""
+    with pytest.raises(RuntimeError):
+        with open_s3_object(s3_client, BUCKET, "partial.csv", mode) as f:
+            f.write(block * (MIN_PART_SIZE + 1))
+            f.flush()
+            raise RuntimeError("copy failed")
+
+    listing = s3_client.list_objects_v2(Bucket=BUCKET)
+    assert "Contents" not in listing
+    uploads = s3_client.list_multipart_uploads(Bucket=BUCKET)
+    assert "Uploads" not in uploads
+
+
+def test_put_object_exclusive(s3_client):
+    """Test an object is only created if no object has the key."""
+    put_object_exclusive(s3_client, BUCKET, "runs/run_000001.claim", b"1")
+    with pytest.raises(FileExistsError):
+        put_object_exclusive(s3_client, BUCKET, "runs/run_000001.claim", b"2")
+
+    body = s3_client.get_object(Bucket=BUCKET, Key="runs/run_000001.claim")["Body"]
+    assert body.read() == b"1"
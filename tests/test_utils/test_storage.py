@@ -0,0 +1,203 @@
+"""Tests for storage.py, using the local file system backend."""
+import threading
+
+import pandas as pd
+import pytest
+
+from src.utils import local_file_mods
+from src.utils.storage import (
+    BackgroundWriteMiddleware,
+    CachingMiddleware,
+    MetricsMiddleware,
+    ModsStorage,
+    StorageMiddleware,
+    get_storage,
+)
+
+
+@pytest.fixture
+def storage():
+    return ModsStorage("network", local_file_mods)
+
+
+def test_csv_and_parquet_round_trip(storage, tmp_path):
+    """Test dataframes are written and read back as csv and Parquet."""
+    df = pd.DataFrame({"reference": [1, 2], "name": ["a", "b"]})
+
+    storage.write_csv(str(tmp_path / "df.csv"), df)
+    pd.testing.assert_frame_equal(storage.read_csv(str(tmp_path / "df.csv")), df)
+
+    storage.write_parquet(str(tmp_path / "df.parquet"), df)
+    result = storage.read_parquet(str(tmp_path / "df.parquet"), columns=["name"])
+    pd.testing.assert_frame_equal(result, df[["name"]])
+
+
+def test_exists_many(storage, tmp_path):
+    """Test many paths are checked in one batch."""
+    (tmp_path / "a.csv").write_text("x\n")
+    paths = [str(tmp_path / "a.csv"), str(tmp_path / "b.csv")]
+
+    assert storage.exists_many(paths) == {paths[0]: True, paths[1]: False}
+
+
+def test_metrics_middleware(storage, tmp_path):
+    """Test the calls to each operation are counted."""
+    metered = MetricsMiddleware(storage)
+    metered.isfile(str(tmp_path / "a.csv"))
+    metered.isfile(str(tmp_path / "b.csv"))
+
+    assert metered.metrics["isfile"]["calls"] == 2
+    assert metered.platform == "network"
+
+
+def test_caching_middleware(storage, tmp_path):
+    """Test metadata is cached until a write clears the cache."""
+    cached = CachingMiddleware(storage)
+    path = str(tmp_path / "a.txt")
+    assert not cached.isfile(path)
+
+    (tmp_path / "a.txt").write_text("x\n")
+    assert not cached.isfile(path)
+
+    with cached.open(path, "w") as file:
+        file.write("header\n")
+    assert cached.isfile(path)
+    assert cached.read_header(path) == "header\n"
+
+
+def test_metrics_middleware_logs(storage, tmp_path, caplog):
+    """Test the metrics are logged for each operation."""
+    metered = MetricsMiddleware(storage)
+    metered.isfile(str(tmp_path / "a.csv"))
+
+    with caplog.at_level("INFO"):
+        metered.log_metrics()
+    assert "Storage isfile: 1 calls" in caplog.text
+
+
+def test_caching_middleware_write_during_lookup(storage, tmp_path):
+    """Test a result is not cached if a write was made while it was looked up."""
+    path = str(tmp_path / "a.txt")
+    cached = CachingMiddleware(storage)
+
+    class WriteDuringLookup(StorageMiddleware):
+        def call(self, operation, *args, **kwargs):
+            result = super().call(operation, *args, **kwargs)
+            if operation == "isfile":
+                cached.write_string_to_file(b"x", path)
+            return result
+
+    cached.inner = WriteDuringLookup(storage)
+    assert not cached.isfile(path)
+    cached.inner = storage
+    assert cached.isfile(path)
+
+
+def test_get_storage():
+    """Test middleware is applied in order and unknown platforms raise."""
+    config = {"global": {"platform": "network"}}
+    storage = get_storage(config, middleware=[CachingMiddleware, MetricsMiddleware])
+
+    assert isinstance(storage, MetricsMiddleware)
+    assert isinstance(storage.inner, CachingMiddleware)
+    assert storage.inner.inner.mods is local_file_mods
+
+    with pytest.raises(ImportError):
+        get_storage({"global": {"platform": "ftp"}})
+
+
+class TestBackgroundWriteMiddleware:
+    """Tests for the BackgroundWriteMiddleware class."""
+
+    def test_writes_a_snapshot(self, storage, tmp_path):
+        """Test the frame is copied, so later changes are not written."""
+        writer = BackgroundWriteMiddleware(storage)
+        df = pd.DataFrame({"reference": [1, 2]})
+        path = str(tmp_path / "df.csv")
+
+        writer.write_csv(path, df)
+        df.loc[0, "reference"] = 99
+        writer.flush()
+
+        assert storage.read_csv(path)["reference"].tolist() == [1, 2]
+
+    def test_read_waits_for_pending_write(self, storage, tmp_path):
+        """Test reading a path waits for its pending write."""
+        release = threading.Event()
+
+        class SlowStorage(ModsStorage):
+            def call(self, operation, *args, **kwargs):
+                if operation == "write_csv":
+                    release.wait(5)
+                return super().call(operation, *args, **kwargs)
+
+        writer = BackgroundWriteMiddleware(SlowStorage("network", local_file_mods))
+        path = str(tmp_path / "df.csv")
+        writer.write_csv(path, pd.DataFrame({"a": [1]}))
+        assert not (tmp_path / "df.csv").exists()
+
+        release.set()
+        assert writer.read_csv(path)["a"].tolist() == [1]
+
+    def test_copy_waits_for_write_to_destination(self, storage, tmp_path):
+        """Test a copy waits for a pending write into its destination folder."""
+        release = threading.Event()
+
+        class SlowStorage(ModsStorage):
+            def call(self, operation, *args, **kwargs):
+                if operation == "write_csv":
+                    release.wait(5)
+                return super().call(operation, *args, **kwargs)
+
+        writer = BackgroundWriteMiddleware(SlowStorage("network", local_file_mods))
+        (tmp_path / "src.csv").write_text("a\n2\n")
+        (tmp_path / "export").mkdir()
+        writer.write_csv(str(tmp_path / "export" / "src.csv"), pd.DataFrame({"a": [1]}))
+
+        with writer._condition:
+            assert writer._is_pending(str(tmp_path / "export"))
+            assert not writer._is_pending(str(tmp_path / "exp"))
+        threading.Timer(0.2, release.set).start()
+        writer.copy_file(str(tmp_path / "src.csv"), str(tmp_path / "export"))
+
+        # The copy ran after the pending write, so it was not overwritten
+        assert (tmp_path / "export" / "src.csv").read_text() == "a\n2\n"
+
+    def test_flush_raises_errors(self, storage, tmp_path):
+        """Test an error in a background write is raised by flush."""
+        writer = BackgroundWriteMiddleware(storage)
+        writer.write_csv(str(tmp_path / "missing_dir" / "df.csv"), pd.DataFrame())
+
+        with pytest.raises(OSError):
+            writer.flush()
+        writer.flush()
+
+    def test_memory_is_bounded(self, storage, tmp_path):
+        """Test all writes finish when each copy exceeds the memory bound."""
+        writer = BackgroundWriteMiddleware(storage, max_pending_bytes=1)
+        for i in range(5):
+            writer.write_csv(str(tmp_path / f"{i}.csv"), pd.DataFrame({"a": [i]}))
+        writer.flush()
+
+        assert len(list(tmp_path.glob("*.csv"))) == 5
+
+    def test_pending_bytes_count_strings(self, storage, tmp_path):
+        """Test the memory of a pending copy includes its string contents."""
+        release = threading.Event()
+
+        class SlowStorage(ModsStorage):
+            def call(self, operation, *args, **kwargs):
+                if operation == "write_csv":
+                    release.wait(5)
+                return super().call(operation, *args, **kwargs)
+
+        writer = BackgroundWriteMiddleware(SlowStorage("network", local_file_mods))
+        df = pd.DataFrame({"name": ["a long enough name to count"] * 100})
+        writer.write_csv(str(tmp_path / "df.csv"), df)
+
+        with writer._condition:
+            pending_bytes = writer._pending_bytes
+        release.set()
+        writer.flush()
+        assert pending_bytes == df.memory_usage(index=True, deep=True).sum()
+        assert pending_bytes > df.memory_usage(index=True).sum()
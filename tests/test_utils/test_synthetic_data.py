@@ -0,0 +1,65 @@
+"""Tests for synthetic_data.py."""
+import pandas as pd
+
+from src.mapping.cellno_mapping import clean_validate_cellno_mapper
+from src.mapping.ultfoc_mapping import validate_ultfoc_mapper
+from src.staging import validation as val
+from src.staging.postcode_validation import format_postcodes
+from src.staging.staging_helpers import load_val_snapshot_json
+from src.utils import local_file_mods
+from src.utils.storage import ModsStorage
+from src.utils.synthetic_data import (
+    synthetic_mappers,
+    synthetic_snapshot,
+    write_synthetic_data,
+)
+
+
+def test_synthetic_snapshot_size_and_seed():
+    """Test the snapshot is about the size asked for, and the same for a seed."""
+    contributors, responses, _ = synthetic_snapshot(5000, seed=1)
+    again, _, _ = synthetic_snapshot(5000, seed=1)
+
+    assert abs(len(responses) - 5000) < 1000
+    assert contributors["reference"].is_unique
+    assert set(responses["reference"]) <= set(contributors["reference"])
+    pd.testing.assert_frame_equal(contributors, again)
+
+
+def test_synthetic_mappers_cover_snapshot():
+    """Test the mappers pass their checks and cover every key in the snapshot."""
+    contributors, responses, refdata = synthetic_snapshot(5000)
+    mappers = synthetic_mappers(contributors, refdata)
+
+    clean_validate_cellno_mapper(mappers["cellno_path"])
+    validate_ultfoc_mapper(mappers["ultfoc_mapper_path"])
+    assert contributors["cellnumber"].isin(mappers["cellno_path"]["cell_no"]).all()
+
+    sic_pg = mappers["sic_pg_num_mapper_path"]
+    val.validate_many_to_one(sic_pg, "SIC 2007_CODE", "2016 > Form PG")
+    assert contributors["rusic"].isin(sic_pg["SIC 2007_CODE"]).all()
+
+    postcodes = responses.loc[responses["questioncode"] == "601", "response"]
+    pcd2 = mappers["postcode_mapper"]["pcd2"]
+    assert postcodes.map(format_postcodes).isin(pcd2).all()
+    itl = mappers["itl_mapper_path"]["LAU121CD"]
+    assert mappers["postcode_mapper"]["itl"].isin(itl).all()
+
+
+def test_write_synthetic_data_stages(tmp_path):
+    """Test the written snapshot loads and validates as an SPP snapshot."""
+    storage = ModsStorage("network", local_file_mods)
+    paths = write_synthetic_data(storage, str(tmp_path), 5000)
+
+    config = {"global": {"platform": "network", "dev_test": False}}
+    full_responses, _ = load_val_snapshot_json(
+        paths["snapshot_path"], storage.load_json, config
+    )
+
+    assert val.check_data_shape(full_responses)
+    answered = full_responses.dropna(subset=["211"])
+    assert (answered["211"] >= answered["204"]).all()
+    assert set(storage.read_csv(paths["backdata_path"])["reference"]) <= set(
+        full_responses["reference"]
+    )
+    assert storage.isfile(paths["manual_outliers_path"])
@@ -0,0 +1,158 @@
+"""Tests for wrappers.py."""
+import logging
+import tracemalloc
+
+import pandas as pd
+
+from src.utils.wrappers import (
+    LOG_RECORD_COLUMNS,
+    LogCaptureHandler,
+    track_df_changes,
+    get_df_metrics,
+    clear_df_metrics,
+    run_stage,
+    get_stage_metrics,
+    clear_stage_metrics,
+)
+
+
+@track_df_changes(key_cols=["reference"])
+def add_and_drop(df: pd.DataFrame) -> pd.DataFrame:
+    """Add a column and drop the last row."""
+    df = df.assign(new=1)
+    return df.iloc[:-1]
+
+
+@track_df_changes
+def split(df: pd.DataFrame, cutoff: int):
+    """Split the dataframe into two on the reference."""
+    return df[df["reference"] < cutoff], df[df["reference"] >= cutoff]
+
+
+class TestTrackDfChanges:
+    """Tests for the track_df_changes decorator."""
+
+    def setup_method(self):
+        """Clear the metrics from any previous test."""
+        clear_df_metrics()
+
+    def test_track_df_changes(self, caplog):
+        """Test the metrics recorded for a function returning one dataframe."""
+        df = pd.DataFrame({"reference": [1, 2, 3], "value": [1.0, 2.0, 3.0]})
+        with caplog.at_level("INFO"):
+            add_and_drop(df)
+        assert "1 rows were removed" in caplog.text
+
+        metrics = get_df_metrics()
+        assert len(metrics) == 1
+        row = metrics.iloc[0]
+        assert row["function"] == "add_and_drop"
+        assert (row["rows_before"], row["rows_after"]) == (3, 2)
+        assert (row["cols_before"], row["cols_after"]) == (2, 3)
+        assert row["cols_added"] == "new"
+        assert row["cols_removed"] == ""
+        assert row["keys_before"] != row["keys_after"]
+        # the input is not changed
+        assert df.shape == (3, 2)
+
+    def test_track_df_changes_split(self, caplog):
+        """Test the rows of split dataframes are added together."""
+        df = pd.DataFrame({"reference": [1, 2, 3]})
+        with caplog.at_level("INFO"):
+            split(df, 2)
+        assert "There has been no change in the dataframe" in caplog.text
+
+        row = get_df_metrics().iloc[0]
+        assert (row["rows_before"], row["rows_after"]) == (3, 3)
+        assert row["keys_before"] is None
+
+    def test_track_df_changes_no_dataframe(self, caplog):
+        """Test None is recorded for a missing dataframe argument or result."""
+
+        @track_df_changes
+        def summarise(df: pd.DataFrame) -> dict:
+            return {"rows": len(df)}
+
+        @track_df_changes
+        def build(n: int) -> pd.DataFrame:
+            return pd.DataFrame({"reference": range(n)})
+
+        with caplog.at_level("INFO"):
+            assert summarise(pd.DataFrame({"reference": [1, 2]})) == {"rows": 2}
+            assert len(build(3)) == 3
+        assert "No dataframe to compare for" in caplog.text
+
+        metrics = get_df_metrics()
+        assert metrics["rows_before"].isna().tolist() == [False, True]
+        assert metrics["rows_after"].isna().tolist() == [True, False]
+        assert metrics["cols_added"].isna().all()
+
+
+def test_run_stage():
+    """Test run_stage returns the result and records the stage metrics."""
+    clear_stage_metrics()
+    df = pd.DataFrame({"reference": [1, 2, 3]})
+
+    result = run_stage("split", split, df, cutoff=3)
+
+    assert len(result) == 2
+    metrics = get_stage_metrics()
+    assert metrics["stage"].tolist() == ["split"]
+    assert metrics.loc[0, "rows_in"] == 3
+    assert metrics.loc[0, "rows_out"] == 2
+    assert metrics.loc[0, "wall_seconds"] >= 0
+    assert metrics.loc[0, "peak_traced_mb"] is None
+
+
+def test_run_stage_traced_memory():
+    """Test the stage's peak traced memory is recorded while tracing."""
+    clear_stage_metrics()
+    tracemalloc.start()
+    try:
+        run_stage("allocate", lambda: bytearray(8 * 1024**2))
+    finally:
+        tracemalloc.stop()
+
+    assert get_stage_metrics().loc[0, "peak_traced_mb"] >= 8
+
+
+def test_log_capture_handler():
+    """Test records are captured with their fields and stage, and bounded."""
+    handler = LogCaptureHandler(max_records=2)
+    test_logger = logging.getLogger("test_log_capture")
+    test_logger.addHandler(handler)
+    test_logger.setLevel(logging.INFO)
+    try:
+        test_logger.info("first - with a separator")
+        run_stage("stage_a", lambda: test_logger.warning("second"))
+        test_logger.info("third")
+    finally:
+        test_logger.removeHandler(handler)
+
+    assert handler.dropped == 1
+    records = pd.DataFrame(list(handler.records), columns=LOG_RECORD_COLUMNS)
+    assert records["message"].tolist() == ["second", "third"]
+    assert records["level"].tolist() == ["WARNING", "INFO"]
+    assert records["stage"].tolist() == ["stage_a", None]
+    assert records.loc[0, "module"] == "test_log_capture"
+    assert (records["elapsed_seconds"] >= 0).all()
+
+
+def test_log_capture_bad_format_args(monkeypatch):
+    """Test a record that cannot be formatted is reported, not raised."""
+    handled = []
+    handler = LogCaptureHandler()
+    monkeypatch.setattr(handler, "handleError", handled.append)
+    test_logger = logging.getLogger("test_log_capture_bad_args")
+    test_logger.addHandler(handler)
+    test_logger.setLevel(logging.INFO)
+    # pytest's own log handlers raise on formatting errors
+    monkeypatch.setattr(test_logger, "propagate", False)
+    try:
+        test_logger.info("%d rows", "not a number")
+        test_logger.info("fine")
+    finally:
+        test_logger.removeHandler(handler)
+
+    assert len(handled) == 1
+    assert [record[-1] for record in handler.records] == ["fine"]